@@ -0,0 +1,108 @@
+"""
+CPU 推理加速档位：bfloat16 autocast、channels_last、torch.compile，以及 torch 线程数。
+
+档位由 ``CPU_PROFILE`` 选择，只在 ``DEVICE=cpu`` 时生效：
+    - baseline: float32 eager，与之前的行为一致
+    - fast: 在支持 bfloat16 的 CPU（AVX512-BF16 / AMX）上用 bfloat16 autocast，
+      VAE 等卷积密集的部分使用 channels_last
+    - max: fast 的基础上再用 torch.compile 编译去噪网络和 VL 的语言解码器
+      （编译产物缓存在 TORCH_COMPILE_CACHE_DIR，重启后不必重新编译）
+
+各档位的输出与 baseline 的差异可以用 ``benchmarks/bench_cpu_profile.py`` 检查。
+"""
+
+import os
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+from functools import cache
+
+import torch
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class CpuProfile:
+    """一个加速档位启用的优化。"""
+
+    bf16: bool = False
+    channels_last: bool = False
+    compile: bool = False
+
+
+PROFILES = {
+    "baseline": CpuProfile(),
+    "fast": CpuProfile(bf16=True, channels_last=True),
+    "max": CpuProfile(bf16=True, channels_last=True, compile=True),
+}
+
+
+def cpu_profile() -> CpuProfile:
+    """当前生效的档位（非 CPU 设备上不启用任何优化）。"""
+    if settings.device != "cpu":
+        return PROFILES["baseline"]
+    return PROFILES[settings.cpu_profile]
+
+
+@cache
+def bf16_supported() -> bool:
+    """CPU 是否有原生 bfloat16 指令（AVX512-BF16 或 AMX），没有时 bfloat16 反而比 float32 慢。"""
+    cpu = getattr(torch, "cpu", None)
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(cpu, name, lambda: False)() for name in checks)
+
+
+@cache
+def use_bf16() -> bool:
+    """当前档位是否启用 bfloat16 autocast。"""
+    if not cpu_profile().bf16:
+        return False
+    if not bf16_supported():
+        print("[CPU] bfloat16 requested but not supported by this CPU, using float32")
+        return False
+    return True
+
+
+def autocast(enabled: bool = True) -> AbstractContextManager[None]:
+    """
+    推理代码块的 autocast 上下文：启用 bfloat16 时矩阵乘和卷积以 bfloat16 计算。
+
+    Args:
+        enabled: 为 False 时总是以 float32 计算（例如 int8 量化后的线性层只接受 float32 输入）
+    """
+    return torch.autocast("cpu", dtype=torch.bfloat16, enabled=enabled and use_bf16())
+
+
+def compile_module(module: torch.nn.Module, dynamic: bool | None = None) -> None:
+    """
+    原地编译模块（``nn.Module.compile``，模块对象本身不变）。
+
+    编译在首次前向时进行，产物缓存在 TORCH_COMPILE_CACHE_DIR。
+    """
+    import torch._inductor.config
+
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", settings.torch_compile_cache_dir)
+    torch._inductor.config.fx_graph_cache = True
+    module.compile(dynamic=dynamic)
+
+
+def configure_threads(num_threads: int = 0) -> None:
+    """
+    设置 torch 线程数。
+
+    Args:
+        num_threads: 算子内并行线程数，0 表示使用 TORCH_NUM_THREADS（仍为 0 时保持 torch 默认）
+    """
+    num_threads = num_threads or settings.torch_num_threads
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if settings.torch_interop_threads:
+        try:
+            torch.set_num_interop_threads(settings.torch_interop_threads)
+        except RuntimeError:
+            # 算子间线程池只能在首次并行工作之前设置一次
+            pass
+    print(
+        f"[CPU] Profile {settings.cpu_profile}, "
+        f"{torch.get_num_threads()} intra-op / {torch.get_num_interop_threads()} inter-op threads"
+    )
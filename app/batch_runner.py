@@ -0,0 +1,244 @@
+"""
+离线 JSONL 批处理：不经过 HTTP，直接用模型类按批处理整个文件。
+
+输入每行一个 JSON 对象：
+    t2i: {"prompt": "a cat", "seed": 42, "format": "webp", "quality": 85,
+          "steps": 8, "guidance_scale": 5.0, "width": 1024, "height": 1024, "sampler": "unipc"}
+         （prompt 以外的字段可选，生成参数按与 HTTP 请求相同的上限约束）
+    vl:  {"image": "photos/cat.jpg", "question": "What is this?", "max_pixels": 401408}
+         （image 为图像路径，相对路径相对于输入文件所在目录；min_pixels / max_pixels 可选）
+
+输出目录中的 ``results.jsonl`` 每处理完一批就追加并落盘，每行带输入行号：
+    t2i: {"line": 0, "image": "000000.png", "format": "png", "steps": 8, "sampler": "unipc"}，
+         图像写在同一目录
+    vl:  {"line": 0, "answer": "...", "vision_cache_hit": false}
+    失败: {"line": 3, "error": "..."}
+
+中途崩溃或中断后用同样的命令重新运行即可续跑：已成功的行会被跳过，失败的行重新处理。
+
+运行命令:
+    uv run python -m app.batch_runner t2i prompts.jsonl outputs/
+    uv run python -m app.batch_runner vl questions.jsonl outputs/ --batch-size 4
+"""
+
+import argparse
+import json
+import os
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from app.acceleration import configure_threads
+from app.config import settings
+from app.encoding import EncodeOptions, OutputFormat, encode_image
+from app.generation import GenerationParams
+from app.imaging import check_image
+
+# 处理一批输入：[(行号, 输入对象)] -> 与之顺序一致的结果对象
+ProcessBatch = Callable[[list[tuple[int, dict[str, Any]]]], list[dict[str, Any]]]
+
+RESULTS_FILE = "results.jsonl"
+
+
+def load_completed(results_path: Path) -> set[int]:
+    """
+    读取已成功处理的行号。
+
+    上次崩溃时可能留下写了一半的最后一行，读取前先截断到最后一个完整行。
+
+    Args:
+        results_path: 结果文件路径
+
+    Returns:
+        已成功的输入行号
+    """
+    if not results_path.exists():
+        return set()
+
+    data = results_path.read_bytes()
+    if data and not data.endswith(b"\n"):
+        data = data[: data.rfind(b"\n") + 1]
+        with open(results_path, "r+b") as f:
+            f.truncate(len(data))
+
+    completed: set[int] = set()
+    for line in data.decode("utf-8").splitlines():
+        record = json.loads(line)
+        if "error" in record:
+            completed.discard(record["line"])
+        else:
+            completed.add(record["line"])
+    return completed
+
+
+def read_inputs(input_path: Path, skip: set[int]) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    """逐行读取输入，跳过空行和已完成的行；无法解析的行产出错误信息字符串。"""
+    with open(input_path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if index in skip or not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield index, f"Invalid JSON: {exc}"
+
+
+def run_jsonl(
+    input_path: Path, output_dir: Path, process: ProcessBatch, batch_size: int
+) -> dict[str, int]:
+    """
+    按批处理输入文件，每批结束后把结果追加到 ``results.jsonl`` 并落盘。
+
+    整批失败时逐条重试，只有真正出错的行记为失败。
+
+    Args:
+        input_path: 输入 JSONL 文件
+        output_dir: 输出目录
+        process: 处理一批输入的函数
+        batch_size: 每批的行数
+
+    Returns:
+        本次运行的统计：succeeded / failed / skipped
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / RESULTS_FILE
+    completed = load_completed(results_path)
+    stats = {"succeeded": 0, "failed": 0, "skipped": len(completed)}
+    if completed:
+        print(f"[Batch] Resuming: {len(completed)} line(s) already done")
+
+    with open(results_path, "a", encoding="utf-8") as out:
+
+        def write(records: list[dict[str, Any]]) -> None:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                stats["failed" if "error" in record else "succeeded"] += 1
+            out.flush()
+            os.fsync(out.fileno())
+
+        def flush(batch: list[tuple[int, dict[str, Any]]]) -> None:
+            start = time.perf_counter()
+            try:
+                results = process(batch)
+            except Exception:
+                # 整批失败时逐条重试，找出真正出错的行
+                results = []
+                for item in batch:
+                    try:
+                        results.extend(process([item]))
+                    except Exception as exc:
+                        results.append({"error": str(exc)})
+            write([{"line": index, **result} for (index, _), result in zip(batch, results)])
+            elapsed = time.perf_counter() - start
+            print(f"[Batch] Processed lines {batch[0][0]}-{batch[-1][0]} in {elapsed:.1f}s")
+
+        batch: list[tuple[int, dict[str, Any]]] = []
+        for index, item in read_inputs(input_path, completed):
+            if isinstance(item, str):
+                write([{"line": index, "error": item}])
+                continue
+            batch.append((index, item))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    return stats
+
+
+def t2i_processor(output_dir: Path) -> ProcessBatch:
+    """加载文生图模型，返回处理一批提示词并把图像写入输出目录的函数。"""
+    from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+
+    model = HunyuanDiTModel()
+
+    def process(batch: list[tuple[int, dict[str, Any]]]) -> list[dict[str, Any]]:
+        jobs = []
+        for _, item in batch:
+            params = GenerationParams.create(
+                item.get("steps"),
+                item.get("guidance_scale"),
+                item.get("height"),
+                item.get("width"),
+                item.get("sampler"),
+            )
+            jobs.append(T2IJob(item["prompt"], item.get("seed"), params))
+        # 生成参数不同的行由模型分组，各组一次扩散推理
+        images = model.generate_images(jobs)
+
+        results = []
+        for (index, item), job, image in zip(batch, jobs, images):
+            format = OutputFormat(item["format"]) if item.get("format") else None
+            options = EncodeOptions.create(format, item.get("quality"), item.get("compress_level"))
+            name = f"{index:06d}.{options.format.value}"
+            # 先写图像再写结果行，结果行存在即表示图像完整
+            tmp_path = output_dir / f"{name}.tmp"
+            tmp_path.write_bytes(encode_image(image, options))
+            os.replace(tmp_path, output_dir / name)
+            results.append(
+                {
+                    "image": name,
+                    "format": options.format.value,
+                    "steps": job.params.num_inference_steps,
+                    "sampler": job.params.sampler,
+                }
+            )
+        return results
+
+    return process
+
+
+def vl_processor(input_dir: Path) -> ProcessBatch:
+    """加载视觉语言模型，返回处理一批 (图像, 问题) 的函数。"""
+    from app.models.vl_qwen import QwenVLModel, VLJob
+
+    model = QwenVLModel()
+
+    def process(batch: list[tuple[int, dict[str, Any]]]) -> list[dict[str, Any]]:
+        jobs = []
+        for _, item in batch:
+            image_bytes = (input_dir / item["image"]).read_bytes()
+            check_image(image_bytes)
+            jobs.append(
+                VLJob(
+                    image_bytes,
+                    item["question"],
+                    item.get("min_pixels"),
+                    item.get("max_pixels"),
+                )
+            )
+        answers = model.understand_images(jobs)
+        return [{"answer": a.text, "vision_cache_hit": a.vision_cache_hit} for a in answers]
+
+    return process
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline JSONL batch runner")
+    parser.add_argument("mode", choices=["t2i", "vl"])
+    parser.add_argument("input", type=Path, help="输入 JSONL 文件")
+    parser.add_argument("output_dir", type=Path, help="输出目录（results.jsonl 和生成的图像）")
+    parser.add_argument("--batch-size", type=int, default=0, help="0 表示使用微批配置")
+    args = parser.parse_args()
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    configure_threads()
+    if args.mode == "t2i":
+        process = t2i_processor(args.output_dir)
+        batch_size = args.batch_size or settings.t2i_max_batch_size
+    else:
+        process = vl_processor(args.input.resolve().parent)
+        batch_size = args.batch_size or settings.vl_max_batch_size
+
+    start = time.perf_counter()
+    stats = run_jsonl(args.input, args.output_dir, process, batch_size)
+    print(
+        f"[Batch] Done in {time.perf_counter() - start:.1f}s: {stats['succeeded']} succeeded, "
+        f"{stats['failed']} failed, {stats['skipped']} skipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
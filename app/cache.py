@@ -0,0 +1,243 @@
+"""结果缓存：按容量淘汰的内存 LRU，以及可跨进程重启保留的磁盘缓存。"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+def make_key(**fields: Any) -> str:
+    """
+    根据输入字段生成内容寻址的缓存键。
+
+    Args:
+        **fields: 影响结果的全部输入（必须可 JSON 序列化）
+
+    Returns:
+        字段的 SHA-256 十六进制摘要
+    """
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache(Generic[K, V]):
+    """
+    线程安全的 LRU 缓存，按总容量淘汰。
+
+    容量的单位由 ``sizeof`` 决定：默认每个条目计 1（即按条目数限制），
+    传入 ``len`` 则按字节数限制。
+    """
+
+    def __init__(self, capacity: int, sizeof: Callable[[V], int] = lambda _: 1) -> None:
+        self.capacity = capacity
+        self._sizeof = sizeof
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        """读取条目并标记为最近使用；不存在时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        """写入条目，必要时淘汰最久未使用的条目。"""
+        size = self._sizeof(value)
+        # 单个条目比整个缓存还大时直接放弃，避免清空所有内容
+        if size > self.capacity:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+
+            while self._size > self.capacity:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def pop(self, key: K) -> V | None:
+        """移除并返回条目；不存在时返回 None。"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._size -= entry[1]
+            return entry[0]
+
+    def evict_while(self, predicate: Callable[[V], bool]) -> int:
+        """
+        从最久未使用的一端依次淘汰满足条件的条目，遇到第一个不满足的条目即停止。
+
+        用于按空闲时间过期：条目按最近使用排序，较新的条目不必再检查。
+
+        Returns:
+            淘汰的条目数
+        """
+        evicted = 0
+        with self._lock:
+            while self._entries:
+                key, (value, size) = next(iter(self._entries.items()))
+                if not predicate(value):
+                    break
+                del self._entries[key]
+                self._size -= size
+                evicted += 1
+        return evicted
+
+    @property
+    def size(self) -> int:
+        """当前占用的容量。"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    磁盘字节缓存，每个条目一个文件，按总字节数淘汰。
+
+    启动时扫描目录恢复索引，文件的修改时间即最近使用时间，
+    因此进程重启后缓存和淘汰顺序都能保留。
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int, suffix: str = ".bin") -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # 按修改时间从旧到新恢复索引
+        files = sorted(self.directory.glob(f"*{suffix}"), key=lambda p: p.stat().st_mtime)
+        self._entries: OrderedDict[str, int] = OrderedDict(
+            (path.name[: -len(suffix)], path.stat().st_size) for path in files
+        )
+        self._size = sum(self._entries.values())
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> bytes | None:
+        """读取条目并刷新其最近使用时间；不存在时返回 None。"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except FileNotFoundError:
+                # 文件被外部删除，同步索引
+                self._size -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """写入条目（锁外先写临时文件，再在锁内原子替换），必要时淘汰旧条目。"""
+        if len(data) > self.max_bytes:
+            return
+
+        # 临时文件名唯一：同一个键并发写入、或多个进程共用缓存目录时互不覆盖对方的临时文件
+        path = self._path(key)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+        with self._lock:
+            os.replace(tmp_name, path)
+
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._path(key).unlink(missing_ok=True)
+
+    @property
+    def size(self) -> int:
+        """当前占用的字节数。"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    内存 + 磁盘两级字节缓存。
+
+    读取顺序：内存 -> 磁盘（命中后提升到内存）。写入时两级同时写入。
+    线程安全，磁盘读写较慢，在事件循环中应通过线程调用。
+    """
+
+    def __init__(self, memory_bytes: int, disk_dir: str | Path, disk_bytes: int) -> None:
+        self.memory: LRUCache[str, bytes] = LRUCache(memory_bytes, sizeof=len)
+        self.disk = DiskCache(disk_dir, disk_bytes)
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        """按层级查找条目并更新命中计数。"""
+        data = self.memory.get(key)
+        if data is not None:
+            with self._stats_lock:
+                self.memory_hits += 1
+            return data
+
+        data = self.disk.get(key)
+        if data is not None:
+            with self._stats_lock:
+                self.disk_hits += 1
+            self.memory.put(key, data)
+            return data
+
+        with self._stats_lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """同时写入内存和磁盘。"""
+        self.memory.put(key, data)
+        self.disk.put(key, data)
+
+    def stats(self) -> dict[str, int]:
+        """命中/未命中计数和各层占用情况。"""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk.size,
+        }
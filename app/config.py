@@ -14,8 +14,13 @@ class Settings(BaseSettings):
         case_sensitive=False,
     )
 
-    # 服务模式：可选 "t2i"（文生图）或 "vl"（图片理解）
-    service_mode: Literal["t2i", "vl"] = "t2i"
+    # 服务模式：可选 "t2i"（文生图）、"vl"（图片理解）或 "all"（同一进程同时提供两者，
+    # 模型在首次使用时加载，按下面的内存预算和空闲时间卸载）
+    service_mode: Literal["t2i", "vl", "all"] = "t2i"
+    # SERVICE_MODE=all 时常驻模型的内存预算（MB），超出时按 LRU 卸载空闲模型；0 表示不限制
+    model_memory_budget_mb: int = 0
+    # SERVICE_MODE=all 时模型空闲多少秒后卸载，0 表示不按空闲时间卸载
+    model_idle_offload_s: float = 0.0
 
     # 设备配置
     device: Literal["cpu", "cuda"] = "cpu"
@@ -23,6 +28,34 @@ class Settings(BaseSettings):
     # Hugging Face 缓存目录
     hf_cache_dir: str | None = None
 
+    # CPU 加速档位：baseline（float32）/ fast（bfloat16 autocast + channels_last）/
+    # max（再用 torch.compile 编译去噪网络和 VL 解码器），仅在 device=cpu 时生效
+    cpu_profile: Literal["baseline", "fast", "max"] = "baseline"
+    torch_compile_cache_dir: str = ".cache/torch_compile"
+    # torch 算子内 / 算子间线程数，0 表示使用 torch 默认值
+    # （多副本模式下每个副本的算子内线程数由 worker_threads_per_replica 决定）
+    torch_num_threads: int = 0
+    torch_interop_threads: int = 0
+
+    # 权重加载：跳过随机初始化，直接把 safetensors 权重载入空模型，峰值内存接近模型大小
+    low_cpu_mem_usage: bool = True
+    # 本地模型快照目录：首次加载后按服务 dtype 另存一份 safetensors，之后直接从快照加载；
+    # 空字符串表示不使用快照
+    model_snapshot_dir: str = ""
+
+    # VL 模型 int8 动态量化（仅 CPU）：none / int8（量化语言解码器和 lm_head 的线性层）
+    vl_quantization: Literal["none", "int8"] = "none"
+    # 同时量化视觉编码器的线性层（对细节多的图像影响更明显，默认关闭）
+    vl_quantize_vision: bool = False
+    # 量化后模型的缓存目录，之后的启动直接加载；空字符串表示每次启动都重新量化
+    quantized_cache_dir: str = ".cache/quantized"
+
+    # 模型在应用启动时于后台加载，加载完成后先做一次预热推理再接收请求
+    startup_warmup: bool = True
+    # 预热时文生图的去噪步数、视觉语言生成的 token 数（只需覆盖所有算子，不必完整生成）
+    t2i_warmup_steps: int = 2
+    vl_warmup_new_tokens: int = 4
+
     # 模型路径（可覆盖默认的 HuggingFace 模型 ID）
     # NOTE: HunyuanDiT 1.5B 具体模型待确认，当前使用标准版本
     # 可选: Tencent-Hunyuan/HunyuanDiT-v1.2-Diffusers-Distill (蒸馏版，参数量未明确)
@@ -33,9 +66,89 @@ class Settings(BaseSettings):
     t2i_guidance_scale: float = 7.5
     t2i_height: int = 768  # HunyuanDiT最小尺寸，不能再小了
     t2i_width: int = 1024
+    # 默认采样器：default 为模型自带的调度器，可选 ddim / euler / dpmpp_2m / unipc
+    t2i_sampler: Literal["default", "ddim", "euler", "dpmpp_2m", "unipc"] = "default"
+
+    # 请求可以覆盖步数、引导系数、分辨率、采样器和图像数，服务端按以下上限约束
+    # （见 app/generation.py）
+    # 整个请求的计算量（步数 × 百万像素 × 图像数，启用引导时乘 2）超过预算时自动减少步数
+    t2i_max_steps: int = 50
+    t2i_max_pixels: int = 1024 * 1024
+    t2i_max_images_per_request: int = 4
+    t2i_max_step_megapixels: float = 100.0
+
+    # 动态微批：在时间窗口内把并发请求合并成一次批量推理
+    t2i_max_batch_size: int = 4
+    t2i_batch_max_wait_ms: float = 50.0
+
+    # 准入控制：排队请求数上限，超出时直接返回 429
+    t2i_max_queue_depth: int = 32
+
+    # 提示词编码 LRU 缓存的总字节数（模板化提示词重复率高，编码结果可复用；
+    # 每个提示词的 BERT + T5 编码约 2.3 MB（float32）），0 表示关闭
+    t2i_prompt_embed_cache_bytes: int = 256 * 1024 * 1024
+
+    # WebSocket 渐进式预览：每 N 步发送一帧，预览耗时不超过去噪耗时的给定比例
+    t2i_preview_every_n_steps: int = 2
+    t2i_preview_max_overhead: float = 0.05
+
+    # 输出编码：默认格式（png / webp / jpeg）、PNG 压缩级别（0-9）、WebP/JPEG 质量（1-100）
+    # 编码在独立线程池中执行，与下一批推理重叠
+    t2i_output_format: str = "png"
+    t2i_png_compress_level: int = 6
+    t2i_output_quality: int = 90
+    t2i_encoder_threads: int = 2
+
+    # 文生图结果缓存（内存 LRU + 磁盘两级，仅缓存显式指定 seed 的请求）
+    t2i_cache_enabled: bool = True
+    t2i_cache_dir: str = ".cache/t2i"
+    t2i_cache_memory_bytes: int = 256 * 1024 * 1024
+    t2i_cache_disk_bytes: int = 2 * 1024 * 1024 * 1024
 
     vl_max_new_tokens: int = 256
 
+    # 动态微批：多个 (图像, 问题) 合并成一次 prefill + 批量解码
+    vl_max_batch_size: int = 4
+    vl_batch_max_wait_ms: float = 50.0
+
+    # 准入控制：排队请求数上限，超出时直接返回 429
+    vl_max_queue_depth: int = 64
+
+    # 输入图像上限：请求体字节数，以及按文件头尺寸检查的像素数（超出返回 413）
+    vl_max_image_bytes: int = 20 * 1024 * 1024
+    vl_max_image_pixels: int = 40_000_000
+
+    # 视觉编码的像素预算：图像缩放到该范围内并对齐 28 像素网格（每 28x28 像素一个视觉 token），
+    # 视觉 token 数因此不超过 vl_max_pixels / 784；请求可以指定更小的预算，但不能超过该上限
+    vl_min_pixels: int = 4 * 28 * 28
+    vl_max_pixels: int = 1280 * 28 * 28
+
+    # 视觉特征缓存（按图像字节哈希），同一张图的追问跳过视觉编码器；0 表示关闭
+    vl_vision_cache_bytes: int = 256 * 1024 * 1024
+
+    # 多轮会话：保留图像和此前各轮对话的 KV cache，追问只需 prefill 新问题的 tokens
+    # 空闲超过 vl_session_idle_s 秒的会话被关闭；API 进程最多保留 vl_max_sessions 个会话，
+    # 模型进程中会话 KV cache 的总字节数不超过 vl_session_cache_bytes（超出时淘汰最久未用的，
+    # 被淘汰的会话下一轮按对话历史重新 prefill）
+    vl_session_idle_s: float = 600.0
+    vl_max_sessions: int = 256
+    vl_session_cache_bytes: int = 1024 * 1024 * 1024
+
+    # 多进程模型副本数：0 表示在 API 进程内加载单个模型；
+    # 大于 0 时每个副本在独立进程中运行，请求派发给负载最低的副本
+    worker_replicas: int = 0
+    # 每个副本的 torch 线程数，0 表示按 CPU 核数平均分配
+    worker_threads_per_replica: int = 0
+
+    # 默认请求截止时间（秒），可被 X-Deadline-Ms 请求头覆盖；0 表示不限
+    # 排队超过截止时间的请求不再执行，直接返回 503
+    request_deadline_s: float = 0.0
+
+    # 异步任务（POST .../jobs）的状态和结果存放目录
+    jobs_dir: str = ".cache/jobs"
+    # 任务结束后保留多久（秒），之后连同结果文件删除（启动时和之后定期清理）；0 表示永久保留
+    job_ttl_seconds: float = 7 * 24 * 3600
+
     # 服务器设置
     host: str = "0.0.0.0"
     port: int = 8000
@@ -43,5 +156,41 @@ class Settings(BaseSettings):
     # 演示模式（跳过加载真实模型，用于测试）
     demo_mode: bool = False
 
+    # 按请求的性能剖析：请求带 X-Profile 请求头（或 profile 查询参数）且值等于 profile_token 时
+    # 剖析该请求所在的整批推理；另外按 profile_sample_rate 随机抽样。令牌为空且抽样率为 0 时完全关闭
+    profile_token: str = ""
+    profile_sample_rate: float = 0.0
+    # torch（torch.profiler 的 Chrome trace）/ cprofile（cProfile 统计）
+    profiler: Literal["torch", "cprofile"] = "torch"
+    profile_dir: str = ".cache/profiles"
+
+    # 模型后端：real（加载真实权重）/ simulated（按下面的代价模型模拟推理耗时、内存和失败，
+    # 不需要权重；路由、调度、缓存等其余部分与真实后端相同，用于容量规划和压测）
+    model_backend: Literal["real", "simulated"] = "real"
+    # 模拟耗时的方式：sleep（只等待）/ cpu（在推理线程中真实占用 CPU）
+    sim_busy_mode: Literal["sleep", "cpu"] = "sleep"
+    # 模拟的模型加载耗时（秒）和常驻内存（MB）
+    sim_load_seconds: float = 0.0
+    sim_model_memory_mb: int = 0
+    # 每批的瞬时内存（MB/请求），推理期间分配，结束后释放
+    sim_batch_memory_mb: int = 0
+    # 批处理加速曲线：n 个请求一批的耗时 = 单个请求耗时 × n ** sim_batch_exponent
+    # （1 表示批处理没有收益，0 表示整批和单个请求一样快）
+    sim_batch_exponent: float = 0.7
+    # 每批失败的概率（抛出异常，该批所有请求返回错误）
+    sim_failure_rate: float = 0.0
+    # 文生图单张耗时 = 固定耗时 + 步数 × (每步耗时 + 每步每百万像素耗时 × 百万像素)
+    sim_t2i_fixed_ms: float = 50.0
+    sim_t2i_step_ms: float = 20.0
+    sim_t2i_step_ms_per_megapixel: float = 100.0
+    # 视觉语言单个请求耗时 = 固定耗时 + 视觉编码（每百万像素，命中视觉特征缓存时跳过）
+    #     + prefill（每个输入 token）+ 解码（每个生成 token）
+    sim_vl_fixed_ms: float = 20.0
+    sim_vl_vision_ms_per_megapixel: float = 200.0
+    sim_vl_prefill_ms_per_token: float = 0.5
+    sim_vl_decode_ms_per_token: float = 15.0
+    # 模拟回答的 token 数（不超过 max_new_tokens）
+    sim_vl_answer_tokens: int = 32
+
 
 settings = Settings()
@@ -0,0 +1,150 @@
+"""
+文生图输出编码：PNG / WebP / JPEG，按请求选择格式和压缩参数。
+
+编码在独立的编码线程池中执行，不占用推理调度器：
+上一批图像在编码时，下一批已经可以开始去噪。
+Pillow 的编码器在压缩时会释放 GIL，多个编码线程可以真正并行。
+"""
+
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+
+from PIL import Image
+
+from app import metrics
+from app.config import settings
+
+
+class OutputFormat(str, Enum):
+    """支持的输出格式。"""
+
+    PNG = "png"
+    WEBP = "webp"
+    JPEG = "jpeg"
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.value}"
+
+
+# Accept 头中的 MIME 类型 -> 输出格式
+_MEDIA_TYPES = {
+    "image/png": OutputFormat.PNG,
+    "image/webp": OutputFormat.WEBP,
+    "image/jpeg": OutputFormat.JPEG,
+    "image/jpg": OutputFormat.JPEG,
+}
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    """
+    编码参数。
+
+    Attributes:
+        format: 输出格式
+        quality: WebP / JPEG 的质量（1-100），PNG 忽略
+        compress_level: PNG 的 zlib 压缩级别（0-9），其他格式忽略
+    """
+
+    format: OutputFormat = OutputFormat.PNG
+    quality: int | None = None
+    compress_level: int | None = None
+
+    @classmethod
+    def create(
+        cls,
+        format: OutputFormat | None = None,
+        quality: int | None = None,
+        compress_level: int | None = None,
+    ) -> "EncodeOptions":
+        """用配置中的默认值补全未指定的参数，只保留与所选格式相关的字段（便于作缓存键）。"""
+        format = format or OutputFormat(settings.t2i_output_format)
+        if format is OutputFormat.PNG:
+            level = settings.t2i_png_compress_level if compress_level is None else compress_level
+            return cls(format, compress_level=level)
+        return cls(format, quality=settings.t2i_output_quality if quality is None else quality)
+
+
+def encode_image(image: Image.Image, options: EncodeOptions) -> bytes:
+    """
+    把 PIL 图像编码成字节。
+
+    Args:
+        image: 待编码的图像
+        options: 格式与压缩参数
+
+    Returns:
+        编码后的图像字节
+    """
+    buf = io.BytesIO()
+    with metrics.stage("t2i", f"{options.format.value}_encode"):
+        if options.format is OutputFormat.PNG:
+            image.save(buf, format="PNG", compress_level=options.compress_level)
+        elif options.format is OutputFormat.WEBP:
+            image.save(buf, format="WEBP", quality=options.quality, method=4)
+        else:
+            image.convert("RGB").save(buf, format="JPEG", quality=options.quality)
+    # getvalue 直接返回底层缓冲区的拷贝，不需要 seek + read 再拷贝一次
+    return buf.getvalue()
+
+
+_encoder_pool: ThreadPoolExecutor | None = None
+
+
+def get_encoder_pool() -> ThreadPoolExecutor:
+    """获取或初始化编码线程池（单例模式）。"""
+    global _encoder_pool
+    if _encoder_pool is None:
+        _encoder_pool = ThreadPoolExecutor(
+            max_workers=settings.t2i_encoder_threads, thread_name_prefix="image-encoder"
+        )
+    return _encoder_pool
+
+
+async def encode_image_async(image: Image.Image, options: EncodeOptions) -> bytes:
+    """在编码线程池中编码图像，不阻塞事件循环，也不占用推理调度器。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_encoder_pool(), encode_image, image, options)
+
+
+def negotiate_format(accept: str | None) -> OutputFormat | None:
+    """
+    根据 Accept 请求头选择输出格式。
+
+    按 q 值从高到低选择第一个支持的格式；q 值相同时按 Accept 中出现的顺序。
+    没有 Accept 头或接受任意图像（``image/*``、``*/*``）时使用配置的默认格式。
+
+    Args:
+        accept: Accept 请求头
+
+    Returns:
+        选中的格式；客户端只接受不支持的类型时返回 None
+    """
+    default = OutputFormat(settings.t2i_output_format)
+    if not accept:
+        return default
+
+    candidates: list[tuple[float, int, str]] = []
+    for index, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, index, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in _MEDIA_TYPES:
+            return _MEDIA_TYPES[media_type]
+        if media_type in ("image/*", "*/*"):
+            return default
+    return None
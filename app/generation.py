@@ -0,0 +1,115 @@
+"""
+文生图生成参数：去噪步数、引导系数、分辨率和采样器，可以按请求覆盖配置中的默认值。
+
+服务端按以下规则限制单个请求的代价：
+    - 分辨率映射到 HunyuanDiT 支持的标准尺寸（与 pipeline 的分辨率分桶一致），
+      像素数超过 T2I_MAX_PIXELS 时拒绝
+    - 每个请求最多生成 T2I_MAX_IMAGES_PER_REQUEST 张图像
+    - 去噪步数不超过 T2I_MAX_STEPS；整个请求的计算量（步数 × 百万像素 × 图像数，
+      启用引导时再乘 2）不超过 T2I_MAX_STEP_MEGAPIXELS，超出时减少步数，1 步仍超出时拒绝
+
+实际使用的参数随响应返回。参数相同的请求才能合并进同一批推理。
+"""
+
+from dataclasses import dataclass
+from typing import Literal
+
+from diffusers.pipelines.hunyuandit.pipeline_hunyuandit import (
+    SUPPORTED_SHAPE,
+    map_to_standard_shapes,
+)
+from fastapi import HTTPException
+
+from app.config import settings
+
+# default 为模型自带的调度器，其余为少步数下质量更好的多步采样器
+Sampler = Literal["default", "ddim", "euler", "dpmpp_2m", "unipc"]
+
+
+def effective_size(height: int, width: int) -> tuple[int, int]:
+    """pipeline 实际生成的 (高, 宽)：不受支持的尺寸映射到最接近的标准尺寸。"""
+    if (height, width) in SUPPORTED_SHAPE:
+        return height, width
+    width, height = map_to_standard_shapes(width, height)
+    return int(height), int(width)
+
+
+@dataclass(frozen=True)
+class GenerationParams:
+    """
+    一次扩散推理的生成参数，同一批内的请求必须相同（也用作批次键）。
+
+    Attributes:
+        num_inference_steps: 去噪步数
+        guidance_scale: 无分类器引导系数，不大于 1 时关闭引导
+        height: 图像高度（标准尺寸）
+        width: 图像宽度（标准尺寸）
+        sampler: 采样器
+    """
+
+    num_inference_steps: int
+    guidance_scale: float
+    height: int
+    width: int
+    sampler: Sampler = "default"
+
+    @classmethod
+    def create(
+        cls,
+        num_inference_steps: int | None = None,
+        guidance_scale: float | None = None,
+        height: int | None = None,
+        width: int | None = None,
+        sampler: Sampler | None = None,
+        num_images: int = 1,
+    ) -> "GenerationParams":
+        """
+        用配置中的默认值补全未指定的参数，并按服务端上限约束。
+
+        Args:
+            num_inference_steps: 请求的去噪步数
+            guidance_scale: 引导系数
+            height: 图像高度
+            width: 图像宽度
+            sampler: 采样器
+            num_images: 同一请求生成的图像数（计入计算量）
+
+        Returns:
+            实际使用的参数（步数可能被减少）
+
+        Raises:
+            HTTPException: 分辨率或图像数超过上限，或 1 步也超出计算预算（422）
+        """
+        if num_images > settings.t2i_max_images_per_request:
+            raise HTTPException(
+                status_code=422,
+                detail=f"At most {settings.t2i_max_images_per_request} images per request",
+            )
+
+        height, width = effective_size(height or settings.t2i_height, width or settings.t2i_width)
+        if height * width > settings.t2i_max_pixels:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{width}x{height} exceeds {settings.t2i_max_pixels} pixels",
+            )
+
+        if guidance_scale is None:
+            guidance_scale = settings.t2i_guidance_scale
+        # 启用引导时每步对条件和无条件两个分支各做一次前向
+        step_cost = height * width / 1e6 * num_images * (2 if guidance_scale > 1 else 1)
+        max_steps = min(settings.t2i_max_steps, int(settings.t2i_max_step_megapixels / step_cost))
+        if max_steps < 1:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{num_images} image(s) at {width}x{height} exceed the compute budget",
+            )
+
+        return cls(
+            num_inference_steps=min(
+                num_inference_steps or settings.t2i_num_inference_steps, max_steps
+            ),
+            guidance_scale=guidance_scale,
+            height=height,
+            width=width,
+            sampler=sampler or settings.t2i_sampler,
+        )
@@ -0,0 +1,261 @@
+"""
+异步任务：提交后立即返回任务 ID，推理在后台进行，状态和结果持久化到本地目录。
+
+CPU 上一次生成可能需要几分钟，长时间占用 HTTP 连接容易被代理或客户端超时中断；
+任务接口让客户端提交后轮询 ``GET .../jobs/{job_id}``，结果在服务重启后仍可读取。
+结束超过 JOB_TTL_SECONDS 的任务连同结果文件一起删除（启动时和之后定期清理）。
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from app.config import settings
+
+# 定期清理过期任务的最长间隔（秒）
+_PRUNE_INTERVAL_S = 600.0
+
+
+class JobStatus(str, Enum):
+    """任务状态。"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """
+    一个异步任务的状态记录。
+
+    Attributes:
+        id: 任务 ID
+        kind: 任务类型（t2i / vl）
+        status: 当前状态
+        created_at: 提交时间（Unix 时间戳，下同）
+        started_at: 开始执行时间（所在批次被调度器派发给模型时；没有经过模型时为 None，
+            例如命中结果缓存或在排队中失败）
+        finished_at: 结束时间
+        result: 成功时的结果
+        error: 失败时的错误信息
+    """
+
+    id: str
+    kind: str
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict[str, Any] | None = None
+    error: str | None = None
+
+
+class JobResponse(BaseModel):
+    """任务状态响应模式。"""
+
+    job_id: str
+    kind: str
+    status: JobStatus
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict[str, Any] | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobResponse":
+        fields = asdict(job)
+        return cls(job_id=fields.pop("id"), **fields)
+
+
+class JobStore:
+    """
+    本地任务存储：每个任务一个 JSON 文件，二进制结果（例如生成的图像）单独一个文件。
+
+    写入都是先写临时文件再原子替换，进程崩溃不会留下半个文件。
+    启动时仍处于排队或执行中的任务已经随上一个进程丢失，标记为失败。
+
+    Args:
+        directory: 存放目录
+        ttl_seconds: 任务结束后保留多久（秒），之后连同结果文件删除；0 表示永久保留
+    """
+
+    def __init__(self, directory: str | Path, ttl_seconds: float = 0.0) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # 正在执行的后台任务，持有引用以免被垃圾回收
+        self._tasks: set[asyncio.Task[None]] = set()
+        # 定期清理的后台任务，绑定创建它的事件循环
+        self._pruner: asyncio.Task[None] | None = None
+        self._pruner_loop: asyncio.AbstractEventLoop | None = None
+
+        for path in self.directory.glob("*.json"):
+            job = self._read(path)
+            if job is not None and job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+                job.status = JobStatus.FAILED
+                job.error = "Interrupted by service restart"
+                job.finished_at = time.time()
+                self.save(job)
+        self.prune()
+
+    def _path(self, job_id: str, suffix: str = ".json") -> Path:
+        return self.directory / f"{job_id}{suffix}"
+
+    def _read(self, path: Path) -> Job | None:
+        try:
+            fields = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        fields["status"] = JobStatus(fields["status"])
+        return Job(**fields)
+
+    def _write(self, path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def create(self, kind: str) -> Job:
+        """创建一个排队中的任务并持久化。"""
+        job = Job(id=uuid.uuid4().hex, kind=kind, created_at=time.time())
+        self.save(job)
+        return job
+
+    def save(self, job: Job) -> None:
+        """持久化任务状态。"""
+        data = json.dumps(asdict(job), ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._write(self._path(job.id), data)
+
+    def get(self, job_id: str, kind: str | None = None) -> Job | None:
+        """
+        读取任务状态。
+
+        Args:
+            job_id: 任务 ID
+            kind: 指定时只返回该类型的任务
+
+        Returns:
+            任务记录；不存在（或类型不符）时返回 None
+        """
+        # 任务 ID 是 uuid4 的十六进制串，其他输入不能拼进路径
+        if len(job_id) != 32 or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        job = self._read(self._path(job_id))
+        if job is None or (kind is not None and job.kind != kind):
+            return None
+        return job
+
+    def put_data(self, job_id: str, data: bytes, suffix: str) -> None:
+        """保存任务的二进制结果。"""
+        self._write(self._path(job_id, suffix), data)
+
+    def get_data(self, job_id: str, suffix: str) -> bytes | None:
+        """读取任务的二进制结果；不存在时返回 None。"""
+        try:
+            return self._path(job_id, suffix).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def prune(self) -> int:
+        """
+        删除结束超过 ttl_seconds 的任务及其结果文件（阻塞调用，会扫描整个目录）。
+
+        Returns:
+            删除的任务数
+        """
+        if self.ttl_seconds <= 0:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for path in self.directory.glob("*.json"):
+            job = self._read(path)
+            if job is None or job.finished_at is None or job.finished_at >= cutoff:
+                continue
+            # 先删结果文件，最后删状态文件：中途崩溃时下次清理还能找到这个任务
+            for data_path in self.directory.glob(f"{job.id}.*"):
+                if data_path != path:
+                    data_path.unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            print(f"[Jobs] Pruned {removed} job(s) finished more than {self.ttl_seconds:.0f}s ago")
+        return removed
+
+    def _ensure_pruner(self) -> None:
+        """按需在当前事件循环上启动定期清理。"""
+        if self.ttl_seconds <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        if self._pruner_loop is loop and self._pruner is not None and not self._pruner.done():
+            return
+        self._pruner_loop = loop
+        self._pruner = loop.create_task(self._prune_periodically())
+
+    async def _prune_periodically(self) -> None:
+        interval = min(self.ttl_seconds, _PRUNE_INTERVAL_S)
+        while True:
+            await asyncio.sleep(interval)
+            # 扫描目录较慢，放到线程中，不阻塞事件循环
+            await asyncio.to_thread(self.prune)
+
+    def submit(
+        self, job: Job, run: Callable[[Callable[[], None]], Awaitable[dict[str, Any]]]
+    ) -> None:
+        """
+        在后台执行任务并随时持久化状态。
+
+        任务在调度器中排队期间保持 queued，``run`` 收到的回调被调用时才标记为 running。
+
+        Args:
+            job: ``create`` 返回的任务
+            run: 执行推理并返回结果字典的协程函数，参数是开始执行时的回调
+                （通常作为 ``RequestOptions.on_dispatch`` 交给调度器）
+        """
+        self._ensure_pruner()
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self, job: Job, run: Callable[[Callable[[], None]], Awaitable[dict[str, Any]]]
+    ) -> None:
+        def started() -> None:
+            job.status, job.started_at = JobStatus.RUNNING, time.time()
+            self.save(job)
+
+        try:
+            job.result = await run(started)
+            job.status = JobStatus.SUCCEEDED
+        except HTTPException as exc:
+            job.status, job.error = JobStatus.FAILED, str(exc.detail)
+        except Exception as exc:
+            job.status, job.error = JobStatus.FAILED, str(exc)
+        job.finished_at = time.time()
+        self.save(job)
+        print(f"[Jobs] {job.kind} job {job.id} {job.status.value}")
+
+
+_store: JobStore | None = None
+
+
+def get_job_store() -> JobStore:
+    """获取或初始化任务存储（单例模式）。"""
+    global _store
+    if _store is None:
+        _store = JobStore(settings.jobs_dir, settings.job_ttl_seconds)
+    return _store
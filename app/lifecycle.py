@@ -0,0 +1,151 @@
+"""
+模型生命周期：应用启动时在后台线程中加载并预热模型。
+
+加载期间事件循环不被阻塞，``/health`` 照常响应；推理请求在模型就绪前直接返回 503
+（带 Retry-After），而不是挂起几分钟。``/ready`` 汇报各模型的状态和耗时，供就绪探针使用。
+"""
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from enum import Enum
+from typing import Any, Generic, TypeVar
+
+from fastapi import HTTPException
+
+from app import metrics
+from app.config import settings
+from app.scheduler import AdmissionError
+
+T = TypeVar("T")
+
+# 模型加载中时建议客户端的重试间隔（秒）
+_RETRY_AFTER_S = 10.0
+
+
+class ModelState(str, Enum):
+    """模型加载状态。"""
+
+    PENDING = "pending"
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class ModelHandle(Generic[T]):
+    """
+    后台加载的模型句柄。
+
+    ``start`` 在后台线程中依次执行加载和预热；``get`` 在就绪后返回加载结果，
+    之前调用时抛出 503，不阻塞调用方。
+
+    Args:
+        name: 模型名称（t2i / vl）
+        load: 加载函数，在后台线程中执行
+        warmup: 预热函数，加载完成后以加载结果为参数执行一次（STARTUP_WARMUP 关闭时跳过）
+    """
+
+    def __init__(
+        self, name: str, load: Callable[[], T], warmup: Callable[[T], None] | None = None
+    ) -> None:
+        self.name = name
+        self._load = load
+        self._warmup = warmup
+        self._lock = threading.Lock()
+        self._value: T | None = None
+        self.state = ModelState.PENDING
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.warmup_seconds: float | None = None
+        self._started_at: float | None = None
+
+    def start(self) -> None:
+        """开始后台加载（重复调用无效）。"""
+        with self._lock:
+            if self.state is not ModelState.PENDING:
+                return
+            self.state = ModelState.LOADING
+            self._started_at = time.perf_counter()
+        threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True).start()
+
+    def _run(self) -> None:
+        try:
+            print(f"[{self.name.upper()}] Loading model in background...")
+            value = self._load()
+            self.load_seconds = time.perf_counter() - self._started_at
+
+            if self._warmup is not None and settings.startup_warmup:
+                self.state = ModelState.WARMING
+                start = time.perf_counter()
+                self._warmup(value)
+                self.warmup_seconds = time.perf_counter() - start
+                print(f"[{self.name.upper()}] Warmup finished in {self.warmup_seconds:.1f}s")
+
+            self._value = value
+            self.state = ModelState.READY
+        except Exception as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+            self.state = ModelState.FAILED
+            print(f"[{self.name.upper()}] Model failed to load: {self.error}")
+
+    @property
+    def ready(self) -> bool:
+        return self.state is ModelState.READY
+
+    def get(self) -> T:
+        """
+        获取加载结果。
+
+        Raises:
+            AdmissionError: 模型尚未就绪（503，带 Retry-After；未开始加载时顺便开始加载）
+            HTTPException: 模型加载失败（503）
+        """
+        if self.state is ModelState.READY:
+            return self._value
+        if self.state is ModelState.FAILED:
+            raise HTTPException(status_code=503, detail=f"Model failed to load: {self.error}")
+        self.start()
+        raise AdmissionError(503, f"Model is {self.state.value}", retry_after=_RETRY_AFTER_S)
+
+    def status(self) -> dict[str, Any]:
+        """状态和耗时（秒）。"""
+        elapsed = None
+        if self._started_at is not None and self.state in (ModelState.LOADING, ModelState.WARMING):
+            elapsed = time.perf_counter() - self._started_at
+        return {
+            "state": self.state.value,
+            "elapsed_seconds": elapsed,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+_handles: list[ModelHandle[Any]] = []
+
+
+def register(handle: ModelHandle[T]) -> ModelHandle[T]:
+    """注册模型句柄：应用启动时开始加载，并纳入 /ready 和 /metrics。"""
+    _handles.append(handle)
+    return handle
+
+
+def handles() -> list[ModelHandle[Any]]:
+    """当前进程中注册的所有模型句柄。"""
+    return list(_handles)
+
+
+def _collect_metrics() -> Iterator[metrics.Sample]:
+    """抓取 /metrics 时读取各模型是否就绪。"""
+    for handle in _handles:
+        yield (
+            "model_ready",
+            "gauge",
+            "Whether the model is loaded and warmed up",
+            {"model": handle.name},
+            float(handle.ready),
+        )
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
@@ -1,14 +1,36 @@
 """FastAPI 应用程序入口。"""
 
-from fastapi import FastAPI
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from app import lifecycle, metrics, model_manager
+from app.acceleration import configure_threads
 from app.config import settings
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """启动时在后台开始加载模型，不等加载完成就开始接收请求。"""
+    if lifecycle.handles():
+        configure_threads()
+    for handle in lifecycle.handles():
+        handle.start()
+    if settings.service_mode == "all" and not settings.demo_mode:
+        model_manager.get_manager().start()
+    yield
+
+
 app = FastAPI(
     title="FastAPI Vision Service",
     description="Text-to-Image and Vision-Language API",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -20,22 +42,79 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """统计正在处理的请求数和按路由的请求耗时。"""
+    metrics.HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        # 被剖析的请求返回 trace ID（见 app.profiling）
+        trace_id = getattr(request.state, "trace_id", None)
+        if trace_id is not None:
+            response.headers["X-Trace-Id"] = trace_id
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        # 用路由模板而不是原始路径作标签，避免标签基数无限增长
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, request.method, path, status
+        )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Prometheus 文本格式的指标：各阶段耗时、队列深度、缓存命中率、模型加载耗时等。"""
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/health")
 # 联合类型
-async def health_check() -> dict[str, str | bool]:
-    """健康检查端点。"""
+async def health_check() -> dict[str, str | bool | dict[str, str]]:
+    """健康检查端点（存活探针：模型加载期间同样返回 200）。"""
     return {
         "status": "healthy",
         "mode": settings.service_mode,
         "device": settings.device,
+        "models": {handle.name: handle.state.value for handle in lifecycle.handles()},
     }
 
 
+@app.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """
+    就绪探针：所有模型加载并预热完成时返回 200，否则返回 503。
+
+    响应中包含各模型的状态（pending / loading / warming / ready / failed）和耗时。
+    """
+    handles = lifecycle.handles()
+    ready = all(handle.ready for handle in handles)
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "models": {handle.name: handle.status() for handle in handles},
+        },
+        status_code=200 if ready else 503,
+    )
+
+
 if settings.demo_mode:
-    from app.routers import t2i_simple
+    # 演示模式：按服务模式挂载不加载模型的演示路由
+    from app.routers import t2i_simple, vl_simple
 
-    app.include_router(t2i_simple.router)
-    print("Service running in DEMO MODE (no real models)")
+    if settings.service_mode in ("t2i", "all"):
+        app.include_router(t2i_simple.router)
+    if settings.service_mode in ("vl", "all"):
+        app.include_router(vl_simple.router)
+    print(f"Service running in DEMO MODE (no real models), mode: {settings.service_mode}")
 
 elif settings.service_mode == "t2i":
     from app.routers import t2i
@@ -49,6 +128,19 @@ elif settings.service_mode == "vl":
     app.include_router(vl.router)
     print(f"Service running in VISION-LANGUAGE mode on {settings.device}")
 
+elif settings.service_mode == "all":
+    from app.routers import t2i, vl
+
+    app.include_router(t2i.router)
+    app.include_router(vl.router)
+
+    @app.get("/models")
+    async def model_residency() -> dict[str, Any]:
+        """各模型是否常驻内存、估算大小、加载 / 卸载次数和重新加载耗时。"""
+        return model_manager.get_manager().report()
+
+    print(f"Service running in MULTI-MODEL mode (t2i + vl) on {settings.device}")
+
 else:
     raise ValueError(f"Invalid service_mode: {settings.service_mode}")
 
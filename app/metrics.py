@@ -0,0 +1,290 @@
+"""
+轻量级指标采集，以 Prometheus 文本格式导出。
+
+热路径上只做一次 ``perf_counter`` 和一次加锁的计数更新；
+队列深度、缓存占用等状态量不在请求路径上维护，而是在抓取 ``/metrics`` 时
+由注册的采集函数即时读取。
+
+多副本模式下模型在副本进程中运行，副本在每批结束后把指标增量发回 API 进程合并
+（见 ``export_delta`` / ``merge_delta``）。
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+# 指标名前缀
+PREFIX = "vision_service_"
+
+# 耗时直方图的默认分桶（秒）：覆盖从编码/拷贝的毫秒级到 CPU 扩散推理的分钟级
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0, 300.0,
+)  # fmt: skip
+
+# 标签值元组
+Labels = tuple[str, ...]
+
+
+class _Metric:
+    """指标基类：名称、说明、标签名，以及按标签值分组的数据。"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[Labels, Any] = {}
+
+    def _format_labels(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name + "_total", documentation, labelnames)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{self._format_labels(labels)} {_format(value)}"
+
+
+class Gauge(_Metric):
+    """可增可减的状态量。"""
+
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{self._format_labels(labels)} {_format(value)}"
+
+
+class Histogram(_Metric):
+    """分桶直方图（累计计数在导出时计算，记录时只给一个桶加一）。"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数（最后一个是 +Inf 桶）, 总和]
+
+    def _entry(self, labels: Labels) -> list[Any]:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        return entry
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._entry(labels)
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """记录代码块耗时。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((labels, (list(c), t)) for labels, (c, t) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{_format(bound)}"'
+                yield f"{self.name}_bucket{self._format_labels(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(labels)} {_format(total)}"
+            yield f"{self.name}_count{self._format_labels(labels)} {cumulative}"
+
+
+# 抓取时调用的采集函数：产出 (指标名, 类型, 说明, {标签: 值}, 数值)
+Sample = tuple[str, str, str, dict[str, str], float]
+Collector = Callable[[], Iterable[Sample]]
+
+
+class Registry:
+    """指标注册表。"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Collector) -> None:
+        """注册抓取时调用的采集函数（用于队列深度、缓存占用等现成的状态量）。"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式。"""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+
+        # 同名样本合并到同一个 HELP/TYPE 下
+        grouped: dict[str, tuple[str, str, list[str]]] = {}
+        for collector in self._collectors:
+            for name, kind, documentation, labels, value in collector():
+                name = PREFIX + name
+                pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                sample = f"{name}{{{pairs}}}" if pairs else name
+                sample += f" {_format(value)}"
+                grouped.setdefault(name, (kind, documentation, []))[2].append(sample)
+        for name, (kind, documentation, samples) in grouped.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+    def export_delta(self) -> dict[str, Any]:
+        """导出并清空计数器和直方图的增量，状态量导出当前值（副本进程使用）。"""
+        delta: dict[str, Any] = {}
+        for name, metric in self._metrics.items():
+            with metric._lock:
+                if not metric._values:
+                    continue
+                delta[name] = metric._values
+                if not isinstance(metric, Gauge):
+                    metric._values = {}
+                else:
+                    metric._values = dict(metric._values)
+        return delta
+
+    def merge_delta(self, delta: dict[str, Any]) -> None:
+        """合并副本进程发回的指标增量。"""
+        for name, values in delta.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            with metric._lock:
+                for labels, value in values.items():
+                    if isinstance(metric, Histogram):
+                        entry = metric._entry(labels)
+                        entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+                        entry[1] += value[1]
+                    elif isinstance(metric, Counter):
+                        metric._values[labels] = metric._values.get(labels, 0.0) + value
+                    else:
+                        metric._values[labels] = value
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+# 各阶段耗时：service 为 t2i / vl，stage 为具体阶段
+STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram("stage_seconds", "Time spent in each request stage", ("service", "stage"))
+)
+
+# 缓存查询次数：cache 为缓存名称，result 为 hit / miss
+CACHE_LOOKUPS: Counter = REGISTRY.register(
+    Counter("cache_lookups", "Cache lookups by result", ("cache", "result"))
+)
+
+# 模型加载耗时
+MODEL_LOAD_SECONDS: Gauge = REGISTRY.register(
+    Gauge("model_load_seconds", "Time taken to load each model", ("model",))
+)
+
+# 正在处理的 HTTP 请求数，以及按路由统计的请求耗时
+HTTP_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests currently being served")
+)
+HTTP_REQUEST_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+    )
+)
+
+
+def stage(service: str, name: str) -> Any:
+    """记录一个阶段的耗时，用法：``with metrics.stage("t2i", "denoise"): ...``。"""
+    return STAGE_SECONDS.time(service, name)
+
+
+def record_cache_lookup(cache: str, hit: bool, count: int = 1) -> None:
+    """记录缓存查询结果。"""
+    if count:
+        CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss", amount=count)
+
+
+def _cache_hit_ratios() -> Iterator[Sample]:
+    """由查询计数推导各缓存的命中率。"""
+    caches = {labels[0] for labels in list(CACHE_LOOKUPS._values)}
+    for cache in sorted(caches):
+        hits = CACHE_LOOKUPS.get(cache, "hit")
+        total = hits + CACHE_LOOKUPS.get(cache, "miss")
+        if total:
+            yield ("cache_hit_ratio", "gauge", "Cache hit ratio", {"cache": cache}, hits / total)
+
+
+REGISTRY.add_collector(_cache_hit_ratios)
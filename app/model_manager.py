@@ -0,0 +1,343 @@
+"""
+单进程多模型管理：SERVICE_MODE=all 时同一进程同时提供文生图和视觉语言服务。
+
+两个模型都在首次使用时才加载；常驻模型的总大小超过 MODEL_MEMORY_BUDGET_MB 时，
+按最近最少使用（LRU）的顺序卸载当前没有在推理的模型，空闲超过 MODEL_IDLE_OFFLOAD_S
+的模型也会被卸载。卸载即释放权重，流量回来时重新加载；配置 MODEL_SNAPSHOT_DIR 后
+重新加载直接从本地 safetensors 快照内存映射，不必再做下载、dtype 转换或量化。
+
+模型大小按 torch 参数和 buffer 的字节数与加载前后进程 RSS 的增量二者取大估算
+（量化后的权重不在 parameters() 中，模拟模型没有 torch 参数）。
+"""
+
+import gc
+import itertools
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from app import metrics
+from app.config import settings
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes() -> int:
+    """当前进程的常驻内存（字节），无法读取时返回 0。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _tensor_bytes(model: Any) -> int:
+    """模型对象（及其 diffusers 管线组件）中 torch 参数和 buffer 的字节数。"""
+    import torch
+
+    modules = [v for v in vars(model).values() if isinstance(v, torch.nn.Module)]
+    pipe = getattr(model, "pipe", None)
+    if pipe is not None:
+        modules += [c for c in pipe.components.values() if isinstance(c, torch.nn.Module)]
+    tensors = {
+        id(t): t
+        for module in modules
+        for t in itertools.chain(module.parameters(), module.buffers())
+    }
+    return sum(t.nelement() * t.element_size() for t in tensors.values())
+
+
+@dataclass
+class _Entry:
+    """一个受管理的模型及其统计。"""
+
+    name: str
+    factory: Callable[[], Any]
+    model: Any = None
+    # 最近一次加载估算的大小（字节），尚未加载过时为 0
+    size_bytes: int = 0
+    # 正在使用该模型的批数，大于 0 时不会被卸载
+    in_use: int = 0
+    last_used: float = 0.0
+    loaded_at: float = 0.0
+    loads: int = 0
+    offloads: int = 0
+    first_load_seconds: float | None = None
+    last_reload_seconds: float | None = None
+    total_reload_seconds: float = 0.0
+    # 累计常驻时间（秒，不含当前这次）
+    resident_seconds: float = 0.0
+    # 最近一次卸载的原因：budget / idle / manual
+    last_offload_reason: str | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ModelManager:
+    """
+    在内存预算内按需加载、卸载多个模型。
+
+    推理线程通过 ``use(name)`` 取得模型：未加载时先按预算腾出空间再加载，
+    使用期间模型不会被卸载。
+
+    Args:
+        budget_bytes: 常驻模型总大小上限（字节），0 表示不限制
+        idle_offload_s: 空闲多久（秒）后卸载，0 表示不按空闲时间卸载
+    """
+
+    def __init__(self, budget_bytes: int = 0, idle_offload_s: float = 0.0) -> None:
+        self.budget_bytes = budget_bytes
+        self.idle_offload_s = idle_offload_s
+        self._entries: dict[str, _Entry] = {}
+        # 保护各模型的 model / in_use 等字段
+        self._lock = threading.Lock()
+        # 同一时刻只加载一个模型，使 RSS 增量只计入该模型
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: threading.Thread | None = None
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """
+        注册模型（不加载）。
+
+        Args:
+            name: 模型名称（t2i / vl）
+            factory: 加载模型的函数，在推理线程中调用
+        """
+        self._entries[name] = _Entry(name, factory)
+
+    def resident(self, name: str) -> Any:
+        """已加载的模型，未加载时返回 None（不触发加载）。"""
+        entry = self._entries.get(name)
+        return entry.model if entry is not None else None
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """
+        取得模型并在使用期间锁定（阻塞调用，在推理线程中使用）。
+
+        Raises:
+            KeyError: 模型未注册
+        """
+        entry = self._entries[name]
+        model = self._acquire(entry)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def _acquire(self, entry: _Entry) -> Any:
+        with self._lock:
+            if entry.model is not None:
+                entry.in_use += 1
+                return entry.model
+
+        with entry.lock:
+            # 等锁期间可能已被其他线程加载
+            with self._lock:
+                if entry.model is not None:
+                    entry.in_use += 1
+                    return entry.model
+
+            with self._load_lock:
+                # 按上次加载的大小预先腾出空间，首次加载时大小未知，加载后再检查
+                self._make_room(entry.size_bytes, exclude=entry)
+                reload = entry.loads > 0
+                print(f"[Models] {'Reloading' if reload else 'Loading'} {entry.name} on demand...")
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                model = entry.factory()
+                seconds = time.perf_counter() - start
+                size = max(_tensor_bytes(model), _rss_bytes() - rss_before)
+
+            with self._lock:
+                entry.model = model
+                entry.in_use += 1
+                entry.size_bytes = size
+                entry.loads += 1
+                entry.loaded_at = entry.last_used = time.monotonic()
+                if reload:
+                    entry.last_reload_seconds = seconds
+                    entry.total_reload_seconds += seconds
+                else:
+                    entry.first_load_seconds = seconds
+            print(f"[Models] {entry.name} loaded in {seconds:.2f}s, {size / 2**20:.0f} MB")
+            self._make_room(0, exclude=entry)
+            return model
+
+    def _make_room(self, needed_bytes: int, exclude: _Entry) -> None:
+        """按 LRU 顺序卸载空闲模型，直到常驻大小加上 needed_bytes 不超过预算。"""
+        if self.budget_bytes <= 0:
+            return
+        with self._lock:
+            candidates = sorted(
+                (e for e in self._entries.values() if e is not exclude and e.model is not None),
+                key=lambda e: e.last_used,
+            )
+            for victim in candidates:
+                if self._resident_bytes() + needed_bytes <= self.budget_bytes:
+                    break
+                if victim.in_use == 0:
+                    self._offload(victim, "budget")
+            over = self._resident_bytes() + needed_bytes - self.budget_bytes
+        if over > 0:
+            # 其余模型都在推理中，暂时超出预算，等它们空闲后由下一次加载或空闲卸载处理
+            print(f"[Models] Over memory budget by {over / 2**20:.0f} MB, all models are busy")
+
+    def _resident_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values() if e.model is not None)
+
+    def _offload(self, entry: _Entry, reason: str) -> None:
+        """释放模型（调用方持有 self._lock，且 entry.in_use == 0）。"""
+        entry.model = None
+        entry.offloads += 1
+        entry.resident_seconds += time.monotonic() - entry.loaded_at
+        entry.last_offload_reason = reason
+        gc.collect()
+        if settings.device == "cuda":
+            import torch
+
+            torch.cuda.empty_cache()
+        print(f"[Models] Offloaded {entry.name} ({reason})")
+
+    def offload(self, name: str) -> bool:
+        """
+        立即卸载一个模型。
+
+        Returns:
+            是否卸载了（未加载或正在推理时返回 False）
+        """
+        entry = self._entries[name]
+        with self._lock:
+            if entry.model is None or entry.in_use:
+                return False
+            self._offload(entry, "manual")
+            return True
+
+    def offload_idle(self) -> list[str]:
+        """
+        卸载空闲超过 idle_offload_s 的模型。
+
+        Returns:
+            被卸载的模型名称
+        """
+        if self.idle_offload_s <= 0:
+            return []
+        now = time.monotonic()
+        offloaded = []
+        with self._lock:
+            for entry in self._entries.values():
+                idle = now - entry.last_used
+                if entry.model is not None and not entry.in_use and idle >= self.idle_offload_s:
+                    self._offload(entry, "idle")
+                    offloaded.append(entry.name)
+        return offloaded
+
+    def start(self) -> None:
+        """启动后台线程定期卸载空闲模型（未配置 idle_offload_s 或重复调用时无效）。"""
+        if self.idle_offload_s <= 0 or self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self) -> None:
+        interval = min(max(self.idle_offload_s / 4, 0.5), 30.0)
+        while not self._stop.wait(interval):
+            self.offload_idle()
+
+    def stop(self) -> None:
+        """停止后台线程。"""
+        self._stop.set()
+
+    def report(self) -> dict[str, Any]:
+        """各模型的常驻状态、大小和加载 / 重新加载耗时（秒）。"""
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for entry in self._entries.values():
+                resident = entry.model is not None
+                reloads = max(entry.loads - 1, 0)
+                models[entry.name] = {
+                    "resident": resident,
+                    "in_use": entry.in_use,
+                    "size_bytes": entry.size_bytes,
+                    "size_mb": round(entry.size_bytes / 2**20, 1),
+                    "idle_seconds": now - entry.last_used if entry.loads else None,
+                    "resident_seconds": entry.resident_seconds
+                    + (now - entry.loaded_at if resident else 0.0),
+                    "loads": entry.loads,
+                    "offloads": entry.offloads,
+                    "last_offload_reason": entry.last_offload_reason,
+                    "first_load_seconds": entry.first_load_seconds,
+                    "last_reload_seconds": entry.last_reload_seconds,
+                    "mean_reload_seconds": entry.total_reload_seconds / reloads
+                    if reloads
+                    else None,
+                }
+            return {
+                "budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+                "resident_mb": round(self._resident_bytes() / 2**20, 1),
+                "models": models,
+            }
+
+    def metric_samples(self) -> Iterator[metrics.Sample]:
+        """供 ``/metrics`` 抓取时读取的各模型常驻状态、大小和重新加载耗时。"""
+        for name, status in self.report()["models"].items():
+            labels = {"model": name}
+            yield (
+                "model_resident",
+                "gauge",
+                "Whether the model is currently loaded in memory",
+                labels,
+                float(status["resident"]),
+            )
+            yield (
+                "model_size_bytes",
+                "gauge",
+                "Estimated memory of the model when loaded",
+                labels,
+                status["size_bytes"],
+            )
+            yield (
+                "model_loads_total",
+                "counter",
+                "Times the model was loaded",
+                labels,
+                status["loads"],
+            )
+            if status["last_reload_seconds"] is not None:
+                yield (
+                    "model_reload_seconds",
+                    "gauge",
+                    "Time taken by the most recent reload after offloading",
+                    labels,
+                    status["last_reload_seconds"],
+                )
+
+
+_manager: ModelManager | None = None
+
+
+def get_manager() -> ModelManager:
+    """获取或初始化进程内的模型管理器（单例模式）。"""
+    global _manager
+    if _manager is None:
+        _manager = ModelManager(
+            budget_bytes=settings.model_memory_budget_mb * 2**20,
+            idle_offload_s=settings.model_idle_offload_s,
+        )
+    return _manager
+
+
+def _collect_metrics() -> Iterator[metrics.Sample]:
+    """抓取 /metrics 时读取模型管理器的状态（SERVICE_MODE=all 之外没有管理器）。"""
+    if _manager is not None:
+        yield from _manager.metric_samples()
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
@@ -0,0 +1,74 @@
+"""
+模型权重加载：本地快照。
+
+首次从 Hugging Face 加载后，把已经转换成服务 dtype 的权重以 safetensors 格式另存一份，
+之后的启动直接从本地快照加载：不再做 dtype 转换，safetensors 文件按内存映射读取，
+配合 ``low_cpu_mem_usage`` 不会先构造一份随机初始化的权重，峰值内存接近模型大小。
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import torch
+
+from app.cache import make_key
+from app.config import settings
+
+
+def snapshot_path(kind: str, model_id: str, dtype: torch.dtype) -> Path | None:
+    """
+    模型快照目录（未配置 MODEL_SNAPSHOT_DIR 时返回 None）。
+
+    目录名包含模型 ID、dtype 和设备的哈希，任一项变化都会使用新的快照。
+    """
+    if not settings.model_snapshot_dir:
+        return None
+    key = make_key(model_id=model_id, dtype=str(dtype), device=settings.device)[:16]
+    return Path(settings.model_snapshot_dir) / f"{kind}-{key}"
+
+
+def resolve_source(kind: str, model_id: str, dtype: torch.dtype) -> tuple[str, Path | None]:
+    """
+    选择加载来源。
+
+    Args:
+        kind: 模型类型（t2i / vl）
+        model_id: 配置的模型 ID 或路径
+        dtype: 服务使用的 dtype
+
+    Returns:
+        (from_pretrained 的加载来源, 加载后需要写入的快照目录；不需要写入时为 None)
+    """
+    path = snapshot_path(kind, model_id, dtype)
+    if path is None:
+        return model_id, None
+    if path.is_dir():
+        print(f"Using prepared snapshot {path}")
+        return str(path), None
+    return model_id, path
+
+
+def save_snapshot(path: Path, *components: Any) -> None:
+    """
+    保存快照：各组件（pipeline / 模型 / processor）依次 ``save_pretrained`` 到同一目录。
+
+    先写入临时目录再重命名，进程中途退出不会留下不完整的快照。
+    多个副本同时冷启动时各自写自己的临时目录，先完成的生效，其余的丢弃自己的副本。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(prefix=f"{path.name}.", suffix=".tmp", dir=path.parent))
+    try:
+        for component in components:
+            component.save_pretrained(tmp_path)
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            if not path.is_dir():
+                raise
+            print(f"Snapshot {path} was written by another process, keeping it")
+            return
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    print(f"Saved prepared snapshot to {path}")
@@ -0,0 +1,104 @@
+"""
+VL 模型的 int8 动态量化。
+
+语言解码器和 lm_head（可选再加上视觉编码器）中 ``nn.Linear`` 的权重量化为 int8，
+激活在每次矩阵乘时按批动态量化，不需要校准数据。只在 CPU 上可用；量化后的线性层只接受
+float32 输入，因此被量化的部分不再使用 bfloat16 autocast。
+
+量化后模型的 state_dict（int8 权重和量化参数）缓存到 QUANTIZED_CACHE_DIR，之后的启动
+按配置构建一个不初始化权重的模型骨架，以同样的范围量化后用 ``weights_only=True`` 载入：
+不必读取和转换 float 权重，也不会反序列化任意对象。缓存按模型 ID、量化范围以及 torch /
+transformers 版本区分（量化线性层的参数打包方式依赖库的实现）。
+
+``torch.ao.quantization`` 的 eager 模式量化已被标记为弃用，后续由 torchao 的 ``quantize_``
+取代；torchao 不在依赖中，升级 torch 时需要随之迁移。
+
+与 float32 的速度、内存和答案一致性可以用 ``benchmarks/bench_vl_quantization.py`` 检查。
+"""
+
+import os
+from functools import cache
+from pathlib import Path
+
+import torch
+import transformers
+from torch.ao.nn.quantized import dynamic as nnqd
+from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+from app.cache import make_key
+from app.config import settings
+
+
+@cache
+def use_int8() -> bool:
+    """是否对 VL 模型做 int8 动态量化。"""
+    if settings.vl_quantization != "int8":
+        return False
+    if settings.device != "cpu":
+        print(f"[VL] int8 quantization is only supported on CPU, ignored on {settings.device}")
+        return False
+    return True
+
+
+def quantized_path(model_id: str, vision: bool) -> Path | None:
+    """
+    量化模型的缓存文件（未配置 QUANTIZED_CACHE_DIR 时返回 None）。
+
+    文件名包含模型 ID、量化范围和 torch / transformers 版本的哈希，任一项变化都会重新量化。
+    """
+    if not settings.quantized_cache_dir:
+        return None
+    key = make_key(
+        model_id=model_id,
+        scheme="int8-dynamic",
+        vision=vision,
+        format="state_dict",
+        torch=torch.__version__,
+        transformers=transformers.__version__,
+    )[:16]
+    return Path(settings.quantized_cache_dir) / f"vl-{key}.pt"
+
+
+def quantize_int8(model: torch.nn.Module, vision: bool = False) -> None:
+    """
+    原地把模型的线性层量化为 int8。
+
+    Args:
+        model: Qwen2.5-VL 模型（包含 model / lm_head / visual 子模块）
+        vision: 是否同时量化视觉编码器 ``visual``
+    """
+    scopes = ["model", "lm_head", *(["visual"] if vision else [])]
+    # 按子模块名指定范围，mapping 只替换 Linear（词嵌入等其他层保持 float）
+    quantize_dynamic(
+        model,
+        qconfig_spec=dict.fromkeys(scopes, default_dynamic_qconfig),
+        mapping={torch.nn.Linear: nnqd.Linear},
+        inplace=True,
+    )
+
+
+def save_quantized(path: Path, model: torch.nn.Module) -> None:
+    """保存量化后模型的 state_dict；先写临时文件再重命名，中途退出不会留下不完整的缓存。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    print(f"[VL] Saved quantized model to {path}")
+
+
+def load_quantized(path: Path, skeleton: torch.nn.Module, vision: bool = False) -> torch.nn.Module:
+    """
+    把 ``save_quantized`` 保存的权重载入模型骨架。
+
+    Args:
+        path: 缓存文件
+        skeleton: 与量化前结构相同的模型（权重不必初始化），原地量化后载入权重
+        vision: 保存时是否量化了视觉编码器
+
+    Returns:
+        载入权重后的 skeleton
+    """
+    print(f"[VL] Using quantized model {path}")
+    quantize_int8(skeleton, vision=vision)
+    skeleton.load_state_dict(torch.load(path, weights_only=True))
+    return skeleton
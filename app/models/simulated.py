@@ -0,0 +1,264 @@
+"""
+模拟推理后端：接口与 HunyuanDiTModel / QwenVLModel 相同，不加载权重，按代价模型模拟推理。
+
+MODEL_BACKEND=simulated 时路由加载这里的模型，其余部分（微批调度、队列、准入控制、
+结果缓存、编码、多副本）与真实后端完全相同，因此可以在没有权重的机器上压测这些部分。
+
+代价模型（参数见配置中的 SIM_* 项）：
+    - 单个请求的耗时由固定耗时 + 按步数 / 像素 / token 计的耗时组成
+    - n 个请求一批的耗时为各请求单独执行的耗时之和 × n ** (sim_batch_exponent - 1)
+    - 加载时分配常驻内存，推理时按批内请求数分配瞬时内存
+    - 每批以 sim_failure_rate 的概率失败
+耗时可以只 sleep（不占 CPU，适合观察排队），也可以在推理线程中真实占用 CPU
+（numpy 矩阵乘法会释放 GIL，与真实推理一样不阻塞事件循环）。
+"""
+
+import base64
+import hashlib
+import io
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+from app.cache import LRUCache
+from app.config import settings
+from app.models.t2i_hunyuan import T2IJob
+from app.models.vl_qwen import VLAnswer, VLJob, save_session_cache
+
+# 每个视觉 token 对应 28x28 像素（与 Qwen2.5-VL 一致）
+_PIXELS_PER_VISUAL_TOKEN = 28 * 28
+# 每个视觉 token 的特征字节数（Qwen2.5-VL-3B 的 hidden_size 2048，float32）
+_FEATURE_BYTES_PER_TOKEN = 2048 * 4
+# 模拟回答使用的词
+_WORDS = "the image shows a red object on a plain background with soft light".split()
+
+
+def _allocate(megabytes: int) -> bytearray:
+    """分配并逐页写入内存，保证计入 RSS。"""
+    buffer = bytearray(megabytes * 1024 * 1024)
+    buffer[::4096] = b"\x01" * len(range(0, len(buffer), 4096))
+    return buffer
+
+
+class _Simulator:
+    """按配置消耗时间、分配内存和注入失败的公共部分。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._rng = random.Random()
+        # numpy 的矩阵乘法释放 GIL，用来在推理线程中真实占用 CPU
+        self._matrix = np.random.default_rng(0).random((256, 256), dtype=np.float32)
+
+        print(f"[SIM] Loading simulated {name} model...")
+        time.sleep(settings.sim_load_seconds)
+        self._resident = _allocate(settings.sim_model_memory_mb)
+
+    @contextmanager
+    def batch(self, size: int) -> Iterator[None]:
+        """
+        模拟一批推理的资源占用：期间分配瞬时内存，结束时按概率失败。
+
+        Raises:
+            RuntimeError: 注入的失败
+        """
+        working = _allocate(settings.sim_batch_memory_mb * size)
+        try:
+            yield
+        finally:
+            del working
+        if self._rng.random() < settings.sim_failure_rate:
+            raise RuntimeError(f"Simulated {self.name} failure")
+
+    def spend(self, single_costs_ms: list[float]) -> None:
+        """
+        消耗一批请求的耗时：各请求单独执行的耗时之和按批处理加速曲线折算。
+
+        Args:
+            single_costs_ms: 批内每个请求单独执行时的耗时（毫秒）
+        """
+        n = len(single_costs_ms)
+        seconds = sum(single_costs_ms) * n ** (settings.sim_batch_exponent - 1) / 1000
+        if settings.sim_busy_mode == "sleep":
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self._matrix @ self._matrix
+
+
+class SimulatedT2IModel(_Simulator):
+    """模拟的文生图模型：生成与请求尺寸相同的纯色图像（颜色由提示词和种子决定）。"""
+
+    def __init__(self) -> None:
+        super().__init__("t2i")
+
+    def warmup(self) -> None:
+        """与真实模型一样用少量步数跑一次，验证代价模型的配置。"""
+        self.generate_images([T2IJob("warmup", seed=0)], settings.t2i_warmup_steps)
+
+    def generate_images(
+        self, jobs: list[T2IJob], num_inference_steps: int | None = None
+    ) -> list[Image.Image]:
+        """
+        模拟批量生成。
+
+        Args:
+            jobs: 文生图请求列表
+            num_inference_steps: 覆盖所有请求的去噪步数（预热用）
+
+        Returns:
+            与 jobs 顺序一致的 PIL 图像列表
+        """
+        steps = num_inference_steps or max(job.params.num_inference_steps for job in jobs)
+        step_costs = [
+            settings.sim_t2i_step_ms
+            + settings.sim_t2i_step_ms_per_megapixel * job.params.width * job.params.height / 1e6
+            for job in jobs
+        ]
+        print(f"[SIM] T2I batch of {len(jobs)}, {steps} steps, step cost {step_costs} ms")
+
+        with self.batch(len(jobs)):
+            self.spend([settings.sim_t2i_fixed_ms] * len(jobs))
+            for step in range(1, steps + 1):
+                self.spend(step_costs)
+                # 与真实模型一样每隔几步发送预览（最后一步之后直接发送完整图像）
+                if step % max(1, settings.t2i_preview_every_n_steps) == 0 and step < steps:
+                    self._send_previews(jobs, step, steps)
+
+        return [
+            Image.new("RGB", (job.params.width, job.params.height), self._color(job))
+            for job in jobs
+        ]
+
+    @staticmethod
+    def _color(job: T2IJob) -> tuple[int, int, int]:
+        digest = hashlib.sha256(f"{job.prompt}:{job.seed}".encode()).digest()
+        return digest[0], digest[1], digest[2]
+
+    def _send_previews(self, jobs: list[T2IJob], step: int, total_steps: int) -> None:
+        """发送潜空间分辨率（原图的 1/8）的 JPEG 预览。"""
+        for job in jobs:
+            if job.on_preview is None:
+                continue
+            size = (job.params.width // 8, job.params.height // 8)
+            buf = io.BytesIO()
+            Image.new("RGB", size, self._color(job)).save(buf, format="JPEG", quality=70)
+            job.on_preview(
+                {
+                    "type": "preview",
+                    "step": step,
+                    "total_steps": total_steps,
+                    "image_base64": base64.b64encode(buf.getvalue()).decode("utf-8"),
+                    "preview_ms": 0.0,
+                }
+            )
+
+
+class SimulatedVLModel(_Simulator):
+    """
+    模拟的视觉语言模型。
+
+    与真实模型一样维护视觉特征缓存和会话缓存（只记录命中，不保存特征）：
+    命中视觉缓存时不计视觉编码耗时，命中会话缓存时只计新问题的 prefill 耗时。
+    """
+
+    def __init__(self) -> None:
+        super().__init__("vl")
+        # 值为视觉 token 数，按真实模型的特征大小计入缓存容量
+        self.vision_cache: LRUCache[str, int] = LRUCache(
+            settings.vl_vision_cache_bytes, sizeof=lambda tokens: tokens * _FEATURE_BYTES_PER_TOKEN
+        )
+        self.sessions: LRUCache[str, int] = LRUCache(settings.vl_max_sessions)
+        self.closed_sessions: LRUCache[str, bool] = LRUCache(settings.vl_max_sessions)
+
+    def warmup(self) -> None:
+        """用一张合成图像跑一次。"""
+        buf = io.BytesIO()
+        Image.new("RGB", (448, 448), (128, 128, 128)).save(buf, format="PNG")
+        self.understand_images(
+            [VLJob(buf.getvalue(), "Describe the image.")],
+            max_new_tokens=settings.vl_warmup_new_tokens,
+        )
+
+    def close_session(self, session_id: str) -> None:
+        """释放会话缓存，并留下墓碑使正在执行的一轮不再保存。"""
+        self.closed_sessions.put(session_id, True)
+        self.sessions.pop(session_id)
+
+    def understand_images(
+        self, jobs: list[VLJob], max_new_tokens: int | None = None
+    ) -> list[VLAnswer]:
+        """
+        模拟批量回答：按解码进度逐个 token 流式输出。
+
+        Args:
+            jobs: 视觉语言请求列表
+            max_new_tokens: 最多生成的 token 数
+
+        Returns:
+            与 jobs 顺序一致的回答
+        """
+        num_tokens = min(
+            max_new_tokens or settings.vl_max_new_tokens, settings.sim_vl_answer_tokens
+        )
+        answers = []
+        costs = []
+        for job in jobs:
+            vision_hit, session_hit, prompt_tokens, megapixels = self._inspect(job)
+            cost = settings.sim_vl_fixed_ms + settings.sim_vl_prefill_ms_per_token * prompt_tokens
+            if not vision_hit:
+                cost += settings.sim_vl_vision_ms_per_megapixel * megapixels
+            costs.append(cost)
+            answers.append(VLAnswer("", vision_hit, session_hit))
+        print(f"[SIM] VL batch of {len(jobs)}, prefill cost {costs} ms, {num_tokens} token(s)")
+
+        # 先 prefill，再逐个 token 解码并流式输出
+        words = [_WORDS[i % len(_WORDS)] for i in range(num_tokens)]
+        with self.batch(len(jobs)):
+            self.spend(costs)
+            for i, word in enumerate(words):
+                self.spend([settings.sim_vl_decode_ms_per_token] * len(jobs))
+                for job in jobs:
+                    if job.on_text is not None:
+                        job.on_text(word if i == 0 else f" {word}")
+
+        text = " ".join(words)
+        for job, answer in zip(jobs, answers):
+            answer.text = text
+            if job.session_id is not None:
+                turns = len(job.history) + 1
+                save_session_cache(self.sessions, self.closed_sessions, job.session_id, turns)
+        return answers
+
+    def _inspect(self, job: VLJob) -> tuple[bool, bool, int, float]:
+        """
+        计算一个请求的缓存命中和输入规模。
+
+        Returns:
+            (视觉缓存命中, 会话缓存命中, 需要 prefill 的 token 数, 视觉编码的百万像素)
+        """
+        max_pixels = min(job.max_pixels or settings.vl_max_pixels, settings.vl_max_pixels)
+        min_pixels = min(job.min_pixels or settings.vl_min_pixels, max_pixels)
+        width, height = Image.open(io.BytesIO(job.image_bytes)).size
+        pixels = min(max(width * height, min_pixels), max_pixels)
+
+        key = f"{hashlib.sha256(job.image_bytes).hexdigest()}:{min_pixels}:{max_pixels}"
+        vision_hit = self.vision_cache.get(key) is not None
+        self.vision_cache.put(key, pixels // _PIXELS_PER_VISUAL_TOKEN)
+
+        question_tokens = len(job.question.split())
+        session_hit = (
+            job.session_id is not None
+            and bool(job.history)
+            and self.sessions.get(job.session_id) == len(job.history)
+        )
+        if session_hit:
+            return vision_hit, True, question_tokens, 0.0
+
+        history_tokens = sum(len(q.split()) + len(a.split()) for q, a in job.history)
+        prompt_tokens = pixels // _PIXELS_PER_VISUAL_TOKEN + history_tokens + question_tokens
+        return vision_hit, False, prompt_tokens, pixels / 1e6
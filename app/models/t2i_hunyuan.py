@@ -1,13 +1,68 @@
 """HunyuanDiT 文生图模型"""
 
-import io
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
 from typing import Any
 
 import torch
-from diffusers import DiffusionPipeline
+from diffusers import (
+    DDIMScheduler,
+    DiffusionPipeline,
+    DPMSolverMultistepScheduler,
+    EulerDiscreteScheduler,
+    UniPCMultistepScheduler,
+)
 from PIL import Image
 
+from app import acceleration, metrics
+from app.cache import LRUCache
 from app.config import settings
+from app.encoding import EncodeOptions, encode_image
+from app.generation import GenerationParams
+from app.models.loading import resolve_source, save_snapshot
+from app.models.preview import PreviewCallback
+
+
+@dataclass
+class T2IJob:
+    """单个文生图请求。"""
+
+    prompt: str
+    # 显式指定随机种子时结果可复现（也因此可以缓存）
+    seed: int | None = None
+    # 生成参数（步数、引导系数、分辨率、采样器），未指定时使用配置中的默认值
+    params: GenerationParams = field(default_factory=GenerationParams.create)
+    # 订阅去噪过程预览时，每隔几步在推理线程中调用一次
+    on_preview: Callable[[dict[str, Any]], None] | None = field(
+        default=None, repr=False, compare=False
+    )
+    # 需要剖析时的 trace ID（见 app.profiling）
+    trace_id: str | None = field(default=None, compare=False)
+
+
+# 可选采样器，共用模型自带调度器的配置（噪声表、预测类型等）
+SCHEDULERS: dict[str, Any] = {
+    "ddim": DDIMScheduler,
+    "euler": EulerDiscreteScheduler,
+    "dpmpp_2m": DPMSolverMultistepScheduler,
+    "unipc": UniPCMultistepScheduler,
+}
+
+
+@dataclass
+class PromptEmbeddings:
+    """一个提示词在两个文本编码器（BERT 和 T5）上的编码结果。"""
+
+    embeds: torch.Tensor
+    mask: torch.Tensor
+    embeds_2: torch.Tensor
+    mask_2: torch.Tensor
+
+    @property
+    def nbytes(self) -> int:
+        tensors = [self.embeds, self.mask, self.embeds_2, self.mask_2]
+        return sum(t.element_size() * t.nelement() for t in tensors)
 
 
 class HunyuanDiTModel:
@@ -18,36 +73,202 @@ class HunyuanDiTModel:
         self.dtype = torch.float16 if self.device == "cuda" else torch.float32
 
         print(f"Loading HunyuanDiT model from {settings.t2i_model_id}...")
+        start = time.perf_counter()
+        source, snapshot = resolve_source("t2i", settings.t2i_model_id, self.dtype)
         self.pipe = DiffusionPipeline.from_pretrained(
-            settings.t2i_model_id,
+            source,
             torch_dtype=self.dtype,
             cache_dir=settings.hf_cache_dir,
-            low_cpu_mem_usage=False,
+            low_cpu_mem_usage=settings.low_cpu_mem_usage,
         )
+        if snapshot is not None:
+            save_snapshot(snapshot, self.pipe)
         self.pipe = self.pipe.to(self.device)
+
+        # CPU 加速档位：VAE 的卷积用 channels_last，去噪网络用 torch.compile
+        profile = acceleration.cpu_profile()
+        if profile.channels_last:
+            self.pipe.vae.to(memory_format=torch.channels_last)
+        if profile.compile:
+            acceleration.compile_module(self.pipe.transformer)
+
+        # 采样器按需创建，推理前替换 pipe.scheduler，不必重新加载模型
+        self._schedulers: dict[str, Any] = {"default": self.pipe.scheduler}
+
+        # 无分类器引导的无条件分支固定使用空提示词，加载时编码一次即可
+        self.uncond_embeddings = self._encode_text("")
+        self._embedding_cache: LRUCache[str, PromptEmbeddings] = LRUCache(
+            settings.t2i_prompt_embed_cache_bytes, sizeof=lambda e: e.nbytes
+        )
+        metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start, "t2i")
         print("HunyuanDiT model loaded successfully!")
 
-    def generate_image(self, prompt: str) -> bytes:
-        """根据文本生成图像"""
-        print(f"[T2I] Processing prompt: {prompt}")
+    def generate_image(self, prompt: str, seed: int | None = None) -> bytes:
+        """根据文本生成图像，按配置的默认格式编码"""
+        image = self.generate_images([T2IJob(prompt, seed)])[0]
+        return encode_image(image, EncodeOptions.create())
+
+    def warmup(self) -> None:
+        """用少量去噪步数完整跑一遍生成流程，让首个真实请求不再承担算子初始化的开销。"""
+        self.generate_images(
+            [T2IJob("warmup", seed=0)], num_inference_steps=settings.t2i_warmup_steps
+        )
+
+    def generate_images(
+        self, jobs: list[T2IJob], num_inference_steps: int | None = None
+    ) -> list[Image.Image]:
+        """
+        批量生成多张图像，生成参数相同的请求合并成一次扩散推理。
+
+        只负责生成，不做编码：编码交给编码线程池，与下一批推理重叠执行。
+        调度器已经按生成参数凑批，通常整批只需一次推理。
+
+        Args:
+            jobs: 文生图请求列表，每个请求生成一张图
+            num_inference_steps: 覆盖所有请求的去噪步数（预热用），None 表示使用请求的参数
+
+        Returns:
+            与 jobs 顺序一致的 PIL 图像列表
+        """
+        groups: dict[GenerationParams, list[int]] = {}
+        for index, job in enumerate(jobs):
+            params = job.params
+            if num_inference_steps:
+                params = replace(params, num_inference_steps=num_inference_steps)
+            groups.setdefault(params, []).append(index)
 
+        images: dict[int, Image.Image] = {}
+        for params, indices in groups.items():
+            group = self._generate_group([jobs[index] for index in indices], params)
+            images.update(zip(indices, group))
+        return [images[index] for index in range(len(jobs))]
+
+    def _generate_group(self, jobs: list[T2IJob], params: GenerationParams) -> list[Image.Image]:
+        """用同一组生成参数一次扩散推理生成整批图像。"""
+        num_inference_steps = params.num_inference_steps
+        prompts = [job.prompt for job in jobs]
+        print(f"[T2I] Processing batch of {len(prompts)} prompt(s): {prompts}")
+        print(
+            f"[T2I] {params.sampler} sampler, {num_inference_steps} steps, "
+            f"guidance {params.guidance_scale}, {params.width}x{params.height}"
+        )
+
+        preview = None
+        if any(job.on_preview is not None for job in jobs):
+            preview = PreviewCallback(
+                [job.on_preview for job in jobs],
+                total_steps=num_inference_steps,
+                every_n_steps=settings.t2i_preview_every_n_steps,
+                max_overhead=settings.t2i_preview_max_overhead,
+            )
+
+        with metrics.stage("t2i", "text_encode"):
+            embeddings = self._batch_embeddings(prompts)
+
+        # 去噪只输出潜变量，VAE 解码单独计时
+        self.pipe.scheduler = self._scheduler(params.sampler)
+        with torch.no_grad(), acceleration.autocast(), metrics.stage("t2i", "denoise"):
+            latents = self.pipe(
+                **embeddings,
+                generator=self._make_generators(jobs),
+                num_inference_steps=num_inference_steps,
+                guidance_scale=params.guidance_scale,
+                height=params.height,
+                width=params.width,
+                callback_on_step_end=preview,
+                output_type="latent",
+            ).images
+
+        with torch.no_grad(), acceleration.autocast(), metrics.stage("t2i", "vae_decode"):
+            pil_images = self._decode_latents(latents)
+
+        if preview is not None:
+            print(
+                f"[T2I] Previews: {preview.previews_sent} sent, "
+                f"{preview.previews_skipped} skipped, overhead {preview.overhead:.1%}"
+            )
+
+        print(f"[T2I] {len(pil_images)} image(s) generated successfully!")
+        return pil_images
+
+    def _scheduler(self, sampler: str) -> Any:
+        """获取采样器实例（首次使用时由模型自带调度器的配置创建）。"""
+        if sampler not in self._schedulers:
+            self._schedulers[sampler] = SCHEDULERS[sampler].from_config(
+                self._schedulers["default"].config
+            )
+        return self._schedulers[sampler]
+
+    def _decode_latents(self, latents: torch.Tensor) -> list[Image.Image]:
+        """VAE 解码潜变量并后处理成 PIL 图像（与 pipeline 内部的 output_type="pil" 路径一致）。"""
+        image = self.pipe.vae.decode(latents / self.pipe.vae.config.scaling_factor).sample
+        image, has_nsfw = self.pipe.run_safety_checker(image, self.device, latents.dtype)
+        do_denormalize = [True] * len(image) if has_nsfw is None else [not n for n in has_nsfw]
+        return self.pipe.image_processor.postprocess(
+            image, output_type="pil", do_denormalize=do_denormalize
+        )
+
+    def _encode_text(self, text: str) -> PromptEmbeddings:
+        """用两个文本编码器分别编码文本（序列长度与 pipeline 内部保持一致）。"""
         with torch.no_grad():
-            result = self.pipe(
-                prompt=prompt,
-                num_inference_steps=settings.t2i_num_inference_steps,
-                guidance_scale=settings.t2i_guidance_scale,
-                height=settings.t2i_height,
-                width=settings.t2i_width,
+            embeds, _, mask, _ = self.pipe.encode_prompt(
+                prompt=text,
+                device=self.device,
+                dtype=self.pipe.transformer.dtype,
+                do_classifier_free_guidance=False,
+                max_sequence_length=77,
+                text_encoder_index=0,
+            )
+            embeds_2, _, mask_2, _ = self.pipe.encode_prompt(
+                prompt=text,
+                device=self.device,
+                dtype=self.pipe.transformer.dtype,
+                do_classifier_free_guidance=False,
+                max_sequence_length=256,
+                text_encoder_index=1,
             )
+        return PromptEmbeddings(embeds, mask, embeds_2, mask_2)
+
+    def get_prompt_embeddings(self, prompt: str) -> PromptEmbeddings:
+        """获取提示词编码，优先使用 LRU 缓存。"""
+        embeddings = self._embedding_cache.get(prompt)
+        metrics.record_cache_lookup("t2i_prompt_embeddings", embeddings is not None)
+        if embeddings is None:
+            embeddings = self._encode_text(prompt)
+            self._embedding_cache.put(prompt, embeddings)
+        return embeddings
+
+    def _batch_embeddings(self, prompts: list[str]) -> dict[str, torch.Tensor]:
+        """拼接整批的预计算编码，作为 pipeline 的 *_embeds 参数传入，跳过其内部文本编码。"""
+        cond = [self.get_prompt_embeddings(prompt) for prompt in prompts]
+        uncond = self.uncond_embeddings
+        n = len(prompts)
 
-        img = result.images[0]
+        return {
+            "prompt_embeds": torch.cat([e.embeds for e in cond]),
+            "prompt_attention_mask": torch.cat([e.mask for e in cond]),
+            "prompt_embeds_2": torch.cat([e.embeds_2 for e in cond]),
+            "prompt_attention_mask_2": torch.cat([e.mask_2 for e in cond]),
+            "negative_prompt_embeds": uncond.embeds.repeat(n, 1, 1),
+            "negative_prompt_attention_mask": uncond.mask.repeat(n, 1),
+            "negative_prompt_embeds_2": uncond.embeds_2.repeat(n, 1, 1),
+            "negative_prompt_attention_mask_2": uncond.mask_2.repeat(n, 1),
+        }
 
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
+    def _make_generators(self, jobs: list[T2IJob]) -> list[torch.Generator] | None:
+        """为批内每个请求创建独立的随机数生成器，保证同一 seed 在任意批次中得到相同的噪声。"""
+        if all(job.seed is None for job in jobs):
+            return None
 
-        print("[T2I] Image generated successfully!")
-        return buf.read()
+        generators = []
+        for job in jobs:
+            generator = torch.Generator(device=self.device)
+            if job.seed is None:
+                generator.seed()
+            else:
+                generator.manual_seed(job.seed)
+            generators.append(generator)
+        return generators
 
     def _manual_generation_example(self, prompt: str) -> Any:
         """手动生成示例"""
@@ -1,13 +1,139 @@
 """Qwen2.5-VL 视觉语言模型实现，包含手动预处理步骤。"""
 
+import hashlib
 import io
-from typing import Any
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
 
 import torch
 from PIL import Image
-from transformers import AutoModelForVision2Seq, AutoProcessor
+from transformers import AutoConfig, AutoModelForVision2Seq, AutoProcessor, DynamicCache
+from transformers.modeling_utils import no_init_weights
 
+from app import acceleration, metrics
+from app.cache import LRUCache
 from app.config import settings
+from app.imaging import decode_image, resize_to_budget
+from app.models import quantization
+from app.models.loading import resolve_source, save_snapshot
+
+V = TypeVar("V")
+
+
+@dataclass
+class VLJob:
+    """单个视觉语言请求。"""
+
+    image_bytes: bytes
+    question: str
+    # 本请求的像素预算，None 表示使用配置中的 vl_min_pixels / vl_max_pixels
+    min_pixels: int | None = None
+    max_pixels: int | None = None
+    # 多轮会话：会话 ID 和此前各轮的 (问题, 回答)；会话的 KV cache 不在时按历史重新 prefill
+    session_id: str | None = None
+    history: list[tuple[str, str]] = field(default_factory=list)
+    # 流式输出时，每解码出一段新文本就在推理线程中调用一次
+    on_text: Callable[[str], None] | None = field(default=None, repr=False, compare=False)
+    # 需要剖析时的 trace ID（见 app.profiling）
+    trace_id: str | None = field(default=None, compare=False)
+
+
+@dataclass
+class VLAnswer:
+    """单个视觉语言请求的结果。"""
+
+    text: str
+    # 视觉编码阶段是否命中了特征缓存
+    vision_cache_hit: bool
+    # 会话追问是否复用了会话的 KV cache（只 prefill 了新问题）
+    session_cache_hit: bool = False
+
+
+class TextStream:
+    """
+    增量解码器：把逐个生成的 token 转换成可以直接输出的文本片段。
+
+    每次都解码全部已生成的 token 再取新增部分，保证多 token 组成的字符
+    （例如中文）不会被截断；末尾是不完整字符时先不输出，等待后续 token。
+    """
+
+    def __init__(self, tokenizer: Any, sink: Callable[[str], None]) -> None:
+        self.tokenizer = tokenizer
+        self.sink = sink
+        self.tokens: list[int] = []
+        self.emitted = 0
+
+    def push(self, token: int) -> None:
+        """追加一个新 token，并输出新增的完整文本。"""
+        self.tokens.append(token)
+        text = self.tokenizer.decode(self.tokens, skip_special_tokens=True)
+        if text.endswith("\ufffd"):
+            return
+        if len(text) > self.emitted:
+            self.sink(text[self.emitted :])
+            self.emitted = len(text)
+
+
+@dataclass
+class VisionFeatures:
+    """一张图像经视觉编码器得到的特征，可跨请求复用。"""
+
+    # (1, 3) 的 [t, h, w] 网格尺寸，决定图像占位 token 数和 M-RoPE 位置
+    image_grid_thw: torch.Tensor
+    # (图像 token 数, hidden_size) 的视觉编码器输出
+    image_embeds: torch.Tensor
+
+    @property
+    def num_tokens(self) -> int:
+        return self.image_embeds.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.image_grid_thw.element_size() * self.image_grid_thw.nelement()
+            + self.image_embeds.element_size() * self.image_embeds.nelement()
+        )
+
+
+@dataclass
+class SessionCache:
+    """会话的 KV cache：图像和此前各轮对话（含回答）都已经 prefill，追问直接接在后面。"""
+
+    cache: DynamicCache
+    # (1, 1) 的 M-RoPE 位置偏移：下一个 token 的位置 = 已缓存的长度 + rope_deltas
+    rope_deltas: torch.Tensor
+    # 已生成但还没有送入模型的 token（回答因 max_new_tokens 截断时的最后一个 token）
+    pending: list[int]
+    # 已包含的轮次数，与请求携带的历史轮数不一致时不能复用
+    turns: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def nbytes(self) -> int:
+        tensors = [*self.cache.key_cache, *self.cache.value_cache]
+        return sum(t.element_size() * t.nelement() for t in tensors)
+
+
+def save_session_cache(
+    caches: LRUCache[str, V], closed: LRUCache[str, bool], session_id: str, value: V
+) -> None:
+    """
+    把会话本轮之后的模型缓存存回去；会话在本轮执行期间被关闭时不保存。
+
+    Args:
+        caches: 模型按会话 ID 保存的缓存
+        closed: 模型收到的已关闭会话 ID（墓碑）
+        session_id: 会话 ID
+        value: 本轮之后的缓存
+    """
+    if closed.get(session_id) is not None:
+        return
+    caches.put(session_id, value)
+    # 检查与写入之间会话被关闭（关闭时缓存还没写入，没有被释放）
+    if closed.get(session_id) is not None:
+        caches.pop(session_id)
 
 
 class QwenVLModel:
@@ -27,36 +153,77 @@ class QwenVLModel:
         self.dtype = torch.float16 if self.device == "cuda" else torch.float32
 
         print(f"Loading Qwen2.5-VL model from {settings.vl_model_id}...")
+        start = time.perf_counter()
 
         # 加载 processor 和模型
+        source, snapshot = resolve_source("vl", settings.vl_model_id, self.dtype)
         self.processor = AutoProcessor.from_pretrained(
-            settings.vl_model_id,
+            source,
             cache_dir=settings.hf_cache_dir,
         )
 
-        self.model = AutoModelForVision2Seq.from_pretrained(
-            settings.vl_model_id,
-            torch_dtype=self.dtype,
-            cache_dir=settings.hf_cache_dir,
+        # int8 量化：优先加载已缓存的量化模型，否则加载 float 权重后量化并写入缓存
+        self.quantized = quantization.use_int8()
+        self.quantize_vision = self.quantized and settings.vl_quantize_vision
+        quantized_path = (
+            quantization.quantized_path(settings.vl_model_id, self.quantize_vision)
+            if self.quantized
+            else None
         )
+        if quantized_path is not None and quantized_path.is_file():
+            config = AutoConfig.from_pretrained(source, cache_dir=settings.hf_cache_dir)
+            # 只需要模型结构：跳过随机初始化，量化后的权重随后从缓存载入
+            with no_init_weights():
+                skeleton = AutoModelForVision2Seq.from_config(config, torch_dtype=self.dtype)
+            self.model = quantization.load_quantized(
+                quantized_path, skeleton, vision=self.quantize_vision
+            )
+        else:
+            self.model = AutoModelForVision2Seq.from_pretrained(
+                source,
+                torch_dtype=self.dtype,
+                cache_dir=settings.hf_cache_dir,
+                low_cpu_mem_usage=settings.low_cpu_mem_usage,
+            )
+            if snapshot is not None:
+                save_snapshot(snapshot, self.model, self.processor)
+            if self.quantized:
+                quantization.quantize_int8(self.model, vision=self.quantize_vision)
+                if quantized_path is not None:
+                    quantization.save_quantized(quantized_path, self.model)
         self.model = self.model.to(self.device)
         self.model.eval()
 
+        # CPU 加速档位：语言解码器用 torch.compile（序列长度逐步增长，按动态形状编译）
+        if acceleration.cpu_profile().compile:
+            acceleration.compile_module(self.model.model, dynamic=True)
+
+        # 批量生成时提示词靠右对齐，新 token 才能直接接在每一行末尾
+        self.processor.tokenizer.padding_side = "left"
+
+        eos_token_id = self.model.generation_config.eos_token_id
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        self.eos_token_ids: set[int] = set(eos_token_id or [])
+
+        # 同一张图的追问只需重新做文本 prefill 和解码
+        self.vision_cache: LRUCache[str, VisionFeatures] = LRUCache(
+            settings.vl_vision_cache_bytes, sizeof=lambda f: f.nbytes
+        )
+        # 多轮会话的 KV cache（按会话 ID），追问只需 prefill 新问题的 tokens
+        self.sessions: LRUCache[str, SessionCache] = LRUCache(
+            settings.vl_session_cache_bytes, sizeof=lambda s: s.nbytes
+        )
+        # 显式关闭的会话 ID（墓碑），正在执行的一轮结束时不再保存其 KV cache
+        self.closed_sessions: LRUCache[str, bool] = LRUCache(settings.vl_max_sessions)
+
+        metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start, "vl")
         print("Qwen2.5-VL model loaded successfully!")
 
     def understand_image(self, image_bytes: bytes, question: str) -> str:
         """
         理解图像并回答问题。
 
-        处理流程（手动预处理演示）：
-        1. 从字节加载图像
-        2. Processor 处理：
-           - 图像调整大小/归一化 -> pixel_values
-           - 文本分词 -> input_ids
-           - 插入图像 tokens
-        3. 模型生成 tokens
-        4. 解码 tokens -> 文本答案
-
         Args:
             image_bytes: 图像文件字节
             question: 关于图像的问题
@@ -64,41 +231,386 @@ class QwenVLModel:
         Returns:
             描述图像的文本答案
         """
-        print(f"[VL] Processing question: {question}")
-
-        # 加载图像
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        # FIXME: 需要添加图像大小检查，太大的图片可能导致OOM
+        return self.understand_images([VLJob(image_bytes, question)])[0].text
 
-        # 步骤 2: 处理输入（手动预处理演示）
-        # Processor 的作用：
-        # - 图像: 调整大小、归一化、转换为张量 -> pixel_values
-        # - 文本: 分词、添加特殊 tokens -> input_ids
-        inputs = self.processor(
-            images=image,
-            text=question,
-            return_tensors="pt",
+    def warmup(self) -> None:
+        """用一张合成图像完整跑一遍理解流程（只生成几个 token），预热视觉编码器和解码路径。"""
+        buf = io.BytesIO()
+        Image.new("RGB", (448, 448), (128, 128, 128)).save(buf, format="PNG")
+        self.understand_images(
+            [VLJob(buf.getvalue(), "Describe the image.")],
+            max_new_tokens=settings.vl_warmup_new_tokens,
         )
 
-        # 移动到设备
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+    def understand_images(
+        self, jobs: list[VLJob], max_new_tokens: int | None = None
+    ) -> list[VLAnswer]:
+        """
+        批量理解多张图像并分别回答问题。
 
-        print(f"[VL] Input shapes: {[(k, v.shape) for k, v in inputs.items()]}")
+        处理流程（手动预处理演示）：
+        1. 视觉阶段：按图像字节哈希和像素预算查特征缓存，未命中的图像
+           解码 -> 按预算缩放 -> image_processor -> pixel_values -> 视觉编码器（整批一次）
+        2. 文本阶段：对话模板构造提示词，按图像网格展开图像占位 tokens，
+           分词并左侧补齐 -> input_ids / attention_mask
+        3. 把视觉特征填入图像占位 token 的位置，一次前向完成整批 prefill，
+           然后逐 token 贪心解码（订阅了流式输出的请求边解码边输出文本）
+        4. 解码 tokens -> 文本答案
 
-        # 步骤 3: 生成响应
-        with torch.no_grad():
-            output_ids = self.model.generate(
-                **inputs,
-                max_new_tokens=settings.vl_max_new_tokens,
-                do_sample=False,
+        会话中的追问命中会话的 KV cache 时跳过 1-3，只 prefill 新问题的 tokens
+        （逐个执行，各会话已缓存的长度不同）；未命中时带上对话历史与其他请求一起走完整流程，
+        结束后保存该会话的 KV cache。
+
+        Args:
+            jobs: 视觉语言请求列表
+            max_new_tokens: 最多生成的 token 数，None 表示使用 VL_MAX_NEW_TOKENS
+
+        Returns:
+            与 jobs 顺序一致的答案列表
+        """
+        questions = [job.question for job in jobs]
+        print(f"[VL] Processing batch of {len(jobs)} question(s): {questions}")
+
+        # 关闭空闲超时的会话
+        deadline = time.monotonic() - settings.vl_session_idle_s
+        self.sessions.evict_while(lambda state: state.last_used < deadline)
+
+        answers: dict[int, VLAnswer] = {}
+        fresh: list[int] = []
+        for index, job in enumerate(jobs):
+            state = self.sessions.pop(job.session_id) if job.session_id else None
+            if state is not None and state.turns == len(job.history):
+                answers[index] = self._continue_session(job, state, max_new_tokens)
+            else:
+                fresh.append(index)
+
+        if fresh:
+            batch = self._answer_batch([jobs[index] for index in fresh], max_new_tokens)
+            answers.update(zip(fresh, batch))
+        return [answers[index] for index in range(len(jobs))]
+
+    def close_session(self, session_id: str) -> None:
+        """释放会话的 KV cache，并留下墓碑使正在执行的一轮不再保存。"""
+        self.closed_sessions.put(session_id, True)
+        self.sessions.pop(session_id)
+
+    def _answer_batch(self, jobs: list[VLJob], max_new_tokens: int | None = None) -> list[VLAnswer]:
+        """完整流程回答一批请求（视觉编码、整批 prefill 和解码）。"""
+        # 步骤 1: 视觉特征（带缓存）
+        features, hits = self._get_vision_features(jobs)
+        print(f"[VL] Vision cache: {sum(hits)} hit(s), {len(hits) - sum(hits)} miss(es)")
+        print(f"[VL] Visual tokens: {[f.num_tokens for f in features]}")
+
+        # 步骤 2: 文本分词，每个图像占位符展开成与视觉特征数量相同的 tokens
+        image_token = self.processor.image_token
+        texts = [
+            self._build_prompt(job.question, job.history).replace(
+                image_token, image_token * f.num_tokens, 1
             )
+            for job, f in zip(jobs, features)
+        ]
+        with metrics.stage("vl", "tokenize"):
+            text_inputs = self.processor.tokenizer(texts, padding=True, return_tensors="pt")
+        input_ids = text_inputs["input_ids"].to(self.device)
+        attention_mask = text_inputs["attention_mask"].to(self.device)
+
+        # 步骤 3: 把视觉特征写入图像占位 token 对应的词向量位置
+        with torch.no_grad():
+            inputs_embeds = self.model.get_input_embeddings()(input_ids)
+        image_mask = (input_ids == self.model.config.image_token_id).unsqueeze(-1)
+        image_embeds = torch.cat([f.image_embeds for f in features]).to(inputs_embeds.dtype)
+        inputs_embeds = inputs_embeds.masked_scatter(
+            image_mask.expand_as(inputs_embeds), image_embeds
+        )
+
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "inputs_embeds": inputs_embeds,
+            "image_grid_thw": torch.cat([f.image_grid_thw for f in features]),
+        }
+        print(f"[VL] Input shapes: {[(k, v.shape) for k, v in inputs.items()]}")
+
+        streams = [
+            TextStream(self.processor.tokenizer, job.on_text) if job.on_text else None
+            for job in jobs
+        ]
+        generated, caches = self._generate_batch(
+            inputs, streams, max_new_tokens, keep_cache=[job.session_id is not None for job in jobs]
+        )
+        for job, state in zip(jobs, caches):
+            if state is not None:
+                self._save_session(job, state)
 
         # 步骤 4: 将 tokens 解码为文本
         # 跳过特殊 tokens 以获得干净的输出
-        answer = self.processor.batch_decode(output_ids, skip_special_tokens=True)[0]
+        answers = self.processor.batch_decode(generated, skip_special_tokens=True)
+
+        print(f"[VL] Generated answers: {answers}")
+        return [VLAnswer(text, hit) for text, hit in zip(answers, hits)]
+
+    def _continue_session(
+        self, job: VLJob, state: SessionCache, max_new_tokens: int | None = None
+    ) -> VLAnswer:
+        """在会话的 KV cache 之后只 prefill 新问题，然后解码回答。"""
+        with metrics.stage("vl", "tokenize"):
+            new_tokens = self.processor.tokenizer(self._build_followup(job.question))["input_ids"]
+        new_tokens = state.pending + new_tokens
+        past = state.cache.get_seq_length()
+        print(
+            f"[VL] Session {job.session_id}: KV cache hit, "
+            f"prefill {len(new_tokens)} new token(s) after {past}"
+        )
+
+        inputs = {
+            "input_ids": torch.tensor([new_tokens], device=self.device),
+            "attention_mask": torch.ones(
+                (1, past + len(new_tokens)), dtype=torch.long, device=self.device
+            ),
+        }
+        self.model.rope_deltas = state.rope_deltas
+        stream = TextStream(self.processor.tokenizer, job.on_text) if job.on_text else None
+        generated, caches = self._generate_batch(
+            inputs, [stream], max_new_tokens, cache=state.cache, keep_cache=[True]
+        )
+        if caches[0] is not None:
+            self._save_session(job, caches[0])
+
+        text = self.processor.batch_decode(generated, skip_special_tokens=True)[0]
+        print(f"[VL] Generated answers: {[text]}")
+        # 图像已经在会话的 KV cache 中，不需要视觉编码
+        return VLAnswer(text, vision_cache_hit=True, session_cache_hit=True)
+
+    def _save_session(self, job: VLJob, state: SessionCache) -> None:
+        """保存会话回答完本轮之后的 KV cache（会话已关闭时不保存，超过容量时淘汰最久未用的）。"""
+        assert job.session_id is not None
+        state.turns = len(job.history) + 1
+        state.last_used = time.monotonic()
+        save_session_cache(self.sessions, self.closed_sessions, job.session_id, state)
+
+    def pixel_budget(self, job: VLJob) -> tuple[int, int]:
+        """
+        解析请求的像素预算。
+
+        请求只能在配置的上限以内调小预算；下限不超过上限。
+
+        Returns:
+            (最少像素数, 最多像素数)
+        """
+        max_pixels = min(job.max_pixels or settings.vl_max_pixels, settings.vl_max_pixels)
+        min_pixels = min(job.min_pixels or settings.vl_min_pixels, max_pixels)
+        return min_pixels, max_pixels
+
+    def _get_vision_features(self, jobs: list[VLJob]) -> tuple[list[VisionFeatures], list[bool]]:
+        """
+        获取每张图像的视觉特征，未命中缓存的图像一起过一次视觉编码器。
+
+        同一张图在不同像素预算下得到的特征不同，缓存键同时包含图像哈希和预算。
+
+        Returns:
+            (与 jobs 顺序一致的特征列表, 每张图像是否命中缓存)
+        """
+        budgets = [self.pixel_budget(job) for job in jobs]
+        keys = [
+            f"{hashlib.sha256(job.image_bytes).hexdigest()}:{lo}:{hi}"
+            for job, (lo, hi) in zip(jobs, budgets)
+        ]
+        features: list[VisionFeatures | None] = [self.vision_cache.get(key) for key in keys]
+        hits = [f is not None for f in features]
+        metrics.record_cache_lookup("vl_vision_features", True, sum(hits))
+        metrics.record_cache_lookup("vl_vision_features", False, len(hits) - sum(hits))
+
+        # 同一批内重复的图像只编码一次
+        missing: dict[str, int] = {}
+        for index, (key, f) in enumerate(zip(keys, features)):
+            if f is None and key not in missing:
+                missing[key] = index
+
+        if missing:
+            # 加载图像：尺寸已在路由中按文件头检查过，JPEG 直接缩小解码到预算附近的分辨率
+            with metrics.stage("vl", "image_decode"):
+                pil_images = [
+                    decode_image(jobs[index].image_bytes, budgets[index][1])
+                    for index in missing.values()
+                ]
+
+            # 按像素预算缩放到对齐网格的尺寸（每个网格单元合并成一个视觉 token）
+            image_processor = self.processor.image_processor
+            factor = image_processor.patch_size * image_processor.merge_size
+            with metrics.stage("vl", "resize"):
+                pil_images = [
+                    resize_to_budget(image, factor, *budgets[index])
+                    for image, index in zip(pil_images, missing.values())
+                ]
 
-        print(f"[VL] Generated answer: {answer}")
-        return answer
+            # 图像: 归一化、切成 patch -> pixel_values（尺寸已对齐，跳过预处理器自带的缩放）
+            with metrics.stage("vl", "processor"):
+                vision_inputs = image_processor(
+                    images=pil_images, do_resize=False, return_tensors="pt"
+                )
+            pixel_values = vision_inputs["pixel_values"].to(self.device, self.model.visual.dtype)
+            grid_thw = vision_inputs["image_grid_thw"].to(self.device)
+
+            with (
+                torch.no_grad(),
+                acceleration.autocast(not self.quantize_vision),
+                metrics.stage("vl", "vision_encode"),
+            ):
+                embeds = self.model.visual(pixel_values, grid_thw=grid_thw)
+
+            # 视觉编码器把相邻 merge_size x merge_size 个 patch 合并成一个 token
+            merge = self.model.visual.spatial_merge_size**2
+            splits = (grid_thw.prod(dim=-1) // merge).tolist()
+            for key, grid, chunk in zip(missing, grid_thw, embeds.split(splits)):
+                encoded = VisionFeatures(grid[None], chunk)
+                self.vision_cache.put(key, encoded)
+                for index, k in enumerate(keys):
+                    if k == key:
+                        features[index] = encoded
+
+        return features, hits
+
+    def _build_prompt(self, question: str, history: list[tuple[str, str]] | None = None) -> str:
+        """
+        用对话模板把问题包装成带图像占位符的提示词。
+
+        Args:
+            question: 本轮问题
+            history: 此前各轮的 (问题, 回答)，图像放在第一轮的问题中
+        """
+        turns: list[tuple[str, str | None]] = [*(history or []), (question, None)]
+        messages: list[dict[str, Any]] = []
+        for index, (text, answer) in enumerate(turns):
+            content: list[dict[str, str]] = [{"type": "text", "text": text}]
+            if index == 0:
+                content.insert(0, {"type": "image"})
+            messages.append({"role": "user", "content": content})
+            if answer is not None:
+                reply = [{"type": "text", "text": answer}]
+                messages.append({"role": "assistant", "content": reply})
+        return self.processor.apply_chat_template(messages, add_generation_prompt=True)
+
+    def _build_followup(self, question: str) -> str:
+        """
+        追问的提示词片段：从结束上一轮回答开始，到本轮回答的开头为止。
+
+        即两轮对话的完整提示词去掉第一轮提示词和回答之后剩下的部分，
+        直接接在会话的 KV cache 之后。
+        """
+        first_turn = self._build_prompt("q") + "a"
+        return self._build_prompt(question, [("q", "a")])[len(first_turn) :]
+
+    def _generate_batch(
+        self,
+        inputs: dict[str, torch.Tensor],
+        streams: list[TextStream | None] | None = None,
+        max_new_tokens: int | None = None,
+        cache: DynamicCache | None = None,
+        keep_cache: list[bool] | None = None,
+    ) -> tuple[list[list[int]], list[SessionCache | None]]:
+        """
+        整批贪心解码。
+
+        与 ``model.generate`` 不同，已经输出结束符的行会立即从批次中移除
+        （连同它的 KV cache），剩余的行不再为它们做无用计算。
+
+        Args:
+            inputs: 模型输入（input_ids、attention_mask、inputs_embeds 等，已在目标设备上）
+            streams: 与批内各行对应的增量解码器，None 表示该行不需要流式输出
+            max_new_tokens: 最多生成的 token 数，None 表示使用 VL_MAX_NEW_TOKENS
+            cache: 已有的 KV cache（会话追问），inputs 接在其后；attention_mask 覆盖已缓存的部分
+            keep_cache: 与批内各行对应，为 True 的行在结束时保留其 KV cache
+
+        Returns:
+            (每一行新生成的 token id（不含提示词和结束符）, 每一行保留的 KV cache)
+        """
+        max_new_tokens = max_new_tokens or settings.vl_max_new_tokens
+        attention_mask = inputs["attention_mask"]
+        batch_size, prompt_len = inputs["input_ids"].shape
+
+        generated: list[list[int]] = [[] for _ in range(batch_size)]
+        streams = streams or [None] * batch_size
+        keep_cache = keep_cache or [False] * batch_size
+        caches: list[SessionCache | None] = [None] * batch_size
+        active = list(range(batch_size))
+        cache = cache if cache is not None else DynamicCache()
+        past = cache.get_seq_length()
+
+        with torch.no_grad(), acceleration.autocast(not self.quantized):
+            # prefill：整批提示词一次前向
+            with metrics.stage("vl", "prefill"):
+                outputs = self.model(
+                    **inputs,
+                    past_key_values=cache,
+                    use_cache=True,
+                    cache_position=torch.arange(past, past + prompt_len, device=self.device),
+                )
+                next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+            decode_start = time.perf_counter()
+
+            for step in range(max_new_tokens):
+                keep = []
+                for row, token in enumerate(next_tokens.tolist()):
+                    if token in self.eos_token_ids:
+                        continue
+                    generated[active[row]].append(token)
+                    keep.append(row)
+                    if streams[active[row]] is not None:
+                        streams[active[row]].push(token)
+
+                stop = not keep or step == max_new_tokens - 1
+                # 需要保留 KV cache 的行在移出批次之前取出自己的部分
+                for row, index in enumerate(active):
+                    if keep_cache[index] and (stop or row not in keep):
+                        # 因截断结束时，最后一个 token 还没有送入模型
+                        pending = generated[index][-1:] if row in keep else []
+                        caches[index] = self._row_cache(cache, row, attention_mask[row], pending)
+                if stop:
+                    break
+
+                # 移除已结束的行
+                if len(keep) < len(active):
+                    index = torch.tensor(keep, device=self.device)
+                    next_tokens = next_tokens[index]
+                    attention_mask = attention_mask[index]
+                    cache.batch_select_indices(index)
+                    # Qwen2.5-VL 把 M-RoPE 位置偏移按行缓存在模型上，需要同步裁剪
+                    if getattr(self.model, "rope_deltas", None) is not None:
+                        self.model.rope_deltas = self.model.rope_deltas[index]
+                    active = [active[row] for row in keep]
+
+                # decode：每行只送入上一步生成的 token
+                attention_mask = torch.cat(
+                    [attention_mask, attention_mask.new_ones((len(active), 1))], dim=1
+                )
+                outputs = self.model(
+                    input_ids=next_tokens[:, None],
+                    attention_mask=attention_mask,
+                    past_key_values=cache,
+                    use_cache=True,
+                    cache_position=torch.tensor([attention_mask.shape[1] - 1], device=self.device),
+                )
+                next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - decode_start, "vl", "decode")
+        return generated, caches
+
+    def _row_cache(
+        self, cache: DynamicCache, row: int, attention_mask: torch.Tensor, pending: list[int]
+    ) -> SessionCache:
+        """取出批内一行的 KV cache，去掉左侧补齐的位置。"""
+        pad = int((attention_mask == 0).sum())
+        rope_deltas = self.model.rope_deltas[row : row + 1] + pad
+        if cache.key_cache[0].shape[0] == 1 and pad == 0:
+            # 单行且没有补齐（会话追问）：直接沿用
+            return SessionCache(cache, rope_deltas, pending)
+        row_cache = DynamicCache.from_legacy_cache(
+            tuple(
+                (k[row : row + 1, :, pad:].clone(), v[row : row + 1, :, pad:].clone())
+                for k, v in zip(cache.key_cache, cache.value_cache)
+            )
+        )
+        return SessionCache(row_cache, rope_deltas, pending)
 
     def _manual_preprocessing_example(self, image_bytes: bytes, question: str) -> dict[str, Any]:
         """
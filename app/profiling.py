@@ -0,0 +1,133 @@
+"""
+按请求开启的性能剖析：定位某个提示词或图像为什么慢，不必给生产进程挂调试器。
+
+开启方式（二者任一）：
+    - 请求携带 ``X-Profile: <PROFILE_TOKEN>`` 请求头或 ``?profile=<PROFILE_TOKEN>`` 查询参数，
+      令牌不匹配时返回 403
+    - 按 PROFILE_SAMPLE_RATE 随机抽样请求
+被剖析的请求在响应头 ``X-Trace-Id`` 中返回 trace ID，该请求所在的整批推理
+（模型的 generate_images / understand_images 调用，多副本时在副本进程中）被记录到
+``{PROFILE_DIR}/{trace_id}.json``（torch.profiler 的 Chrome trace，可在 Perfetto 中打开）
+或 ``{trace_id}.prof``（cProfile 统计，可用 snakeviz / pstats 查看）。
+同一批中有多个被剖析的请求时共用一份记录。命中结果缓存的请求没有推理，也就没有记录。
+
+PROFILE_TOKEN 为空且 PROFILE_SAMPLE_RATE 为 0 时完全关闭：不解析请求头，推理函数也不做包装。
+"""
+
+import cProfile
+import functools
+import os
+import random
+import secrets
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, TypeVar
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+
+R = TypeVar("R")
+
+
+def enabled() -> bool:
+    """是否开启了按请求剖析。"""
+    return bool(settings.profile_token) or settings.profile_sample_rate > 0
+
+
+def trace_id_for(connection: HTTPConnection) -> str | None:
+    """
+    决定是否剖析该请求。
+
+    Returns:
+        需要剖析时返回新的 trace ID，否则返回 None
+
+    Raises:
+        HTTPException: 请求了剖析但令牌不正确（403）
+    """
+    requested = connection.headers.get("x-profile") or connection.query_params.get("profile")
+    if requested:
+        if not settings.profile_token or not secrets.compare_digest(
+            requested.encode(), settings.profile_token.encode()
+        ):
+            raise HTTPException(status_code=403, detail="Invalid profiling token")
+    elif random.random() >= settings.profile_sample_rate:
+        return None
+
+    trace_id = uuid.uuid4().hex
+    # 由 HTTP 中间件写入响应头
+    connection.state.trace_id = trace_id
+    return trace_id
+
+
+@contextmanager
+def capture(trace_ids: list[str]) -> Iterator[None]:
+    """
+    剖析代码块，结果写入 PROFILE_DIR，每个 trace ID 一个文件名（硬链接到同一份记录）。
+
+    Args:
+        trace_ids: 本批中被剖析的请求的 trace ID
+    """
+    directory = Path(settings.profile_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    if settings.profiler == "torch":
+        import torch
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if settings.device == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(
+            activities=activities, record_shapes=True, with_stack=True
+        ) as profiler:
+            yield
+        path = directory / f"{trace_ids[0]}.json"
+        profiler.export_chrome_trace(str(path))
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        path = directory / f"{trace_ids[0]}.prof"
+        profiler.dump_stats(path)
+
+    for trace_id in trace_ids[1:]:
+        os.link(path, path.with_stem(trace_id))
+    print(
+        f"[Profile] {len(trace_ids)} traced request(s), "
+        f"{time.perf_counter() - start:.2f}s, written to {path}"
+    )
+
+
+def profiled(fn: Callable[..., R]) -> Callable[..., R]:
+    """
+    包装批量推理函数：批内有请求带 trace_id 时剖析整批。
+
+    关闭剖析时原样返回，没有任何额外开销。
+
+    Args:
+        fn: 第一个参数为请求列表的批量推理函数
+
+    Returns:
+        包装后的函数
+    """
+    if not enabled():
+        return fn
+
+    @functools.wraps(fn)
+    def run(jobs: list[Any], *args: Any, **kwargs: Any) -> R:
+        # 同一请求的多张图像共用一个 trace ID
+        trace_ids = list(dict.fromkeys(job.trace_id for job in jobs if job.trace_id))
+        if not trace_ids:
+            return fn(jobs, *args, **kwargs)
+        with capture(trace_ids):
+            return fn(jobs, *args, **kwargs)
+
+    return run
@@ -1,85 +1,441 @@
 """文生图 API 路由（HTTP 和 WebSocket）。"""
 
+import asyncio
 import base64
+import dataclasses
+from collections.abc import Awaitable, Callable, Iterator
 from typing import Any
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import Response
-from pydantic import BaseModel
-
-from app.models.t2i_hunyuan import HunyuanDiTModel
-from app.queue import run_exclusive
+from PIL import Image
+from pydantic import BaseModel, Field, ValidationError
+
+from app import acceleration, lifecycle, metrics, model_manager, profiling
+from app.cache import TieredCache, make_key
+from app.config import settings
+from app.encoding import EncodeOptions, OutputFormat, encode_image_async, negotiate_format
+from app.generation import GenerationParams, Sampler
+from app.jobs import JobResponse, JobStatus, get_job_store
+from app.lifecycle import ModelHandle
+from app.models.simulated import SimulatedT2IModel
+from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+from app.scheduler import BatchScheduler, RequestOptions, error_message, request_options
+from app.streaming import StreamChannel
+from app.workers import WorkerPool, load_t2i
 
 router = APIRouter(prefix="/t2i", tags=["text-to-image"])
 
 # 全局变量类型标注
-_model: HunyuanDiTModel | None = None
+_model: HunyuanDiTModel | SimulatedT2IModel | None = None
+_batcher: BatchScheduler[T2IJob, Image.Image] | None = None
+_cache: TieredCache | None = None
+
 
+def _create_model() -> HunyuanDiTModel | SimulatedT2IModel:
+    """加载模型（MODEL_BACKEND=simulated 时为模拟模型）。"""
+    return SimulatedT2IModel() if settings.model_backend == "simulated" else HunyuanDiTModel()
 
-def get_model() -> HunyuanDiTModel | None:
-    """获取或初始化文生图模型（单例模式）。"""
-    from app.config import settings
 
+def get_model() -> HunyuanDiTModel | SimulatedT2IModel | None:
+    """获取或初始化文生图模型（单例模式，MODEL_BACKEND=simulated 时为模拟模型）。"""
     if settings.demo_mode:
         return None
 
     global _model
     if _model is None:
-        _model = HunyuanDiTModel()
+        _model = _create_model()
     return _model
 
 
+def _load_backend() -> tuple[Callable[[list[T2IJob]], Awaitable[list[Image.Image]]], int]:
+    """
+    加载推理后端（在后台线程中执行）。
+
+    Returns:
+        (执行一批请求的协程函数, 可以同时执行的批数)
+    """
+    if settings.service_mode == "all":
+        # 单进程多模型：首次推理时由模型管理器加载，超出内存预算或空闲时卸载
+        manager = model_manager.get_manager()
+        manager.register("t2i", _create_model)
+
+        def generate_images(jobs: list[T2IJob]) -> list[Image.Image]:
+            with manager.use("t2i") as model:
+                return model.generate_images(jobs)
+
+        return _in_process(generate_images)
+
+    if settings.worker_replicas > 0:
+        # 多副本：每个副本在自己的进程中加载并预热，同时执行一批
+        pool = WorkerPool(load_t2i, settings.worker_replicas, settings.worker_threads_per_replica)
+        pool.start()
+        return pool.run, pool.replicas_count
+
+    return _in_process(get_model().generate_images)
+
+
+def _in_process(
+    generate_images: Callable[[list[T2IJob]], list[Image.Image]],
+) -> tuple[Callable[[list[T2IJob]], Awaitable[list[Image.Image]]], int]:
+    """在 API 进程内执行批量推理。"""
+    generate_images = profiling.profiled(generate_images)
+
+    async def run_batch(jobs: list[T2IJob]) -> list[Image.Image]:
+        # 调度器一次只执行一批，在线程池中运行以免阻塞事件循环
+        return await asyncio.to_thread(generate_images, jobs)
+
+    return run_batch, 1
+
+
+def _warmup_backend(backend: tuple[Any, int]) -> None:
+    """预热 API 进程内的模型。"""
+    get_model().warmup()
+
+
+# 应用启动时开始后台加载，就绪前的推理请求直接返回 503
+backend = lifecycle.register(
+    ModelHandle(
+        "t2i",
+        _load_backend,
+        # 多副本在各自进程中加载后即预热；SERVICE_MODE=all 时首次推理才加载，不预热
+        None if settings.worker_replicas > 0 or settings.service_mode == "all" else _warmup_backend,
+    )
+)
+
+
+def get_batcher() -> BatchScheduler[T2IJob, Image.Image]:
+    """
+    获取或初始化文生图微批调度器（单例模式）。
+
+    Raises:
+        AdmissionError: 模型尚未加载完成（503）
+    """
+    global _batcher
+    if _batcher is None:
+        run_batch, concurrency = backend.get()
+        _batcher = BatchScheduler(
+            run_batch,
+            concurrency=concurrency,
+            name="t2i",
+            max_batch_size=settings.t2i_max_batch_size,
+            max_wait_ms=settings.t2i_batch_max_wait_ms,
+            max_queue_depth=settings.t2i_max_queue_depth,
+            # 生成参数不同的请求不能在同一次扩散推理中生成
+            batch_key=lambda job: job.params,
+        )
+    return _batcher
+
+
+async def _submit(job: T2IJob, options: RequestOptions | None = None) -> Image.Image:
+    """提交到微批调度器；被剖析的请求带上 trace ID，推理时据此剖析所在的批次。"""
+    if options is not None and options.trace_id is not None:
+        job = dataclasses.replace(job, trace_id=options.trace_id)
+    return await get_batcher().submit(job, options)
+
+
+def get_cache() -> TieredCache | None:
+    """获取或初始化文生图结果缓存（单例模式），未启用时返回 None。"""
+    global _cache
+    if _cache is None and settings.t2i_cache_enabled:
+        _cache = TieredCache(
+            memory_bytes=settings.t2i_cache_memory_bytes,
+            disk_dir=settings.t2i_cache_dir,
+            disk_bytes=settings.t2i_cache_disk_bytes,
+        )
+    return _cache
+
+
+def _cache_key(job: T2IJob, encoding: EncodeOptions) -> str:
+    """由提示词、seed、输出编码以及所有影响输出的生成参数计算缓存键。"""
+    return make_key(
+        model_id=settings.t2i_model_id,
+        # 模拟后端的纯色占位图不能被真实后端读到（缓存跨重启保留）
+        backend=settings.model_backend,
+        # bfloat16 autocast（CPU_PROFILE=fast / max）改变输出像素
+        bf16=acceleration.use_bf16(),
+        prompt=job.prompt,
+        seed=job.seed,
+        num_inference_steps=job.params.num_inference_steps,
+        guidance_scale=job.params.guidance_scale,
+        height=job.params.height,
+        width=job.params.width,
+        sampler=job.params.sampler,
+        format=encoding.format.value,
+        quality=encoding.quality,
+        compress_level=encoding.compress_level,
+    )
+
+
+async def generate(
+    job: T2IJob,
+    options: RequestOptions | None = None,
+    encoding: EncodeOptions | None = None,
+) -> bytes:
+    """
+    生成一张图像并编码：先查结果缓存，未命中再进入微批调度。
+
+    只有显式指定 seed 的请求结果可复现，才会读写缓存；
+    缓存命中时完全不占用推理队列，也不受准入控制限制。
+    编码在编码线程池中进行，调度器此时已经可以开始下一批推理。
+
+    Raises:
+        AdmissionError: 推理队列已满或无法在截止时间内完成
+    """
+    encoding = encoding or EncodeOptions.create()
+    cache = get_cache() if job.seed is not None else None
+    if cache is None:
+        image = await _submit(job, options)
+        return await encode_image_async(image, encoding)
+
+    # 磁盘层的读写（几 MB 的文件）放到线程中，不阻塞事件循环上的其他连接
+    key = _cache_key(job, encoding)
+    image_bytes = await asyncio.to_thread(cache.get, key)
+    metrics.record_cache_lookup("t2i_results", image_bytes is not None)
+    if image_bytes is None:
+        image = await _submit(job, options)
+        image_bytes = await encode_image_async(image, encoding)
+        await asyncio.to_thread(cache.put, key, image_bytes)
+    return image_bytes
+
+
+async def generate_all(
+    jobs: list[T2IJob],
+    options: RequestOptions | None = None,
+    encoding: EncodeOptions | None = None,
+) -> list[bytes]:
+    """并发生成同一请求的多张图像（参数相同，会合并进同一批）；任一张失败时取消其余的。"""
+    tasks = [asyncio.ensure_future(generate(job, options, encoding)) for job in jobs]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
 class TextToImageRequest(BaseModel):
     """文生图请求模式。"""
 
     prompt: str
+    # 指定 seed 时第 i 张图像使用 seed + i
+    seed: int | None = None
+    # 生成参数，未指定时使用服务端默认值；超出计算预算时步数会被减少，实际值随响应返回
+    steps: int | None = Field(default=None, ge=1)
+    guidance_scale: float | None = Field(default=None, ge=1.0, le=20.0)
+    # 分辨率映射到模型支持的标准尺寸
+    width: int | None = Field(default=None, ge=256, le=2048)
+    height: int | None = Field(default=None, ge=256, le=2048)
+    sampler: Sampler | None = None
+    num_images: int = Field(default=1, ge=1)
+    # 输出格式，未指定时使用 T2I_OUTPUT_FORMAT（/generate/image 还会参考 Accept 请求头）
+    format: OutputFormat | None = None
+    # WebP / JPEG 质量
+    quality: int | None = Field(default=None, ge=1, le=100)
+    # PNG 压缩级别，越低编码越快、文件越大
+    compress_level: int | None = Field(default=None, ge=0, le=9)
+
+    def encode_options(self, format: OutputFormat | None = None) -> EncodeOptions:
+        """请求中的编码参数，``format`` 用于覆盖请求体中的格式。"""
+        return EncodeOptions.create(format or self.format, self.quality, self.compress_level)
+
+    def generation_params(self) -> GenerationParams:
+        """
+        实际使用的生成参数。
+
+        Raises:
+            HTTPException: 超过服务端上限（422）
+        """
+        return GenerationParams.create(
+            self.steps,
+            self.guidance_scale,
+            self.height,
+            self.width,
+            self.sampler,
+            self.num_images,
+        )
+
+    def jobs(self, params: GenerationParams) -> list[T2IJob]:
+        """构造推理请求，每张图像一个。"""
+        return [
+            T2IJob(self.prompt, None if self.seed is None else self.seed + i, params)
+            for i in range(self.num_images)
+        ]
 
 
 class TextToImageResponse(BaseModel):
     """文生图响应模式。"""
 
     image_base64: str
+    format: OutputFormat = OutputFormat.PNG
+    # num_images > 1 时其余的图像
+    extra_images_base64: list[str] = Field(default_factory=list)
+    # 实际使用的生成参数
+    steps: int
+    sampler: str
+    guidance_scale: float
+    width: int
+    height: int
+
+
+def _params_info(params: GenerationParams) -> dict[str, Any]:
+    """响应中报告的实际生成参数。"""
+    return {
+        "steps": params.num_inference_steps,
+        "sampler": params.sampler,
+        "guidance_scale": params.guidance_scale,
+        "width": params.width,
+        "height": params.height,
+    }
+
+
+def _single_image(request: TextToImageRequest) -> None:
+    """只返回一张图像的端点不接受 num_images > 1。"""
+    if request.num_images > 1:
+        raise HTTPException(
+            status_code=422, detail="num_images > 1 is only supported by /t2i/generate and /t2i/ws"
+        )
 
 
 @router.post("/generate", response_model=TextToImageResponse)
-async def generate_image_http(request: TextToImageRequest) -> TextToImageResponse:
+async def generate_image_http(
+    request: TextToImageRequest,
+    options: RequestOptions = Depends(request_options),
+) -> TextToImageResponse:
     """
     从文本提示生成图像（HTTP 端点）。
 
     Args:
         request: 文本提示
+        options: 由 X-Priority / X-Client-Id / X-Deadline-Ms 请求头解析的调度参数
 
     Returns:
-        Base64 编码的 PNG 图像
+        Base64 编码的图像（默认 PNG）和实际使用的生成参数
     """
-    model = get_model()
+    encoding = request.encode_options()
+    params = request.generation_params()
 
-    # 独占执行推理（队列管理）
-    image_bytes = await run_exclusive(lambda: model.generate_image(request.prompt))
+    # 查缓存，未命中时与其他并发请求合并成一批推理
+    images = await generate_all(request.jobs(params), options, encoding)
 
     # 编码为 Base64
-    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    with metrics.stage("t2i", "base64"):
+        first, *extra = [base64.b64encode(image).decode("ascii") for image in images]
 
-    return TextToImageResponse(image_base64=image_base64)
+    return TextToImageResponse(
+        image_base64=first,
+        format=encoding.format,
+        extra_images_base64=extra,
+        **_params_info(params),
+    )
 
 
 @router.post("/generate/image", response_class=Response)
-async def generate_image_binary(request: TextToImageRequest) -> Response:
+async def generate_image_binary(
+    request: TextToImageRequest,
+    options: RequestOptions = Depends(request_options),
+    accept: str | None = Header(default=None),
+) -> Response:
     """
-    从文本提示生成图像，返回原始 PNG 字节。
+    从文本提示生成图像，返回原始图像字节。
+
+    请求体没有指定 format 时按 Accept 请求头选择格式
+    （例如 ``Accept: image/webp`` 返回 WebP），Accept 中没有支持的格式时返回 406。
+    实际使用的步数和采样器在 X-Steps / X-Sampler 响应头中返回。
 
     Args:
-        request: 文本提示
+        request: 文本提示和编码参数
+        options: 由请求头解析的调度参数
+        accept: Accept 请求头
 
     Returns:
-        PNG 图像字节
+        图像字节
+    """
+    format = request.format or negotiate_format(accept)
+    if format is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Supported formats: {', '.join(f.media_type for f in OutputFormat)}",
+        )
+    encoding = request.encode_options(format)
+    _single_image(request)
+    params = request.generation_params()
+
+    # 查缓存，未命中时与其他并发请求合并成一批推理
+    image_bytes = await generate(request.jobs(params)[0], options, encoding)
+
+    headers = {
+        "Vary": "Accept",
+        "X-Steps": str(params.num_inference_steps),
+        "X-Sampler": params.sampler,
+    }
+    return Response(content=image_bytes, media_type=format.media_type, headers=headers)
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_generation_job(
+    request: TextToImageRequest,
+    options: RequestOptions = Depends(request_options),
+) -> JobResponse:
     """
-    model = get_model()
+    提交异步文生图任务，立即返回任务 ID。
+
+    用 ``GET /t2i/jobs/{job_id}`` 查询状态，成功后从 ``result.image_url`` 下载图像。
 
-    # 独占执行推理
-    image_bytes = await run_exclusive(lambda: model.generate_image(request.prompt))
+    Args:
+        request: 文本提示和编码参数
+        options: 由请求头解析的调度参数
 
-    return Response(content=image_bytes, media_type="image/png")
+    Returns:
+        排队中的任务
+    """
+    # 参数超限或过载时直接返回 422/429/503，不创建注定失败的任务
+    _single_image(request)
+    params = request.generation_params()
+    get_batcher().admit(options)
+
+    encoding = request.encode_options()
+    store = get_job_store()
+    job = store.create("t2i")
+
+    async def run(started: Callable[[], None]) -> dict[str, Any]:
+        dispatch = dataclasses.replace(options, on_dispatch=started)
+        image_bytes = await generate(request.jobs(params)[0], dispatch, encoding)
+        store.put_data(job.id, image_bytes, f".{encoding.format.value}")
+        return {
+            "format": encoding.format.value,
+            "image_url": f"/t2i/jobs/{job.id}/image",
+            **_params_info(params),
+        }
+
+    store.submit(job, run)
+    return JobResponse.from_job(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_generation_job(job_id: str) -> JobResponse:
+    """查询异步文生图任务的状态和结果。"""
+    job = get_job_store().get(job_id, kind="t2i")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse.from_job(job)
+
+
+@router.get("/jobs/{job_id}/image", response_class=Response)
+async def get_generation_job_image(job_id: str) -> Response:
+    """下载异步文生图任务生成的图像。"""
+    store = get_job_store()
+    job = store.get(job_id, kind="t2i")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status is not JobStatus.SUCCEEDED or job.result is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+
+    format = OutputFormat(job.result["format"])
+    image_bytes = store.get_data(job_id, f".{format.value}")
+    if image_bytes is None:
+        raise HTTPException(status_code=404, detail="Job result not found")
+    return Response(content=image_bytes, media_type=format.media_type)
 
 
 @router.websocket("/ws")
@@ -88,28 +444,112 @@ async def generate_image_websocket(websocket: WebSocket) -> None:
     文生图 WebSocket 端点。
 
     协议：
-        客户端发送: {"prompt": "a beautiful sunset"}
-        服务器响应: {"image_base64": "iVBORw0KGgo..."}
+        客户端发送: {"prompt": "a beautiful sunset", "seed": 42, "preview": true,
+                    "format": "webp", "quality": 85, "steps": 8, "sampler": "dpmpp_2m"}
+                   （prompt 以外的字段均可选，编码和生成参数字段与 HTTP 请求体相同）
+        服务器响应: {"image_base64": "iVBORw0KGgo...", "format": "png", "extra_images_base64": [],
+                    "steps": 8, "sampler": "dpmpp_2m", "guidance_scale": 7.5,
+                    "width": 1024, "height": 768}
+
+    设置 "preview": true 时，去噪过程中每隔几步先发送一帧低分辨率 JPEG 预览
+    （num_images > 1 时只预览第一张）：
+        {"type": "preview", "step": 4, "total_steps": 10, "image_base64": "...", "preview_ms": 1.3}
+    最后仍然发送完整质量的图像。
+
+    连接握手时的 X-Priority / X-Client-Id / X-Deadline-Ms 请求头作用于该连接上的所有请求；
+    被准入控制拒绝时发送 {"error": "...", "status_code": 429, "retry_after": 3}，连接保持打开。
     """
     await websocket.accept()
-    model = get_model()
+    options = request_options(websocket)
 
     try:
         while True:
             # 接收请求
             data: dict[str, Any] = await websocket.receive_json()
-            prompt = data.get("prompt", "")
 
-            if not prompt:
+            if not data.get("prompt"):
                 await websocket.send_json({"error": "Missing prompt"})
                 continue
 
+            try:
+                request = TextToImageRequest.model_validate(data)
+            except ValidationError as exc:
+                await websocket.send_json({"error": str(exc)})
+                continue
+            encoding = request.encode_options()
+
             # 生成图像
-            image_bytes = await run_exclusive(lambda: model.generate_image(prompt))
+            try:
+                params = request.generation_params()
+                jobs = request.jobs(params)
+                if data.get("preview"):
+                    images = await _generate_with_previews(websocket, jobs, options, encoding)
+                else:
+                    images = await generate_all(jobs, options, encoding)
+            except HTTPException as exc:
+                await websocket.send_json(error_message(exc))
+                continue
 
             # 发送响应
-            image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-            await websocket.send_json({"image_base64": image_base64})
+            with metrics.stage("t2i", "base64"):
+                first, *extra = [base64.b64encode(image).decode("ascii") for image in images]
+            await websocket.send_json(
+                {
+                    "image_base64": first,
+                    "format": encoding.format.value,
+                    "extra_images_base64": extra,
+                    **_params_info(params),
+                }
+            )
 
     except WebSocketDisconnect:
         print("[T2I WebSocket] Client disconnected")
+
+
+async def _generate_with_previews(
+    websocket: WebSocket, jobs: list[T2IJob], options: RequestOptions, encoding: EncodeOptions
+) -> list[bytes]:
+    """生成图像，同时把推理线程产生的第一张图像的预览帧转发到 WebSocket。"""
+    channel: StreamChannel[dict[str, Any]] = StreamChannel()
+    jobs[0].on_preview = channel.put
+    task = asyncio.create_task(generate_all(jobs, options, encoding))
+    task.add_done_callback(lambda _: channel.close())
+
+    try:
+        async for preview in channel:
+            await websocket.send_json(preview)
+    except WebSocketDisconnect:
+        task.cancel()
+        raise
+
+    return await task
+
+
+def _collect_metrics() -> Iterator[metrics.Sample]:
+    """抓取 /metrics 时读取队列和结果缓存的当前状态。"""
+    if _batcher is not None:
+        yield from _batcher.metric_samples()
+    if _cache is not None:
+        stats = _cache.stats()
+        for tier in ("memory", "disk"):
+            labels = {"cache": "t2i_results", "tier": tier}
+            yield ("cache_entries", "gauge", "Cache entries", labels, stats[f"{tier}_entries"])
+            yield ("cache_bytes", "gauge", "Cache size in bytes", labels, stats[f"{tier}_bytes"])
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+@router.get("/queue")
+async def queue_stats() -> dict[str, float | int | None]:
+    """推理队列深度、拒绝/过期计数和每批服务时间。"""
+    return get_batcher().stats()
+
+
+@router.get("/cache")
+async def cache_stats() -> dict[str, int | bool]:
+    """文生图结果缓存的命中/未命中计数。"""
+    cache = get_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -1,6 +1,9 @@
 """Text-to-Image API routes - Simple Demo (no PIL dependency)."""
 
-from fastapi import APIRouter
+import base64
+from typing import Any
+
+from fastapi import APIRouter, Response, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/t2i", tags=["text-to-image"])
@@ -39,6 +42,27 @@ async def generate_image_demo(request: TextToImageRequest) -> TextToImageRespons
     return TextToImageResponse(image_base64=DEMO_IMAGE_BASE64)
 
 
+@router.post("/generate/image", response_class=Response)
+async def generate_image_bytes_demo(request: TextToImageRequest) -> Response:
+    """DEMO: Return the test image as raw PNG bytes."""
+    return Response(content=base64.b64decode(DEMO_IMAGE_BASE64), media_type="image/png")
+
+
+@router.websocket("/ws")
+async def generate_image_websocket_demo(websocket: WebSocket) -> None:
+    """DEMO: Answer every {"prompt": ...} message with the test image."""
+    await websocket.accept()
+    try:
+        while True:
+            data: dict[str, Any] = await websocket.receive_json()
+            if not data.get("prompt"):
+                await websocket.send_json({"error": "Missing prompt"})
+                continue
+            await websocket.send_json({"image_base64": DEMO_IMAGE_BASE64, "format": "png"})
+    except WebSocketDisconnect:
+        pass
+
+
 @router.get("/status")
 async def status():
     """Demo status endpoint."""
@@ -1,68 +1,363 @@
-"""视觉语言 API 路由（HTTP 和 WebSocket）。"""
+"""视觉语言 API 路由（HTTP、Server-Sent Events 和 WebSocket）。"""
 
+import asyncio
 import base64
+import binascii
+import dataclasses
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
 from typing import Any
 
-from fastapi import APIRouter, File, Form, UploadFile, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
-
-from app.models.vl_qwen import QwenVLModel
-from app.queue import run_exclusive
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from app import lifecycle, metrics, model_manager, profiling
+from app.config import settings
+from app.imaging import check_image, iter_upload, read_limited
+from app.jobs import JobResponse, get_job_store
+from app.lifecycle import ModelHandle
+from app.models.simulated import SimulatedVLModel
+from app.models.vl_qwen import QwenVLModel, VLAnswer, VLJob
+from app.scheduler import BatchScheduler, RequestOptions, error_message, request_options
+from app.sessions import Session, get_session_store
+from app.streaming import StreamChannel
+from app.workers import WorkerPool, load_vl
 
 router = APIRouter(prefix="/vl", tags=["vision-language"])
 
-_model: QwenVLModel | None = None
+_model: QwenVLModel | SimulatedVLModel | None = None
+_batcher: BatchScheduler[VLJob, VLAnswer] | None = None
+# 多副本模式下的副本池，关闭会话时通知各副本
+_pool: WorkerPool | None = None
+
 
+def _create_model() -> QwenVLModel | SimulatedVLModel:
+    """加载模型（MODEL_BACKEND=simulated 时为模拟模型）。"""
+    return SimulatedVLModel() if settings.model_backend == "simulated" else QwenVLModel()
 
-def get_model() -> QwenVLModel:
-    """获取或初始化视觉语言模型（单例模式）。"""
+
+def get_model() -> QwenVLModel | SimulatedVLModel:
+    """获取或初始化视觉语言模型（单例模式，MODEL_BACKEND=simulated 时为模拟模型）。"""
     global _model
     if _model is None:
-        _model = QwenVLModel()
+        _model = _create_model()
     return _model
 
 
+def _load_backend() -> tuple[Callable[[list[VLJob]], Awaitable[list[VLAnswer]]], int]:
+    """
+    加载推理后端（在后台线程中执行）。
+
+    Returns:
+        (执行一批请求的协程函数, 可以同时执行的批数)
+    """
+    global _pool
+    if settings.service_mode == "all":
+        # 单进程多模型：首次推理时由模型管理器加载，超出内存预算或空闲时卸载
+        manager = model_manager.get_manager()
+        manager.register("vl", _create_model)
+
+        def understand_images(jobs: list[VLJob]) -> list[VLAnswer]:
+            with manager.use("vl") as model:
+                return model.understand_images(jobs)
+
+        return _in_process(understand_images)
+
+    if settings.worker_replicas > 0:
+        # 多副本：每个副本在自己的进程中加载并预热，同时执行一批
+        pool = WorkerPool(load_vl, settings.worker_replicas, settings.worker_threads_per_replica)
+        pool.start()
+        _pool = pool
+        return pool.run, pool.replicas_count
+
+    return _in_process(get_model().understand_images)
+
+
+def _in_process(
+    understand_images: Callable[[list[VLJob]], list[VLAnswer]],
+) -> tuple[Callable[[list[VLJob]], Awaitable[list[VLAnswer]]], int]:
+    """在 API 进程内执行批量推理。"""
+    understand_images = profiling.profiled(understand_images)
+
+    async def run_batch(jobs: list[VLJob]) -> list[VLAnswer]:
+        # 调度器一次只执行一批，在线程池中运行以免阻塞事件循环
+        return await asyncio.to_thread(understand_images, jobs)
+
+    return run_batch, 1
+
+
+def _warmup_backend(backend: tuple[Any, int]) -> None:
+    """预热 API 进程内的模型。"""
+    get_model().warmup()
+
+
+# 应用启动时开始后台加载，就绪前的推理请求直接返回 503
+backend = lifecycle.register(
+    ModelHandle(
+        "vl",
+        _load_backend,
+        # 多副本在各自进程中加载后即预热；SERVICE_MODE=all 时首次推理才加载，不预热
+        None if settings.worker_replicas > 0 or settings.service_mode == "all" else _warmup_backend,
+    )
+)
+
+
+def get_batcher() -> BatchScheduler[VLJob, VLAnswer]:
+    """
+    获取或初始化视觉语言微批调度器（单例模式）。
+
+    Raises:
+        AdmissionError: 模型尚未加载完成（503）
+    """
+    global _batcher
+    if _batcher is None:
+        run_batch, concurrency = backend.get()
+        _batcher = BatchScheduler(
+            run_batch,
+            concurrency=concurrency,
+            name="vl",
+            max_batch_size=settings.vl_max_batch_size,
+            max_wait_ms=settings.vl_batch_max_wait_ms,
+            max_queue_depth=settings.vl_max_queue_depth,
+        )
+    return _batcher
+
+
+async def _submit(job: VLJob, options: RequestOptions | None = None) -> VLAnswer:
+    """提交到微批调度器；被剖析的请求带上 trace ID，推理时据此剖析所在的批次。"""
+    if options is not None and options.trace_id is not None:
+        job = dataclasses.replace(job, trace_id=options.trace_id)
+    return await get_batcher().submit(job, options)
+
+
+async def stream_answer(
+    job: VLJob, options: RequestOptions | None = None
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    提交请求并流式产出答案。
+
+    先逐段产出 {"delta": "..."}，生成结束后产出
+    {"answer": "...", "vision_cache_hit": ...}。
+    首段文本在 prefill 完成后即可到达，不必等待整个答案生成完毕。
+
+    客户端中途断开时只取消等待结果的任务：请求还在排队时调度器不再派发它；
+    已经派发的一批不会中断，这一行仍在推理线程（或副本）中解码到结束，
+    增量文本和结果被丢弃。
+    """
+    channel: StreamChannel[str] = StreamChannel()
+    job.on_text = channel.put
+    task = asyncio.create_task(_submit(job, options))
+    task.add_done_callback(lambda _: channel.close())
+
+    try:
+        async for delta in channel:
+            yield {"delta": delta}
+        result = await task
+    finally:
+        # 客户端中途断开时不再等待结果
+        task.cancel()
+
+    yield _answer_event(result)
+
+
+def _answer_event(result: VLAnswer) -> dict[str, Any]:
+    """完整答案消息。"""
+    return {
+        "answer": result.text,
+        "vision_cache_hit": result.vision_cache_hit,
+        "session_cache_hit": result.session_cache_hit,
+    }
+
+
+async def session_turn(
+    session: Session, question: str, options: RequestOptions | None = None, stream: bool = False
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    在会话中提问，产出与 ``stream_answer`` 相同的消息，完整答案中附带 session_id。
+
+    同一会话的各轮依次执行；回答完成后追加到会话历史。
+    """
+    answer: dict[str, Any] = {}
+    async with session.lock:
+        job = VLJob(
+            session.image_bytes,
+            question,
+            session.min_pixels,
+            session.max_pixels,
+            session_id=session.id,
+            history=list(session.history),
+        )
+        if stream:
+            async for event in stream_answer(job, options):
+                if "answer" not in event:
+                    yield event
+                    continue
+                answer = event
+        else:
+            answer = _answer_event(await _submit(job, options))
+
+        session.history.append((question, answer["answer"]))
+
+    yield {**answer, "session_id": session.id}
+
+
+def _close_session(session_id: str) -> None:
+    """
+    关闭会话，并释放模型中该会话的 KV cache（多副本时通知每个副本）。
+
+    模型留下墓碑：该会话正在执行的一轮结束时不会再保存 KV cache。
+    """
+    get_session_store().close(session_id)
+    if _pool is not None:
+        # 副本依次处理批次和通知，正在执行的一轮结束后才释放
+        _pool.broadcast("close_session", session_id)
+        return
+    model = _model
+    if settings.service_mode == "all":
+        # 模型已被卸载时会话缓存随之释放，不必为此重新加载
+        model = model_manager.get_manager().resident("vl")
+    if model is not None:
+        model.close_session(session_id)
+
+
 class VisionLanguageRequest(BaseModel):
     """视觉语言理解请求模式。"""
 
     image_base64: str
     question: str
+    # 像素预算（可选），只能在服务端配置的上限以内调小，用于控制视觉 token 数
+    min_pixels: int | None = Field(default=None, ge=1)
+    max_pixels: int | None = Field(default=None, ge=1)
+
+    def job(self, image_bytes: bytes) -> VLJob:
+        """构造推理请求。"""
+        return VLJob(image_bytes, self.question, self.min_pixels, self.max_pixels)
 
 
 class VisionLanguageResponse(BaseModel):
     """视觉语言理解响应模式。"""
 
     answer: str
+    # 视觉编码阶段是否命中了特征缓存（同一张图的追问通常会命中）
+    vision_cache_hit: bool = False
+
+
+class SessionCreateRequest(BaseModel):
+    """创建多轮会话的请求：会话内的各轮都针对这张图像。"""
+
+    image_base64: str
+    min_pixels: int | None = Field(default=None, ge=1)
+    max_pixels: int | None = Field(default=None, ge=1)
+
+
+class SessionResponse(BaseModel):
+    """新建的会话。"""
+
+    session_id: str
+    # 空闲超过该秒数后会话关闭
+    idle_timeout_s: float
+
+
+class SessionQuestion(BaseModel):
+    """会话中的一轮提问。"""
+
+    question: str
+
+
+class SessionAnswer(VisionLanguageResponse):
+    """会话中一轮的回答。"""
+
+    session_id: str
+    # 是否复用了会话的 KV cache（只 prefill 了新问题）
+    session_cache_hit: bool = False
 
 
 @router.post("/understand", response_model=VisionLanguageResponse)
 async def understand_image_http(
     request: VisionLanguageRequest,
+    options: RequestOptions = Depends(request_options),
 ) -> VisionLanguageResponse:
     """
     理解图像并回答问题（HTTP 端点，JSON 格式）。
 
     Args:
         request: Base64 编码的图像和问题
+        options: 由 X-Priority / X-Client-Id / X-Deadline-Ms 请求头解析的调度参数
 
     Returns:
         文本答案
     """
-    model = get_model()
+    # 解码并检查图像
+    image_bytes = _decode_image_base64(request.image_base64)
 
-    # 解码图像
-    image_bytes = base64.b64decode(request.image_base64)
+    # 与其他并发请求合并成一批推理
+    result = await _submit(request.job(image_bytes), options)
 
-    # 独占执行推理
-    answer = await run_exclusive(lambda: model.understand_image(image_bytes, request.question))
+    return VisionLanguageResponse(answer=result.text, vision_cache_hit=result.vision_cache_hit)
 
-    return VisionLanguageResponse(answer=answer)
+
+@router.post("/understand/stream")
+async def understand_image_sse(
+    request: VisionLanguageRequest,
+    options: RequestOptions = Depends(request_options),
+) -> StreamingResponse:
+    """
+    理解图像并流式返回答案（Server-Sent Events）。
+
+    事件格式：
+        data: {"delta": "This"}                       逐段文本
+        event: done
+        data: {"answer": "...", "vision_cache_hit": false}   完整答案
+        event: error
+        data: {"error": "..."}                        推理失败
+
+    Args:
+        request: Base64 编码的图像和问题
+        options: 由请求头解析的调度参数
+    """
+    image_bytes = _decode_image_base64(request.image_base64)
+
+    # 开始推送事件之前先做准入检查，过载时直接返回 429/503 状态码
+    get_batcher().admit(options)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event in stream_answer(request.job(image_bytes), options):
+                name = "done" if "answer" in event else None
+                yield _sse(event, name)
+        except HTTPException as exc:
+            yield _sse(error_message(exc), "error")
+        except Exception as exc:
+            yield _sse({"error": str(exc)}, "error")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _sse(data: dict[str, Any], event: str | None = None) -> str:
+    """格式化一条 SSE 消息。"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 @router.post("/understand/upload", response_model=VisionLanguageResponse)
 async def understand_image_upload(
     image: UploadFile = File(...),
     question: str = Form(...),
+    min_pixels: int | None = Form(default=None, ge=1),
+    max_pixels: int | None = Form(default=None, ge=1),
+    options: RequestOptions = Depends(request_options),
 ) -> VisionLanguageResponse:
     """
     理解图像并回答问题（HTTP 端点，文件上传）。
@@ -70,52 +365,268 @@ async def understand_image_upload(
     Args:
         image: 上传的图像文件
         question: 关于图像的问题
+        min_pixels: 像素预算下限（可选）
+        max_pixels: 像素预算上限（可选）
+        options: 由请求头解析的调度参数
 
     Returns:
         文本答案
     """
-    model = get_model()
+    # 分块读取图像字节，超过上限立即中止；解码前按文件头检查尺寸
+    image_bytes = await read_limited(iter_upload(image), settings.vl_max_image_bytes)
+    check_image(image_bytes)
+
+    # 与其他并发请求合并成一批推理
+    job = VLJob(image_bytes, question, min_pixels, max_pixels)
+    result = await _submit(job, options)
+
+    return VisionLanguageResponse(answer=result.text, vision_cache_hit=result.vision_cache_hit)
+
+
+@router.post("/understand/raw", response_model=VisionLanguageResponse)
+async def understand_image_raw(
+    request: Request,
+    question: str = Query(...),
+    min_pixels: int | None = Query(default=None, ge=1),
+    max_pixels: int | None = Query(default=None, ge=1),
+    options: RequestOptions = Depends(request_options),
+) -> VisionLanguageResponse:
+    """
+    理解图像并回答问题（HTTP 端点，请求体为原始图像字节）。
 
-    # 读取图像字节
-    image_bytes = await image.read()
+    不需要 Base64（体积增加 33%）或 multipart 编码，例如::
 
-    # 独占执行推理
-    answer = await run_exclusive(lambda: model.understand_image(image_bytes, question))
+        curl --data-binary @cat.jpg -H "Content-Type: image/jpeg" \\
+             "http://localhost:8000/vl/understand/raw?question=What+is+this"
 
-    return VisionLanguageResponse(answer=answer)
+    Args:
+        request: 请求体为图像字节，Content-Type 为 image/* 或 application/octet-stream
+        question: 关于图像的问题（查询参数）
+        min_pixels: 像素预算下限（可选）
+        max_pixels: 像素预算上限（可选）
+        options: 由请求头解析的调度参数
+
+    Returns:
+        文本答案
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(("image/", "application/octet-stream")):
+        raise HTTPException(
+            status_code=415, detail="Content-Type must be image/* or application/octet-stream"
+        )
+
+    # 声明的长度已经超限时不必读取请求体
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.vl_max_image_bytes:
+        raise HTTPException(
+            status_code=413, detail=f"Image exceeds {settings.vl_max_image_bytes} bytes"
+        )
+
+    image_bytes = await read_limited(request.stream(), settings.vl_max_image_bytes)
+    check_image(image_bytes)
+
+    # 与其他并发请求合并成一批推理
+    job = VLJob(image_bytes, question, min_pixels, max_pixels)
+    result = await _submit(job, options)
+
+    return VisionLanguageResponse(answer=result.text, vision_cache_hit=result.vision_cache_hit)
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_understanding_job(
+    request: VisionLanguageRequest,
+    options: RequestOptions = Depends(request_options),
+) -> JobResponse:
+    """
+    提交异步视觉语言任务，立即返回任务 ID。
+
+    用 ``GET /vl/jobs/{job_id}`` 查询状态，成功后 ``result`` 中包含答案。
+
+    Args:
+        request: Base64 编码的图像和问题
+        options: 由请求头解析的调度参数
+
+    Returns:
+        排队中的任务
+    """
+    # 图像无效或过载时直接返回错误，不创建注定失败的任务
+    image_bytes = _decode_image_base64(request.image_base64)
+    get_batcher().admit(options)
+
+    store = get_job_store()
+    job = store.create("vl")
+
+    async def run(started: Callable[[], None]) -> dict[str, Any]:
+        dispatch = dataclasses.replace(options, on_dispatch=started)
+        result = await _submit(request.job(image_bytes), dispatch)
+        return {"answer": result.text, "vision_cache_hit": result.vision_cache_hit}
+
+    store.submit(job, run)
+    return JobResponse.from_job(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_understanding_job(job_id: str) -> JobResponse:
+    """查询异步视觉语言任务的状态和结果。"""
+    job = get_job_store().get(job_id, kind="vl")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse.from_job(job)
+
+
+@router.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session(request: SessionCreateRequest) -> SessionResponse:
+    """
+    创建多轮会话。
+
+    之后用 ``POST /vl/sessions/{session_id}/ask`` 针对这张图像连续提问：
+    每一轮都带上此前的对话，追问复用会话的 KV cache，只需 prefill 新问题。
+    """
+    image_bytes = _decode_image_base64(request.image_base64)
+    session = get_session_store().create(image_bytes, request.min_pixels, request.max_pixels)
+    return SessionResponse(session_id=session.id, idle_timeout_s=settings.vl_session_idle_s)
+
+
+@router.post("/sessions/{session_id}/ask", response_model=SessionAnswer)
+async def ask_session(
+    session_id: str,
+    request: SessionQuestion,
+    options: RequestOptions = Depends(request_options),
+) -> SessionAnswer:
+    """在会话中提问；会话不存在或已空闲超时返回 404。"""
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+
+    answer: dict[str, Any] = {}
+    async for answer in session_turn(session, request.question, options):
+        pass
+    return SessionAnswer(**answer)
+
+
+@router.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str) -> Response:
+    """关闭会话并释放其 KV cache。"""
+    if get_session_store().get(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    _close_session(session_id)
+    return Response(status_code=204)
+
+
+def _decode_image_base64(image_base64: str) -> bytes:
+    """
+    解码 Base64 图像并按文件头检查格式和尺寸。
+
+    Raises:
+        HTTPException: Base64 无效（400）、图像无效（400）或超过大小上限（413）
+    """
+    # Base64 每 4 个字符对应 3 个字节，解码前先按长度估算
+    if len(image_base64) // 4 * 3 > settings.vl_max_image_bytes + 3:
+        raise HTTPException(
+            status_code=413, detail=f"Image exceeds {settings.vl_max_image_bytes} bytes"
+        )
+    with metrics.stage("vl", "base64"):
+        try:
+            image_bytes = base64.b64decode(image_base64, validate=True)
+        except binascii.Error as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid base64: {exc}") from exc
+    check_image(image_bytes)
+    return image_bytes
+
+
+def _collect_metrics() -> Iterator[metrics.Sample]:
+    """抓取 /metrics 时读取队列的当前状态。"""
+    if _batcher is not None:
+        yield from _batcher.metric_samples()
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+
+@router.get("/queue")
+async def queue_stats() -> dict[str, float | int | None]:
+    """推理队列深度、拒绝/过期计数和每批服务时间。"""
+    return get_batcher().stats()
 
 
 @router.websocket("/ws")
 async def understand_image_websocket(websocket: WebSocket) -> None:
     """
-    视觉语言理解 WebSocket 端点。
+    视觉语言理解 WebSocket 端点，支持多轮会话。
 
     协议：
-        客户端发送: {"image_base64": "base64...", "question": "What is this?"}
-        服务器响应: {"answer": "This is a cat"}
+        客户端发送: {"image_base64": "base64...", "question": "What is this?", "stream": true,
+                    "min_pixels": 3136, "max_pixels": 401408}
+                   （stream、min_pixels、max_pixels 可选）
+        服务器响应: {"answer": "This is a cat", "vision_cache_hit": false,
+                    "session_cache_hit": false, "session_id": "..."}
+
+    带图像的消息开始一个新会话（本连接之前的会话随之关闭）；之后只发送
+    {"question": "..."} 即在该会话中追问，复用会话的 KV cache，只需 prefill 新问题。
+    也可以用 {"session_id": "...", "question": "..."} 在 ``POST /vl/sessions`` 创建的会话中提问。
+    连接断开时关闭本连接创建的会话。
+
+    设置 "stream": true 时，先逐段发送 {"delta": "..."}，最后仍然发送完整答案。
+
+    连接握手时的 X-Priority / X-Client-Id / X-Deadline-Ms 请求头作用于该连接上的所有请求；
+    被准入控制拒绝时发送 {"error": "...", "status_code": 429, "retry_after": 3}，连接保持打开。
     """
     await websocket.accept()
-    model = get_model()
+    options = request_options(websocket)
+    store = get_session_store()
+    # 本连接创建的会话（断开时关闭）和当前追问的会话
+    owned: str | None = None
+    current: str | None = None
 
     try:
         while True:
             # 接收请求
             data: dict[str, Any] = await websocket.receive_json()
-            image_base64 = data.get("image_base64", "")
-            question = data.get("question", "")
-
-            if not image_base64 or not question:
-                await websocket.send_json({"error": "Missing image_base64 or question"})
+            try:
+                if data.get("image_base64"):
+                    request = VisionLanguageRequest.model_validate(data)
+                    question = request.question
+                else:
+                    question = SessionQuestion.model_validate(data).question
+            except ValidationError as exc:
+                await websocket.send_json({"error": str(exc)})
                 continue
 
-            # 解码图像
-            image_bytes = base64.b64decode(image_base64)
-
-            # 生成答案
-            answer = await run_exclusive(lambda: model.understand_image(image_bytes, question))
+            if not question:
+                await websocket.send_json({"error": "Missing question"})
+                continue
 
-            # 发送响应
-            await websocket.send_json({"answer": answer})
+            try:
+                if data.get("image_base64"):
+                    # 解码并检查图像，开始新会话
+                    image_bytes = _decode_image_base64(request.image_base64)
+                    if owned is not None:
+                        _close_session(owned)
+                    session = store.create(image_bytes, request.min_pixels, request.max_pixels)
+                    owned = current = session.id
+                else:
+                    # 追问：指定的会话或本连接的当前会话
+                    session_id = data.get("session_id") or current
+                    found = store.get(session_id) if session_id else None
+                    if found is None:
+                        await websocket.send_json(
+                            {"error": "No active session, send image_base64 first"}
+                        )
+                        continue
+                    session = found
+                    current = session.id
+
+                # 生成答案；流式生成时边解码边发送
+                async for event in session_turn(
+                    session, question, options, stream=bool(data.get("stream"))
+                ):
+                    await websocket.send_json(event)
+            except HTTPException as exc:
+                await websocket.send_json(error_message(exc))
+                continue
 
     except WebSocketDisconnect:
         print("[VL WebSocket] Client disconnected")
+    finally:
+        if owned is not None:
+            _close_session(owned)
@@ -0,0 +1,68 @@
+"""Vision-Language API routes - Simple Demo (no real model)."""
+
+from typing import Any
+
+from fastapi import APIRouter, File, Form, UploadFile, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/vl", tags=["vision-language"])
+
+DEMO_ANSWER = "This is a demo answer (no real model)."
+
+
+class VisionLanguageRequest(BaseModel):
+    """Request schema for vision-language understanding."""
+
+    image_base64: str
+    question: str
+
+
+class VisionLanguageResponse(BaseModel):
+    """Response schema for vision-language understanding."""
+
+    answer: str
+
+
+@router.post("/understand", response_model=VisionLanguageResponse)
+async def understand_image_demo(request: VisionLanguageRequest) -> VisionLanguageResponse:
+    """
+    DEMO: Return a fixed answer (no real model).
+
+    Args:
+        request: Base64 encoded image and question
+
+    Returns:
+        Fixed demo answer
+    """
+    return VisionLanguageResponse(answer=DEMO_ANSWER)
+
+
+@router.post("/understand/upload", response_model=VisionLanguageResponse)
+async def understand_image_upload_demo(
+    image: UploadFile = File(...),
+    question: str = Form(...),
+) -> VisionLanguageResponse:
+    """DEMO: Accept an uploaded image and return a fixed answer."""
+    await image.read()
+    return VisionLanguageResponse(answer=DEMO_ANSWER)
+
+
+@router.websocket("/ws")
+async def understand_image_websocket_demo(websocket: WebSocket) -> None:
+    """DEMO: Answer every {"question": ...} message with a fixed answer."""
+    await websocket.accept()
+    try:
+        while True:
+            data: dict[str, Any] = await websocket.receive_json()
+            if not data.get("question"):
+                await websocket.send_json({"error": "Missing question"})
+                continue
+            await websocket.send_json({"answer": DEMO_ANSWER})
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/status")
+async def status():
+    """Demo status endpoint."""
+    return {"status": "demo", "message": "Running in demo mode"}
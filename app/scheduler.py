@@ -0,0 +1,425 @@
+"""
+推理调度：准入控制、优先级与公平排队、截止时间，以及动态微批。
+
+请求先经过准入检查（队列已满直接 429，预计等待超过截止时间直接 503），
+然后按优先级进入有界队列；同一优先级内按客户端轮转，避免单个客户端刷屏占满队列。
+后台任务按顺序取出请求，在时间窗口内凑批后一次性送入模型，
+开始执行前已经超过截止时间的请求直接丢弃，不再浪费算力。
+"""
+
+import asyncio
+import math
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Hashable, Iterator
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Generic, TypeVar
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from app import metrics, profiling
+from app.config import settings
+
+# 请求载荷与单条结果的泛型类型变量
+P = TypeVar("P")
+R = TypeVar("R")
+
+# 每批服务时间的指数移动平均系数
+_EWMA_ALPHA = 0.2
+
+
+class Priority(IntEnum):
+    """优先级，数值越小越先执行。"""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class AdmissionError(HTTPException):
+    """请求被准入控制拒绝（429 队列已满 / 503 无法在截止时间内完成）。"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float | None = None) -> None:
+        headers = None
+        if retry_after is not None:
+            headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+
+
+def error_message(exc: HTTPException) -> dict[str, Any]:
+    """把 HTTP 错误（包括准入拒绝）转换成 WebSocket / SSE 错误消息。"""
+    message: dict[str, Any] = {"error": exc.detail, "status_code": exc.status_code}
+    if exc.headers and "Retry-After" in exc.headers:
+        message["retry_after"] = int(exc.headers["Retry-After"])
+    return message
+
+
+@dataclass
+class RequestOptions:
+    """单个请求的调度参数。"""
+
+    priority: Priority = Priority.NORMAL
+    client_id: str = "anonymous"
+    # 相对截止时间（秒），None 表示不限
+    timeout: float | None = None
+    # 需要剖析时的 trace ID（见 app.profiling），由路由在提交前写入请求
+    trace_id: str | None = None
+    # 请求所在的批次开始执行时在事件循环中调用（例如把异步任务标记为执行中）
+    on_dispatch: Callable[[], None] | None = None
+
+
+def request_options(connection: HTTPConnection) -> RequestOptions:
+    """
+    从请求头解析调度参数（可用作 FastAPI 依赖，HTTP 和 WebSocket 通用）。
+
+    请求头：
+        X-Priority: high / normal / low
+        X-Client-Id: 公平排队使用的客户端标识，缺省为客户端地址
+        X-Deadline-Ms: 截止时间（毫秒），缺省使用 REQUEST_DEADLINE_S
+        X-Profile: 剖析令牌（仅 HTTP 请求，见 app.profiling）
+    """
+    headers = connection.headers
+
+    priority = Priority.__members__.get(headers.get("x-priority", "").upper(), Priority.NORMAL)
+
+    client_id = headers.get("x-client-id")
+    if not client_id:
+        client_id = connection.client.host if connection.client else "anonymous"
+
+    timeout = settings.request_deadline_s or None
+    deadline_ms = headers.get("x-deadline-ms")
+    if deadline_ms:
+        try:
+            timeout = float(deadline_ms) / 1000
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid X-Deadline-Ms header")
+
+    trace_id = None
+    if profiling.enabled() and connection.scope["type"] == "http":
+        trace_id = profiling.trace_id_for(connection)
+
+    return RequestOptions(
+        priority=priority, client_id=client_id, timeout=timeout, trace_id=trace_id
+    )
+
+
+@dataclass
+class _Pending(Generic[P, R]):
+    """排队中的单个请求。"""
+
+    payload: P
+    future: "asyncio.Future[R]"
+    client_id: str
+    # 事件循环时间下的绝对截止时间
+    deadline: float | None
+    # 入队时的事件循环时间，用于统计排队等待
+    enqueued: float
+    on_dispatch: Callable[[], None] | None = None
+
+
+class _FairQueue(Generic[P, R]):
+    """按优先级分层、同层内按客户端轮转的队列。"""
+
+    def __init__(self) -> None:
+        self._levels: dict[Priority, OrderedDict[str, deque[_Pending[P, R]]]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._size = 0
+
+    def push(self, priority: Priority, item: _Pending[P, R]) -> None:
+        clients = self._levels[priority]
+        clients.setdefault(item.client_id, deque()).append(item)
+        self._size += 1
+
+    def pop(self) -> _Pending[P, R] | None:
+        """取出最高优先级中、轮到的客户端的最早请求。"""
+        for priority in Priority:
+            clients = self._levels[priority]
+            if not clients:
+                continue
+            client_id, items = next(iter(clients.items()))
+            item = items.popleft()
+            # 该客户端排到本层队尾，下次轮到其他客户端
+            del clients[client_id]
+            if items:
+                clients[client_id] = items
+            self._size -= 1
+            return item
+        return None
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class BatchScheduler(Generic[P, R]):
+    """
+    带准入控制的动态微批调度器。
+
+    后台任务取出第一个请求后，在 ``max_wait_ms`` 时间窗口内继续收集，
+    直到凑满 ``max_batch_size``，然后调用一次 ``runner`` 批量执行，
+    并把结果按顺序分发回各个调用方。
+    上一批推理进行期间到达的请求会自然地堆积成下一批。
+    默认同一时刻只执行一批，因此 ``runner`` 内部不需要再加锁来防止并发推理；
+    有多个模型副本时，``concurrency`` 设为副本数，让各副本同时执行不同的批次。
+
+    指定 ``batch_key`` 时只有键相同的请求才会合并成一批（例如生成参数不同的文生图请求），
+    凑批时取出的其他请求暂存起来，优先进入后续批次，不会失去排队位置。
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[list[P]], Awaitable[list[R]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue_depth: int = 0,
+        concurrency: int = 1,
+        name: str = "default",
+        batch_key: Callable[[P], Hashable] | None = None,
+    ) -> None:
+        """
+        Args:
+            runner: 批量执行函数，输入载荷列表，按相同顺序返回结果列表
+            max_batch_size: 单批最多包含的请求数
+            max_wait_ms: 收到第一个请求后最多等待多久来凑批（毫秒）
+            max_queue_depth: 排队请求数上限，0 表示不限
+            concurrency: 同时执行的批次数（模型副本数）
+            name: 指标中使用的服务名
+            batch_key: 批次键，键相同的请求才能合并成一批；None 表示任意请求都可以合并
+        """
+        self._runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue_depth = max_queue_depth
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self._batch_key = batch_key
+
+        self._queue: _FairQueue[P, R] = _FairQueue()
+        # 凑批时因批次键不同而暂存的请求，按出队顺序排列
+        self._deferred: deque[_Pending[P, R]] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: list[asyncio.Task[None]] = []
+
+        # 正在执行的请求数，以及每批服务时间的移动平均（用于估算等待时间）
+        self.in_flight = 0
+        self.batch_seconds: float | None = None
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def depth(self) -> int:
+        """当前排队的请求数。"""
+        return len(self._queue) + len(self._deferred)
+
+    def estimate_wait(self, position: int | None = None) -> float:
+        """
+        估算排在 ``position`` 位置（默认队尾）的请求需要等待多久才能执行完。
+
+        按观测到的每批服务时间计算：前面还有多少轮批次（每轮并发执行 ``concurrency`` 批），
+        再加上正在执行的一轮。
+        """
+        if position is None:
+            position = self.depth
+        batches = math.ceil((position + 1) / (self.max_batch_size * self.concurrency))
+        if self.in_flight:
+            batches += 1
+        return batches * (self.batch_seconds or 1.0)
+
+    def admit(self, options: RequestOptions) -> None:
+        """
+        准入检查：队列已满，或按当前负载估算无法在截止时间内完成时立即拒绝。
+
+        流式端点可以在开始响应之前单独调用，以便返回真正的 429/503 状态码。
+
+        Raises:
+            AdmissionError: 队列已满（429），或无法在截止时间内完成（503）
+        """
+        if self.max_queue_depth and self.depth >= self.max_queue_depth:
+            self.rejected += 1
+            raise AdmissionError(429, "Inference queue is full", self.estimate_wait())
+
+        # 排在前面的请求不一定都在同一优先级，这里按整条队列保守估算；
+        # 还没有观测到服务时间时不做估算，避免冷启动误拒
+        if options.timeout is not None and self.batch_seconds is not None:
+            estimate = self.estimate_wait()
+            if estimate > options.timeout:
+                self.rejected += 1
+                raise AdmissionError(503, "Deadline cannot be met at current load", estimate)
+
+    async def submit(self, payload: P, options: RequestOptions | None = None) -> R:
+        """
+        提交一个请求并等待它所在批次执行完毕。
+
+        Args:
+            payload: 单个请求的载荷
+            options: 优先级、客户端标识和截止时间
+
+        Returns:
+            该请求对应的结果
+
+        Raises:
+            AdmissionError: 队列已满（429），或无法在截止时间内完成（503）
+        """
+        options = options or RequestOptions()
+        loop = self._ensure_worker()
+        self.admit(options)
+
+        deadline = None
+        if options.timeout is not None:
+            deadline = loop.time() + options.timeout
+
+        future: asyncio.Future[R] = loop.create_future()
+        pending = _Pending(
+            payload, future, options.client_id, deadline, loop.time(), options.on_dispatch
+        )
+        self._queue.push(options.priority, pending)
+        self._wakeup.set()
+        return await future
+
+    def _ensure_worker(self) -> asyncio.AbstractEventLoop:
+        """按需在当前事件循环上创建后台任务。"""
+        # Event 和 Task 都绑定事件循环，所以延迟到第一次提交时再创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._workers = []
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(loop.create_task(self._run()))
+        return loop
+
+    def _is_live(self, item: _Pending[P, R]) -> bool:
+        """请求是否仍需执行；已过期的请求在这里以 503 结束。"""
+        if item.future.done():
+            return False
+        if item.deadline is not None and self._loop.time() > item.deadline:
+            self.expired += 1
+            item.future.set_exception(AdmissionError(503, "Deadline exceeded while queued"))
+            return False
+        return True
+
+    def _pop_live(self, key: Hashable = None) -> _Pending[P, R] | None:
+        """
+        取出下一个仍然有效的请求，顺带丢弃已取消或已过期的请求。
+
+        Args:
+            key: 只取批次键相同的请求，None 表示不限；
+                 从队列中取出的其他请求暂存起来，先于队列参与后续凑批
+        """
+        for item in list(self._deferred):
+            if not self._is_live(item):
+                self._deferred.remove(item)
+            elif key is None or self._batch_key(item.payload) == key:
+                self._deferred.remove(item)
+                return item
+
+        while (item := self._queue.pop()) is not None:
+            if not self._is_live(item):
+                continue
+            if key is None or self._batch_key(item.payload) == key:
+                return item
+            self._deferred.append(item)
+        return None
+
+    async def _collect(self) -> list[_Pending[P, R]]:
+        """阻塞等待第一个请求，然后在时间窗口内尽量凑满一批。"""
+        while (first := self._pop_live()) is None:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        batch = [first]
+        deadline = self._loop.time() + self.max_wait
+        key = self._batch_key(first.payload) if self._batch_key else None
+
+        while len(batch) < self.max_batch_size:
+            # 已经在排队的请求直接取走，不必等待
+            item = self._pop_live(key)
+            if item is not None:
+                batch.append(item)
+                continue
+
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        """后台任务：循环收集批次并执行。"""
+        while True:
+            batch = await self._collect()
+
+            # 凑批期间取消或过期的请求不再占用推理资源
+            live = [item for item in batch if self._is_live(item)]
+            if not live:
+                continue
+
+            start = self._loop.time()
+            for item in live:
+                metrics.STAGE_SECONDS.observe(start - item.enqueued, self.name, "queue_wait")
+                if item.on_dispatch is not None:
+                    item.on_dispatch()
+
+            self.in_flight += len(live)
+            try:
+                results = await self._runner([item.payload for item in live])
+                if len(results) != len(live):
+                    # 无法判断结果与请求的对应关系，整批按失败处理，不能把结果错发给别的请求
+                    raise RuntimeError(
+                        f"Batch runner returned {len(results)} result(s) for {len(live)} request(s)"
+                    )
+            except Exception as exc:
+                for item in live:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+                continue
+            else:
+                for item, result in zip(live, results):
+                    if not item.future.done():
+                        item.future.set_result(result)
+            finally:
+                self.in_flight -= len(live)
+                elapsed = self._loop.time() - start
+                metrics.STAGE_SECONDS.observe(elapsed, self.name, "batch")
+                if self.batch_seconds is None:
+                    self.batch_seconds = elapsed
+                else:
+                    self.batch_seconds += _EWMA_ALPHA * (elapsed - self.batch_seconds)
+
+    def metric_samples(self) -> Iterator[metrics.Sample]:
+        """供 ``/metrics`` 抓取时读取的队列状态。"""
+        labels = {"service": self.name}
+        yield ("queue_depth", "gauge", "Requests waiting in the queue", labels, self.depth)
+        yield ("in_flight", "gauge", "Requests currently being executed", labels, self.in_flight)
+        yield (
+            "admission_rejected_total",
+            "counter",
+            "Requests rejected on admission",
+            labels,
+            self.rejected,
+        )
+        yield (
+            "deadline_expired_total",
+            "counter",
+            "Requests expired while queued",
+            labels,
+            self.expired,
+        )
+
+    def stats(self) -> dict[str, float | int | None]:
+        """队列深度、执行中请求数、拒绝/过期计数和每批服务时间。"""
+        return {
+            "queue_depth": self.depth,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "batch_seconds": self.batch_seconds,
+        }
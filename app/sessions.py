@@ -0,0 +1,85 @@
+"""
+视觉语言多轮会话：一张图像上的连续问答。
+
+API 进程保存每个会话的图像和对话历史，每一轮把历史随请求一起提交；模型进程按会话 ID
+缓存图像和此前各轮对话的 KV cache，追问只需 prefill 新问题的 tokens。
+KV cache 被淘汰、或请求被派发到另一个模型副本时，模型按对话历史重新 prefill，
+因此会话本身不会因缓存丢失而中断。
+
+会话空闲超过 VL_SESSION_IDLE_S 秒后关闭；会话数超过 VL_MAX_SESSIONS 时关闭最久未用的会话。
+显式关闭会话时通知模型（多副本时通知每个副本）释放其 KV cache，
+模型留下墓碑，正在执行的一轮结束时不会再把该会话的 KV cache 存回去。
+"""
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from app.cache import LRUCache
+from app.config import settings
+
+
+@dataclass
+class Session:
+    """一个多轮会话。"""
+
+    id: str
+    image_bytes: bytes
+    # 像素预算，会话内各轮相同（视觉 token 数决定了 KV cache 的前缀）
+    min_pixels: int | None = None
+    max_pixels: int | None = None
+    # 已完成的 (问题, 回答)
+    history: list[tuple[str, str]] = field(default_factory=list)
+    last_used: float = 0.0
+    # 同一会话的各轮依次执行，后一轮的提示词依赖前一轮的回答
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+
+class SessionStore:
+    """会话表：按最近使用淘汰，并关闭空闲超时的会话。"""
+
+    def __init__(self, max_sessions: int, idle_timeout_s: float) -> None:
+        self.idle_timeout_s = idle_timeout_s
+        self._sessions: LRUCache[str, Session] = LRUCache(max_sessions)
+
+    def create(
+        self, image_bytes: bytes, min_pixels: int | None = None, max_pixels: int | None = None
+    ) -> Session:
+        """创建会话。"""
+        self._expire()
+        session = Session(
+            uuid.uuid4().hex, image_bytes, min_pixels, max_pixels, last_used=time.monotonic()
+        )
+        self._sessions.put(session.id, session)
+        return session
+
+    def get(self, session_id: str) -> Session | None:
+        """获取会话并刷新其空闲计时；不存在或已过期时返回 None。"""
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+        return session
+
+    def close(self, session_id: str) -> bool:
+        """关闭会话，返回会话是否存在。"""
+        return self._sessions.pop(session_id) is not None
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.idle_timeout_s
+        self._sessions.evict_while(lambda session: session.last_used < deadline)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_store: SessionStore | None = None
+
+
+def get_session_store() -> SessionStore:
+    """获取会话表（单例模式）。"""
+    global _store
+    if _store is None:
+        _store = SessionStore(settings.vl_max_sessions, settings.vl_session_idle_s)
+    return _store
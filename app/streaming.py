@@ -0,0 +1,48 @@
+"""把推理线程中产生的增量事件转交给事件循环上的消费者。"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+# 结束标记
+_CLOSED = object()
+
+
+class StreamChannel(Generic[T]):
+    """
+    线程安全的单向事件通道。
+
+    推理在线程池中运行，``put`` 可以在任意线程调用；
+    事件循环上的消费者用 ``async for`` 逐个读取，直到 ``close``。
+
+    用法::
+
+        channel = StreamChannel()
+        task = asyncio.create_task(run_inference(on_event=channel.put))
+        task.add_done_callback(lambda _: channel.close())
+        async for event in channel:
+            ...
+        result = await task
+    """
+
+    def __init__(self) -> None:
+        # 必须在事件循环中创建，以便从其他线程回投事件
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[object] = asyncio.Queue()
+
+    def put(self, item: T) -> None:
+        """投递一个事件（可在任意线程调用）。"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def close(self) -> None:
+        """结束通道，消费者读完已投递的事件后退出迭代。"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _CLOSED)
+
+    async def __aiter__(self) -> AsyncIterator[T]:
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSED:
+                return
+            yield item  # type: ignore[misc]
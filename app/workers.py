@@ -0,0 +1,449 @@
+"""
+多进程模型副本池。
+
+每个副本在独立进程中加载一份模型，并限制 torch 线程数，
+在多核 CPU 上用多个副本并行推理，而不是让一个副本的线程互相争抢。
+API 进程把每一批请求派发给当前负载最低的副本；
+请求和结果中的字节数据和 PIL 图像通过共享内存传递，不经过管道序列化，
+推理过程中的流式事件（预览帧、增量文本）和指标增量通过结果队列转发回 API 进程。
+不属于某一批的通知（如关闭会话）用 ``WorkerPool.broadcast`` 发给所有副本中的模型。
+"""
+
+import asyncio
+import atexit
+import dataclasses
+import inspect
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+from PIL import Image
+
+from app import metrics, profiling
+from app.acceleration import configure_threads
+from app.config import settings
+
+# 副本进程加载模型后返回的批量推理函数
+BatchFn = Callable[[list[Any]], list[Any]]
+
+# 检查副本进程是否存活的间隔（秒）
+_POLL_INTERVAL = 1.0
+
+
+@dataclass
+class SharedBytes:
+    """放在共享内存中的一段字节数据，跨进程只传递名字和长度。"""
+
+    name: str
+    size: int
+
+    @classmethod
+    def share(cls, data: bytes) -> "SharedBytes":
+        """把字节数据写入一块新的共享内存。"""
+        shm = SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[: len(data)] = data
+        shm.close()
+        return cls(shm.name, len(data))
+
+    def take(self) -> bytes:
+        """读出数据并释放共享内存（每块共享内存只能被接收方读取一次）。"""
+        shm = SharedMemory(name=self.name)
+        try:
+            return bytes(shm.buf[: self.size])
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def discard(self) -> None:
+        """接收方没有读取时（例如副本崩溃）由发送方回收。"""
+        try:
+            SharedMemory(name=self.name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class SharedImage:
+    """放在共享内存中的 PIL 图像（原始像素），接收方零解码重建。"""
+
+    pixels: SharedBytes
+    mode: str
+    size: tuple[int, int]
+
+    def take(self) -> Image.Image:
+        return Image.frombytes(self.mode, self.size, self.pixels.take())
+
+    def discard(self) -> None:
+        self.pixels.discard()
+
+
+def _pack(value: Any) -> Any:
+    """把要跨进程发送的对象中的字节字段和图像换成共享内存引用。"""
+    if isinstance(value, bytes):
+        return SharedBytes.share(value)
+    if isinstance(value, Image.Image):
+        return SharedImage(SharedBytes.share(value.tobytes()), value.mode, value.size)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        changes = {
+            f.name: _pack(getattr(value, f.name))
+            for f in dataclasses.fields(value)
+            if isinstance(getattr(value, f.name), bytes)
+        }
+        return dataclasses.replace(value, **changes) if changes else value
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    """``_pack`` 的逆操作：从共享内存读回字节字段。"""
+    if isinstance(value, (SharedBytes, SharedImage)):
+        return value.take()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        changes = {
+            f.name: getattr(value, f.name).take()
+            for f in dataclasses.fields(value)
+            if isinstance(getattr(value, f.name), SharedBytes)
+        }
+        return dataclasses.replace(value, **changes) if changes else value
+    return value
+
+
+def _discard(value: Any) -> None:
+    """回收 ``_pack`` 产生但没有被读取的共享内存。"""
+    if isinstance(value, (SharedBytes, SharedImage)):
+        value.discard()
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        for f in dataclasses.fields(value):
+            _discard(getattr(value, f.name))
+
+
+@dataclass
+class _Call:
+    """发给副本中模型对象的方法调用（不返回结果）。"""
+
+    method: str
+    args: tuple[Any, ...]
+
+
+def _callback_fields(job: Any) -> list[str]:
+    """请求中设置了回调（on_preview / on_text 等）的字段名。"""
+    return [f.name for f in dataclasses.fields(job) if callable(getattr(job, f.name))]
+
+
+def load_t2i() -> BatchFn:
+    """在副本进程中加载（并预热）文生图模型。"""
+    from app.models.simulated import SimulatedT2IModel
+    from app.models.t2i_hunyuan import HunyuanDiTModel
+
+    model = SimulatedT2IModel() if settings.model_backend == "simulated" else HunyuanDiTModel()
+    if settings.startup_warmup:
+        model.warmup()
+    return profiling.profiled(model.generate_images)
+
+
+def load_vl() -> BatchFn:
+    """在副本进程中加载（并预热）视觉语言模型。"""
+    from app.models.simulated import SimulatedVLModel
+    from app.models.vl_qwen import QwenVLModel
+
+    model = SimulatedVLModel() if settings.model_backend == "simulated" else QwenVLModel()
+    if settings.startup_warmup:
+        model.warmup()
+    return profiling.profiled(model.understand_images)
+
+
+def _replica_main(
+    loader: Callable[[], BatchFn],
+    num_threads: int,
+    inbox: "mp.Queue[Any]",
+    outbox: "mp.Queue[Any]",
+) -> None:
+    """副本进程入口：加载模型，然后循环处理 API 进程派发的批次。"""
+    configure_threads(num_threads)
+
+    try:
+        run = loader()
+    except Exception as exc:
+        outbox.put(("failed", None, f"{type(exc).__name__}: {exc}"))
+        return
+    outbox.put(("ready", None, None))
+    outbox.put(("metrics", None, metrics.REGISTRY.export_delta()))
+    # 批量推理函数所属的模型对象，接收 broadcast 的方法调用
+    owner = getattr(inspect.unwrap(run), "__self__", None)
+
+    while (message := inbox.get()) is not None:
+        if isinstance(message, _Call):
+            # 与各批按到达顺序执行：广播前派发的批次结束后才调用
+            try:
+                getattr(owner, message.method)(*message.args)
+            except Exception as exc:
+                print(f"[Workers] {message.method} failed: {type(exc).__name__}: {exc}")
+            continue
+
+        request_id, packed_jobs, callbacks = message
+        jobs = []
+        for index, (job, fields) in enumerate(zip(packed_jobs, callbacks)):
+            job = _unpack(job)
+            # 回调不能跨进程传递，在副本中换成把事件发回 API 进程的函数
+            forwarders = {
+                name: _event_forwarder(outbox, request_id, index, name) for name in fields
+            }
+            jobs.append(dataclasses.replace(job, **forwarders) if forwarders else job)
+
+        try:
+            results = run(jobs)
+        except Exception as exc:
+            outbox.put(("error", request_id, f"{type(exc).__name__}: {exc}"))
+        else:
+            outbox.put(("result", request_id, [_pack(result) for result in results]))
+        # 本批在副本中记录的阶段耗时等指标发回 API 进程汇总
+        outbox.put(("metrics", None, metrics.REGISTRY.export_delta()))
+
+
+def _event_forwarder(
+    outbox: "mp.Queue[Any]", request_id: int, index: int, name: str
+) -> Callable[[Any], None]:
+    """生成把流式事件发回 API 进程的回调。"""
+
+    def forward(event: Any) -> None:
+        outbox.put(("event", request_id, (index, name, event)))
+
+    return forward
+
+
+@dataclass
+class _Request:
+    """已派发、等待副本返回结果的一批请求。"""
+
+    jobs: list[Any]
+    packed: list[Any]
+    future: "asyncio.Future[list[Any]]"
+    loop: asyncio.AbstractEventLoop
+
+
+class _Replica:
+    """API 进程中对一个副本进程的引用。"""
+
+    def __init__(
+        self, ctx: Any, index: int, loader: Callable[[], BatchFn], num_threads: int
+    ) -> None:
+        self.index = index
+        self.inbox: mp.Queue[Any] = ctx.Queue()
+        self.outbox: mp.Queue[Any] = ctx.Queue()
+        self.process = ctx.Process(
+            target=_replica_main,
+            args=(loader, num_threads, self.inbox, self.outbox),
+            name=f"model-replica-{index}",
+            daemon=True,
+        )
+        # 已派发但尚未完成的请求数，用于选择负载最低的副本
+        self.load = 0
+        self.alive = False
+        self.pending: dict[int, _Request] = {}
+        self.reader: threading.Thread | None = None
+
+
+class WorkerPool:
+    """
+    N 个模型副本组成的进程池。
+
+    用法::
+
+        pool = WorkerPool(load_t2i, replicas=4, threads_per_replica=8)
+        pool.start()
+        images = await pool.run(jobs)
+    """
+
+    def __init__(
+        self, loader: Callable[[], BatchFn], replicas: int, threads_per_replica: int = 0
+    ) -> None:
+        """
+        Args:
+            loader: 在副本进程中加载模型并返回批量推理函数（必须是模块级函数）
+            replicas: 副本进程数
+            threads_per_replica: 每个副本的 torch 线程数，0 表示按 CPU 核数平均分配
+        """
+        self.replicas_count = max(1, replicas)
+        self.threads_per_replica = threads_per_replica or max(
+            1, (os.cpu_count() or 1) // self.replicas_count
+        )
+
+        # spawn 启动：子进程重新初始化 torch，不继承 API 进程的线程池状态
+        ctx = mp.get_context("spawn")
+        self._replicas = [
+            _Replica(ctx, index, loader, self.threads_per_replica)
+            for index in range(self.replicas_count)
+        ]
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        """启动所有副本并阻塞等待模型加载完成。"""
+        if self._started:
+            return
+        self._started = True
+        atexit.register(self.close)
+
+        print(
+            f"Starting {self.replicas_count} model replica(s) "
+            f"with {self.threads_per_replica} thread(s) each..."
+        )
+        for replica in self._replicas:
+            replica.process.start()
+
+        for replica in self._replicas:
+            kind, error = None, "process exited"
+            while replica.process.is_alive():
+                try:
+                    kind, _, error = replica.outbox.get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    continue
+            if kind != "ready":
+                self.close()
+                raise RuntimeError(f"Model replica {replica.index} failed to load: {error}")
+            replica.alive = True
+            replica.reader = threading.Thread(
+                target=self._read_results, args=(replica,), daemon=True
+            )
+            replica.reader.start()
+        print("All model replicas ready!")
+
+    async def run(self, jobs: list[Any]) -> list[Any]:
+        """
+        把一批请求派发给负载最低的副本，等待结果。
+
+        Args:
+            jobs: 请求列表（dataclass，字节字段经共享内存传递，回调字段的事件会被转发回来）
+
+        Returns:
+            与 jobs 顺序一致的结果列表
+        """
+        loop = asyncio.get_running_loop()
+        callbacks = [_callback_fields(job) for job in jobs]
+        packed = [
+            _pack(dataclasses.replace(job, **dict.fromkeys(fields)))
+            for job, fields in zip(jobs, callbacks)
+        ]
+        future: asyncio.Future[list[Any]] = loop.create_future()
+
+        with self._lock:
+            candidates = [replica for replica in self._replicas if replica.alive]
+            if not candidates:
+                for job in packed:
+                    _discard(job)
+                raise RuntimeError("No model replica is available")
+            replica = min(candidates, key=lambda r: r.load)
+            request_id = next(self._ids)
+            replica.load += len(jobs)
+            replica.pending[request_id] = _Request(jobs, packed, future, loop)
+
+        replica.inbox.put((request_id, packed, callbacks))
+        try:
+            return await future
+        finally:
+            with self._lock:
+                replica.load -= len(jobs)
+
+    def broadcast(self, method: str, *args: Any) -> None:
+        """
+        在每个存活副本的模型对象上调用一个方法（不等待执行，不返回结果）。
+
+        副本按收到的顺序处理批次和调用，因此调用在此前已派发给该副本的批次结束后才执行。
+
+        Args:
+            method: 模型对象的方法名（如 close_session）
+            args: 方法参数（需可跨进程序列化）
+        """
+        with self._lock:
+            replicas = [replica for replica in self._replicas if replica.alive]
+        for replica in replicas:
+            replica.inbox.put(_Call(method, args))
+
+    def _read_results(self, replica: _Replica) -> None:
+        """后台线程：读取一个副本发回的结果和流式事件。"""
+        while True:
+            try:
+                kind, request_id, payload = replica.outbox.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if replica.process.is_alive():
+                    continue
+                self._fail_replica(replica)
+                return
+            except (EOFError, OSError):
+                self._fail_replica(replica)
+                return
+
+            if kind == "metrics":
+                metrics.REGISTRY.merge_delta(payload)
+                continue
+
+            if kind == "event":
+                request = replica.pending.get(request_id)
+                if request is not None:
+                    index, name, event = payload
+                    # 回调本身是线程安全的（StreamChannel.put）
+                    getattr(request.jobs[index], name)(event)
+                continue
+
+            with self._lock:
+                request = replica.pending.pop(request_id, None)
+            if request is None:
+                continue
+
+            if kind == "result":
+                results = [_unpack(result) for result in payload]
+                request.loop.call_soon_threadsafe(_resolve, request.future, results, None)
+            else:
+                error = RuntimeError(f"Model replica {replica.index} failed: {payload}")
+                request.loop.call_soon_threadsafe(_resolve, request.future, None, error)
+
+    def _fail_replica(self, replica: _Replica) -> None:
+        """副本进程意外退出：不再向它派发，并让它手上的请求全部失败。"""
+        with self._lock:
+            replica.alive = False
+            pending, replica.pending = replica.pending, {}
+        if pending:
+            print(f"[Workers] Replica {replica.index} exited, failing {len(pending)} batch(es)")
+        for request in pending.values():
+            for job in request.packed:
+                _discard(job)
+            error = RuntimeError(f"Model replica {replica.index} exited unexpectedly")
+            request.loop.call_soon_threadsafe(_resolve, request.future, None, error)
+
+    def stats(self) -> list[dict[str, int | bool]]:
+        """每个副本的存活状态和当前负载。"""
+        return [
+            {"replica": replica.index, "alive": replica.alive, "load": replica.load}
+            for replica in self._replicas
+        ]
+
+    def close(self) -> None:
+        """通知所有副本退出并等待进程结束。"""
+        for replica in self._replicas:
+            replica.alive = False
+            if replica.process.is_alive():
+                replica.inbox.put(None)
+        for replica in self._replicas:
+            if replica.process.pid is not None:
+                replica.process.join(timeout=10)
+                if replica.process.is_alive():
+                    replica.process.terminate()
+
+
+def _resolve(
+    future: "asyncio.Future[list[Any]]", result: list[Any] | None, error: Exception | None
+) -> None:
+    """在事件循环线程中设置 future 的结果（调用方可能已经取消）。"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -0,0 +1,5 @@
+"""
+性能基准脚本（不在 pytest 中运行）。
+
+bench_suite 使用随机权重的迷你模型，其余脚本需要真实或本地模型权重。
+"""
@@ -0,0 +1,157 @@
+"""
+CPU 加速档位基准：各档位的耗时，以及输出与 baseline 的一致性。
+
+每个档位在独立的子进程中加载模型（编译状态、线程设置互不影响），用同样的输入预热一次后
+用固定的 seed / 图像重复推理并计时。输出与 baseline 档位比较：
+    - T2I: 逐像素平均绝对差（0-255），超过 --max-pixel-diff 判为不一致
+    - VL: 贪心解码答案完全相同的比例，低于 --min-text-match 判为不一致
+
+运行命令:
+    uv run python -m benchmarks.bench_cpu_profile --models t2i vl --profiles baseline fast max
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROMPTS = ["a red apple on a wooden table", "a lighthouse at sunset"]
+QUESTIONS = ["What is in the image?", "What color is the background?"]
+
+
+def _test_image() -> bytes:
+    """合成测试图像：渐变背景上的色块。"""
+    x = np.linspace(0, 255, 448, dtype=np.uint8)
+    pixels = np.stack(np.broadcast_arrays(x[None, :], x[:, None], 128), axis=-1)
+    pixels[150:300, 150:300] = (220, 40, 40)
+    buf = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def run_profile(model: str, output_dir: Path, repeats: int) -> dict[str, float]:
+    """在当前进程中按当前档位推理并保存输出（子进程入口）。"""
+    from app.acceleration import configure_threads
+
+    configure_threads()
+    if model == "t2i":
+        from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+
+        t2i = HunyuanDiTModel()
+        jobs = [T2IJob(prompt, seed=i) for i, prompt in enumerate(PROMPTS)]
+        run = lambda: t2i.generate_images(jobs)  # noqa: E731
+    else:
+        from app.models.vl_qwen import QwenVLModel, VLJob
+
+        vl = QwenVLModel()
+        image = _test_image()
+        run = lambda: vl.understand_images([VLJob(image, q) for q in QUESTIONS])  # noqa: E731
+
+    # 用同样的输入预热一次（torch.compile 按输入形状编译，编译耗时不计入）
+    run()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = run()
+        times.append(time.perf_counter() - start)
+
+    if model == "t2i":
+        for i, image in enumerate(outputs):
+            image.save(output_dir / f"{i}.png")
+    else:
+        (output_dir / "answers.json").write_text(json.dumps([a.text for a in outputs]))
+    return {"mean_s": sum(times) / len(times), "min_s": min(times)}
+
+
+def compare(model: str, baseline: Path, candidate: Path) -> float:
+    """比较两个档位的输出：T2I 返回平均像素差，VL 返回答案一致的比例。"""
+    if model == "t2i":
+        diffs = []
+        for path in sorted(baseline.glob("*.png")):
+            a = np.asarray(Image.open(path), dtype=np.float32)
+            b = np.asarray(Image.open(candidate / path.name), dtype=np.float32)
+            diffs.append(np.abs(a - b).mean())
+        return float(np.mean(diffs))
+
+    a = json.loads((baseline / "answers.json").read_text())
+    b = json.loads((candidate / "answers.json").read_text())
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU acceleration profile benchmark")
+    parser.add_argument("--models", nargs="+", choices=["t2i", "vl"], default=["t2i", "vl"])
+    parser.add_argument(
+        "--profiles", nargs="+", choices=["baseline", "fast", "max"], default=["fast", "max"]
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-pixel-diff", type=float, default=8.0, help="T2I 平均像素差上限")
+    parser.add_argument("--min-text-match", type=float, default=0.5, help="VL 答案一致比例下限")
+    parser.add_argument("--child", nargs=2, metavar=("MODEL", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        model, output_dir = args.child
+        print(json.dumps(run_profile(model, Path(output_dir), args.repeats)))
+        return
+
+    profiles = ["baseline", *(p for p in args.profiles if p != "baseline")]
+    print(f"{'model':<6} {'profile':<10} {'mean (s)':>10} {'min (s)':>10} {'speedup':>8}  parity")
+    failed = False
+    for model in args.models:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_time = None
+            for profile in profiles:
+                output_dir = Path(tmp) / profile
+                output_dir.mkdir()
+                result = subprocess.run(
+                    [
+                        sys.executable, "-m", "benchmarks.bench_cpu_profile",
+                        "--repeats", str(args.repeats), "--child", model, str(output_dir),
+                    ],
+                    # 关闭视觉特征缓存，每次重复都重新做视觉编码
+                    env={
+                        **os.environ,
+                        "CPU_PROFILE": profile,
+                        "DEVICE": "cpu",
+                        "VL_VISION_CACHE_BYTES": "0",
+                    },
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )  # fmt: skip
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+                baseline_time = baseline_time or stats["mean_s"]
+
+                if profile == "baseline":
+                    parity = "reference"
+                else:
+                    score = compare(model, Path(tmp) / "baseline", output_dir)
+                    if model == "t2i":
+                        ok = score <= args.max_pixel_diff
+                        parity = f"mean pixel diff {score:.2f}"
+                    else:
+                        ok = score >= args.min_text_match
+                        parity = f"answers match {score:.0%}"
+                    parity += " OK" if ok else " FAIL"
+                    failed |= not ok
+
+                print(
+                    f"{model:<6} {profile:<10} {stats['mean_s']:>10.3f} {stats['min_s']:>10.3f} "
+                    f"{baseline_time / stats['mean_s']:>7.2f}x  {parity}"
+                )
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+输出编码基准：各格式/参数下的编码耗时与传输字节数。
+
+默认用与配置分辨率相同的合成图像（平滑渐变 + 噪声，接近真实照片的可压缩性），
+也可以用 ``--image`` 指定一张生成结果。
+传输字节数同时给出原始字节（/generate/image）和 Base64（/generate、WebSocket）两种。
+
+运行命令:
+    uv run python -m benchmarks.bench_encoding --repeat 5
+    uv run python -m benchmarks.bench_encoding --image output.png
+"""
+
+import argparse
+import base64
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.encoding import EncodeOptions, OutputFormat, encode_image
+
+# 默认对比的编码配置
+CASES = [
+    EncodeOptions(OutputFormat.PNG, compress_level=1),
+    EncodeOptions(OutputFormat.PNG, compress_level=6),
+    EncodeOptions(OutputFormat.PNG, compress_level=9),
+    EncodeOptions(OutputFormat.WEBP, quality=75),
+    EncodeOptions(OutputFormat.WEBP, quality=90),
+    EncodeOptions(OutputFormat.JPEG, quality=75),
+    EncodeOptions(OutputFormat.JPEG, quality=90),
+]
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """生成平滑渐变叠加噪声的测试图像。"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack(
+        [
+            128 + 100 * np.sin(x / 97),
+            128 + 100 * np.cos(y / 71),
+            128 + 100 * np.sin((x + y) / 131),
+        ],
+        axis=-1,
+    )
+    noisy = base + rng.normal(0, 12, base.shape)
+    return Image.fromarray(noisy.clip(0, 255).astype(np.uint8))
+
+
+def run_case(image: Image.Image, options: EncodeOptions, repeat: int) -> dict[str, float]:
+    """重复编码若干次，返回编码耗时中位数和输出大小。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = encode_image(image, options)
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    encoded = base64.b64encode(data)
+    base64_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "encode_ms": statistics.median(timings) * 1000,
+        "base64_ms": base64_ms,
+        "bytes": len(data),
+        "base64_bytes": len(encoded),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="T2I output encoding benchmark")
+    parser.add_argument("--image", help="测试图像路径，默认使用合成图像")
+    parser.add_argument("--width", type=int, default=settings.t2i_width)
+    parser.add_argument("--height", type=int, default=settings.t2i_height)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Image.open(args.image).convert("RGB")
+    else:
+        image = synthetic_image(args.width, args.height)
+    raw_bytes = image.width * image.height * 3
+    print(f"Image: {image.width}x{image.height}, raw {raw_bytes / 1024:.0f} KiB")
+
+    print(
+        f"{'format':<16} {'encode(ms)':>10} {'b64(ms)':>8} {'KiB':>8} {'b64 KiB':>8} {'ratio':>6}"
+    )
+    for options in CASES:
+        stats = run_case(image, options, args.repeat)
+        param = (
+            f"level={options.compress_level}"
+            if options.format is OutputFormat.PNG
+            else f"q={options.quality}"
+        )
+        print(
+            f"{options.format.value + ' ' + param:<16} {stats['encode_ms']:>10.1f} "
+            f"{stats['base64_ms']:>8.1f} {stats['bytes'] / 1024:>8.0f} "
+            f"{stats['base64_bytes'] / 1024:>8.0f} {raw_bytes / stats['bytes']:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+模型启动基准：加载耗时和峰值内存。
+
+每个用例在独立的子进程中加载一次模型（保证冷启动且峰值内存互不影响），
+报告加载耗时、峰值 RSS，以及相对加载前的峰值增量。对每个模型依次测量：
+    1. low_cpu_mem_usage=False（先随机初始化再载入权重）
+    2. low_cpu_mem_usage=True
+    3. 首次启用快照（加载并写入本地快照）
+    4. 从快照加载
+
+运行命令:
+    uv run python -m benchmarks.bench_startup --models t2i vl
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = [
+    ("random init", {"LOW_CPU_MEM_USAGE": "false"}),
+    ("low_cpu_mem_usage", {"LOW_CPU_MEM_USAGE": "true"}),
+    ("snapshot (write)", {"LOW_CPU_MEM_USAGE": "true", "MODEL_SNAPSHOT_DIR": "{snapshot}"}),
+    ("snapshot (load)", {"LOW_CPU_MEM_USAGE": "true", "MODEL_SNAPSHOT_DIR": "{snapshot}"}),
+]
+
+
+def _rss_mb() -> float:
+    """当前 RSS（MB）。"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def _peak_rss_mb() -> float:
+    """进程启动以来的峰值 RSS（MB，Linux 上 ru_maxrss 以 KB 为单位）。"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_once(model: str) -> dict[str, float]:
+    """在当前进程中加载一次模型（子进程入口）。"""
+    import torch  # noqa: F401  先导入框架，基线内存不计入导入开销
+
+    if model == "t2i":
+        from app.models.t2i_hunyuan import HunyuanDiTModel as Model
+    else:
+        from app.models.vl_qwen import QwenVLModel as Model
+
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    Model()
+    return {
+        "load_s": time.perf_counter() - start,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_delta_mb": _peak_rss_mb() - baseline,
+    }
+
+
+def run_case(model: str, env: dict[str, str]) -> dict[str, float]:
+    """在子进程中运行一个用例。"""
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", model],
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # 模型加载日志之后的最后一行是结果
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Model startup benchmark")
+    parser.add_argument("--models", nargs="+", choices=["t2i", "vl"], default=["t2i", "vl"])
+    parser.add_argument("--child", choices=["t2i", "vl"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(load_once(args.child)))
+        return
+
+    print(f"{'model':<6} {'case':<20} {'load (s)':>10} {'peak RSS (MB)':>15} {'peak delta':>12}")
+    for model in args.models:
+        with tempfile.TemporaryDirectory() as snapshot:
+            for name, env in CASES:
+                env = {key: value.format(snapshot=snapshot) for key, value in env.items()}
+                stats = run_case(model, env)
+                print(
+                    f"{model:<6} {name:<20} {stats['load_s']:>10.2f} "
+                    f"{stats['peak_rss_mb']:>15.0f} {stats['peak_delta_mb']:>12.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+端到端基准套件：用迷你模型驱动真实的路由和队列，对比基线发现性能回退。
+
+每个场景在独立的子进程中以对应的 SERVICE_MODE 启动应用（经过 lifespan 后台加载和预热），
+等 ``/ready`` 就绪后按固定并发发送请求，统计：
+    - 延迟 p50 / p95 / p99（秒）
+    - 吞吐（请求数 / 总耗时）
+    - 峰值 RSS（MB）
+模型为 ``benchmarks.tiny_models`` 构建的随机权重迷你模型，结果缓存全部关闭，每个请求都走完整推理。
+
+结果写入 --output（JSON）。与 --baseline 中同名场景比较：延迟、峰值 RSS 超过基线的
+(1 + tolerance) 倍，或吞吐低于基线的 (1 - tolerance) 倍时判为回退，以退出码 1 结束。
+基线与运行机器相关，换机器后用 --update-baseline 重新生成。
+
+运行命令:
+    uv run python -m benchmarks.bench_suite --requests 32 --concurrency 8
+    uv run python -m benchmarks.bench_suite --update-baseline
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.tiny_models import DEFAULT_DIR, ensure_tiny_models
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+PROMPTS = ["a red apple on a wooden table", "a lighthouse at sunset", "a cat on a white background"]
+QUESTIONS = ["What is in the image?", "What colors are in the image?", "Describe this picture"]
+
+# 场景 -> (服务模式, 环境变量)
+SCENARIOS: dict[str, tuple[str, dict[str, str]]] = {
+    "t2i": (
+        "t2i",
+        {
+            "T2I_NUM_INFERENCE_STEPS": "2",
+            "T2I_CACHE_ENABLED": "false",
+        },
+    ),
+    "vl": ("vl", {"VL_MAX_NEW_TOKENS": "16", "VL_VISION_CACHE_BYTES": "0"}),
+}
+
+# 越小越好的指标，以及越大越好的指标
+LOWER_IS_BETTER = ("latency_p50", "latency_p95", "latency_p99", "peak_rss_mb")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """第 q 百分位数（0-100，相邻样本间线性插值）。"""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _test_image(i: int) -> str:
+    """Base64 编码的合成测试图像：渐变背景上不同位置的色块。"""
+    x = np.linspace(0, 255, 224, dtype=np.uint8)
+    pixels = np.stack(np.broadcast_arrays(x[None, :], x[:, None], 128), axis=-1).astype(np.uint8)
+    offset = 20 + (i % 5) * 30
+    pixels[offset : offset + 80, offset : offset + 80] = (220, 40, 40)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def _request(mode: str, i: int) -> tuple[str, dict[str, Any]]:
+    """第 i 个请求的路径和请求体（输入各不相同，避免命中任何缓存）。"""
+    if mode == "t2i":
+        return "/t2i/generate", {"prompt": PROMPTS[i % len(PROMPTS)], "seed": i, "format": "jpeg"}
+    return "/vl/understand", {"image_base64": _test_image(i), "question": QUESTIONS[i % 3]}
+
+
+async def run_scenario(mode: str, num_requests: int, concurrency: int) -> dict[str, float]:
+    """在当前进程中启动应用并压测（子进程入口）。"""
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    async with (
+        app.router.lifespan_context(app),
+        AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench", timeout=600
+        ) as client,
+    ):
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.1)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one_request(i: int) -> float:
+            path, body = _request(mode, i)
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(path, json=body)
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one_request(i) for i in range(num_requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": num_requests,
+        "concurrency": concurrency,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "throughput_rps": num_requests / elapsed,
+        # Linux 上 ru_maxrss 以 KB 为单位
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    """
+    对比结果与基线。
+
+    Args:
+        results: 场景 -> 指标
+        baseline: 场景 -> 基线指标（缺少的场景或指标、请求数或并发不同的场景不比较）
+        tolerance: 允许的相对变化
+
+    Returns:
+        回退描述，没有回退时为空
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        reference = baseline.get(scenario, {})
+        # 请求数或并发不同的结果不可比
+        if any(reference.get(key) != metrics.get(key) for key in ("requests", "concurrency")):
+            continue
+        for name in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if name not in reference or name not in metrics:
+                continue
+            value, base = metrics[name], reference[name]
+            if name in LOWER_IS_BETTER:
+                regressed = value > base * (1 + tolerance)
+            else:
+                regressed = value < base * (1 - tolerance)
+            if regressed:
+                regressions.append(f"{scenario} {name}: {value:.3f} (baseline {base:.3f})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite with tiny models")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--models-dir", type=Path, default=DEFAULT_DIR)
+    parser.add_argument("--output", type=Path, default=Path(".cache/bench_results.json"))
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对变化")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写为基线")
+    parser.add_argument("--child", choices=["t2i", "vl"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(run_scenario(args.child, args.requests, args.concurrency))
+        print(json.dumps({key: round(value, 4) for key, value in result.items()}))
+        return
+
+    models = ensure_tiny_models(args.models_dir)
+    results = {}
+    print(
+        f"{'scenario':<8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'req/s':>8} {'RSS (MB)':>9}"
+    )
+    for scenario in args.scenarios:
+        mode, env = SCENARIOS[scenario]
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.bench_suite", "--child", mode,
+                "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+            ],
+            env={
+                **os.environ,
+                **env,
+                "SERVICE_MODE": mode,
+                "DEVICE": "cpu",
+                "T2I_MODEL_ID": str(models["t2i"].resolve()),
+                "VL_MODEL_ID": str(models["vl"].resolve()),
+            },
+            capture_output=True,
+            text=True,
+            check=True,
+        )  # fmt: skip
+        # 应用日志之后的最后一行是结果
+        stats = results[scenario] = json.loads(result.stdout.strip().splitlines()[-1])
+        print(
+            f"{scenario:<8} {stats['latency_p50']:>9.3f} {stats['latency_p95']:>9.3f} "
+            f"{stats['latency_p99']:>9.3f} {stats['throughput_rps']:>8.2f} "
+            f"{stats['peak_rss_mb']:>9.0f}"
+        )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2) + "\n")
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, skipping comparison")
+        return
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+文生图微批吞吐/延迟基准。
+
+对每个批大小上限，用同样数量的并发请求压 ``BatchScheduler``，
+统计每个请求的端到端延迟（含排队等待）和整体吞吐，
+用来在吞吐和单请求延迟之间选择 ``T2I_MAX_BATCH_SIZE``。
+批大小上限为 1 即逐个执行的基线（与服务中 T2I_MAX_BATCH_SIZE=1 的代码路径相同）。
+
+运行命令:
+    uv run python -m benchmarks.bench_t2i_batching --batch-sizes 1 2 4 --requests 8
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+from app.scheduler import BatchScheduler
+
+
+async def run_case(
+    model: HunyuanDiTModel,
+    batch_size: int,
+    num_requests: int,
+    max_wait_ms: float,
+    prompt: str,
+) -> dict[str, float]:
+    """用给定批大小上限跑一轮并发请求，返回延迟和吞吐统计。"""
+
+    async def run_batch(jobs: list[T2IJob]) -> list[bytes]:
+        # 与路由一样在线程中执行推理，调度器一次只执行一批
+        return await asyncio.to_thread(model.generate_images, jobs)
+
+    scheduler = BatchScheduler(run_batch, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+
+    async def one_request() -> float:
+        start = time.perf_counter()
+        await scheduler.submit(T2IJob(prompt))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one_request() for _ in range(num_requests))))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "batch_size": batch_size,
+        "throughput": num_requests / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_max": latencies[-1],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="T2I micro-batching benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=8, help="每个批大小发送的并发请求数")
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    parser.add_argument("--prompt", default="a beautiful sunset over the ocean")
+    args = parser.parse_args()
+
+    model = HunyuanDiTModel()
+
+    # 预热一次，避免首批包含算子初始化开销
+    await asyncio.to_thread(model.generate_images, [T2IJob(args.prompt)])
+
+    print(f"{'batch':>5} {'img/s':>8} {'p50(s)':>8} {'max(s)':>8}")
+    for batch_size in args.batch_sizes:
+        stats = await run_case(model, batch_size, args.requests, args.max_wait_ms, args.prompt)
+        print(
+            f"{stats['batch_size']:>5} {stats['throughput']:>8.3f} "
+            f"{stats['latency_p50']:>8.2f} {stats['latency_max']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
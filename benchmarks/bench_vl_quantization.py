@@ -0,0 +1,180 @@
+"""
+VL int8 量化基准：吞吐、内存占用，以及答案与 float32 的一致性。
+
+每个用例在独立的子进程中加载模型（峰值内存互不影响），预热一次后对固定的图像集合逐个提问，
+报告加载耗时、解码吞吐（生成 token 数 / 总耗时）、模型权重占用和峰值 RSS。
+答案与 float32 用例比较：
+    - exact: 贪心解码答案完全相同的比例，低于 --min-agreement 判为不一致
+    - prefix: 答案 token 的最长公共前缀占 float32 答案长度的平均比例
+
+用例依次为 float32、int8（量化并写入缓存）、int8（从缓存加载）、int8 + 视觉编码器。
+图像集合来自 --images 目录中的 jpg / png / webp 文件，未指定时使用几张合成图像。
+
+运行命令:
+    uv run python -m benchmarks.bench_vl_quantization --images samples/
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+QUESTIONS = ["What is in the image?", "What colors are in the image?"]
+
+CASES = [
+    ("float32", {"VL_QUANTIZATION": "none"}),
+    ("int8", {"VL_QUANTIZATION": "int8"}),
+    ("int8 (cached)", {"VL_QUANTIZATION": "int8"}),
+    ("int8 + vision", {"VL_QUANTIZATION": "int8", "VL_QUANTIZE_VISION": "true"}),
+]
+
+
+def _synthetic_images() -> list[bytes]:
+    """合成测试图像：渐变背景上不同位置、颜色的色块。"""
+    images = []
+    for i, color in enumerate([(220, 40, 40), (40, 160, 60), (40, 60, 200)]):
+        x = np.linspace(0, 255, 448, dtype=np.uint8)
+        pixels = np.stack(np.broadcast_arrays(x[None, :], x[:, None], 128), axis=-1)
+        offset = 60 + i * 80
+        pixels[offset : offset + 150, offset : offset + 150] = color
+        buf = io.BytesIO()
+        Image.fromarray(pixels.astype(np.uint8)).save(buf, format="PNG")
+        images.append(buf.getvalue())
+    return images
+
+
+def load_images(directory: Path | None) -> list[bytes]:
+    """读取图像集合（按文件名排序，保证各用例输入一致）。"""
+    if directory is None:
+        return _synthetic_images()
+    paths = sorted(p for p in directory.iterdir() if p.suffix.lower() in {".jpg", ".png", ".webp"})
+    if not paths:
+        raise SystemExit(f"No images found in {directory}")
+    return [p.read_bytes() for p in paths]
+
+
+def model_nbytes(model: Any) -> int:
+    """模型权重占用的字节数（量化线性层的权重在 state_dict 中是打包的 (weight, bias) 元组）。"""
+    import torch
+
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.element_size() * tensor.nelement()
+    return total
+
+
+def run_case(images_dir: Path | None, output_path: Path) -> dict[str, float]:
+    """在当前进程中加载模型、回答全部问题并保存答案（子进程入口）。"""
+    from app.acceleration import configure_threads
+    from app.models.vl_qwen import QwenVLModel, VLJob
+
+    configure_threads()
+    start = time.perf_counter()
+    model = QwenVLModel()
+    load_s = time.perf_counter() - start
+
+    jobs = [VLJob(image, q) for image in load_images(images_dir) for q in QUESTIONS]
+    model.understand_images(jobs[:1])
+
+    # 逐个提问，吞吐只反映量化本身而不受批大小影响
+    answers = []
+    start = time.perf_counter()
+    for job in jobs:
+        answers.extend(model.understand_images([job]))
+    elapsed = time.perf_counter() - start
+
+    tokenizer = model.processor.tokenizer
+    tokens = [tokenizer.encode(a.text, add_special_tokens=False) for a in answers]
+    output_path.write_text(json.dumps({"texts": [a.text for a in answers], "tokens": tokens}))
+    return {
+        "load_s": load_s,
+        "tokens_per_s": sum(len(t) for t in tokens) / elapsed,
+        "model_mb": model_nbytes(model.model) / 1024**2,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def agreement(reference: Path, candidate: Path) -> tuple[float, float]:
+    """返回 (答案完全相同的比例, 最长公共 token 前缀占参考答案长度的平均比例)。"""
+    a = json.loads(reference.read_text())
+    b = json.loads(candidate.read_text())
+    exact = sum(x == y for x, y in zip(a["texts"], b["texts"])) / len(a["texts"])
+
+    prefixes = []
+    for x, y in zip(a["tokens"], b["tokens"]):
+        common = 0
+        while common < min(len(x), len(y)) and x[common] == y[common]:
+            common += 1
+        prefixes.append(common / len(x) if x else float(not y))
+    return exact, sum(prefixes) / len(prefixes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="VL int8 quantization benchmark")
+    parser.add_argument("--images", type=Path, help="测试图像目录，未指定时使用合成图像")
+    parser.add_argument("--min-agreement", type=float, default=0.5, help="答案完全一致比例下限")
+    parser.add_argument("--child", type=Path, metavar="OUTPUT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(args.images, args.child)))
+        return
+
+    print(
+        f"{'case':<14} {'load (s)':>9} {'tok/s':>8} {'weights (MB)':>13} {'peak RSS (MB)':>14}"
+        "  agreement"
+    )
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for index, (name, env) in enumerate(CASES):
+            output_path = Path(tmp) / f"{index}.json"
+            command = [sys.executable, "-m", "benchmarks.bench_vl_quantization"]
+            if args.images:
+                command += ["--images", str(args.images)]
+            result = subprocess.run(
+                [*command, "--child", str(output_path)],
+                # 量化缓存写在临时目录，第二个 int8 用例从第一个写入的缓存加载
+                env={
+                    **os.environ,
+                    **env,
+                    "DEVICE": "cpu",
+                    "QUANTIZED_CACHE_DIR": str(Path(tmp) / "quantized"),
+                    "VL_VISION_CACHE_BYTES": "0",
+                },
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+
+            if index == 0:
+                parity = "reference"
+            else:
+                exact, prefix = agreement(Path(tmp) / "0.json", output_path)
+                ok = exact >= args.min_agreement
+                failed |= not ok
+                parity = f"exact {exact:.0%}, prefix {prefix:.0%} " + ("OK" if ok else "FAIL")
+
+            print(
+                f"{name:<14} {stats['load_s']:>9.2f} {stats['tokens_per_s']:>8.1f} "
+                f"{stats['model_mb']:>13.1f} {stats['peak_rss_mb']:>14.0f}  {parity}"
+            )
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
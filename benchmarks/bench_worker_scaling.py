@@ -0,0 +1,87 @@
+"""
+多副本扩展性基准：吞吐随副本数的变化。
+
+对每个副本数启动一个 ``WorkerPool``（每个副本的线程数默认按 CPU 核数平均分配），
+用固定数量的并发请求压调度器，统计整体吞吐和请求延迟，
+用来在多核机器上选择 ``WORKER_REPLICAS`` 和 ``WORKER_THREADS_PER_REPLICA``。
+
+运行命令:
+    uv run python -m benchmarks.bench_worker_scaling --replicas 1 2 4 --requests 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.config import settings
+from app.models.t2i_hunyuan import T2IJob
+from app.scheduler import BatchScheduler
+from app.workers import WorkerPool, load_t2i
+
+
+async def run_case(
+    replicas: int,
+    threads_per_replica: int,
+    num_requests: int,
+    batch_size: int,
+    prompt: str,
+) -> dict[str, float]:
+    """用给定副本数跑一轮并发请求，返回吞吐和延迟统计。"""
+    pool = WorkerPool(load_t2i, replicas, threads_per_replica)
+    pool.start()
+    try:
+        scheduler = BatchScheduler(
+            pool.run, max_batch_size=batch_size, max_wait_ms=50, concurrency=replicas
+        )
+
+        # 每个副本预热一次，避免首批包含算子初始化开销
+        await asyncio.gather(*(scheduler.submit(T2IJob(prompt)) for _ in range(replicas)))
+
+        async def one_request() -> float:
+            start = time.perf_counter()
+            await scheduler.submit(T2IJob(prompt))
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = sorted(await asyncio.gather(*(one_request() for _ in range(num_requests))))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    return {
+        "replicas": replicas,
+        "threads": pool.threads_per_replica,
+        "throughput": num_requests / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_max": latencies[-1],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Model replica scaling benchmark")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument(
+        "--threads-per-replica", type=int, default=0, help="0 表示按 CPU 核数平均分配"
+    )
+    parser.add_argument("--requests", type=int, default=16, help="每个副本数发送的并发请求数")
+    parser.add_argument("--batch-size", type=int, default=settings.t2i_max_batch_size)
+    parser.add_argument("--prompt", default="a beautiful sunset over the ocean")
+    args = parser.parse_args()
+
+    print(f"{'replicas':>8} {'threads':>7} {'img/s':>8} {'p50(s)':>8} {'max(s)':>8}")
+    baseline = None
+    for replicas in args.replicas:
+        stats = await run_case(
+            replicas, args.threads_per_replica, args.requests, args.batch_size, args.prompt
+        )
+        baseline = baseline or stats["throughput"]
+        print(
+            f"{stats['replicas']:>8} {stats['threads']:>7} {stats['throughput']:>8.3f} "
+            f"{stats['latency_p50']:>8.2f} {stats['latency_max']:>8.2f} "
+            f"(x{stats['throughput'] / baseline:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,365 @@
+"""
+负载生成器：向运行中的服务发送 HTTP / WebSocket 请求，观察排队、尾延迟和拒绝。
+
+两种负载模型：
+    - open: 开环，按泊松过程以 --rate 请求/秒到达，不等待前一个请求完成。
+      到达率超过服务能力时排队持续增长，能看到延迟崩溃和准入拒绝
+    - closed: 闭环并发扫描，对 --concurrency 中的每个并发数，各个客户端收到响应后立即发送下一个
+
+支持的端点：/t2i/generate、/t2i/generate/image、/vl/understand、/vl/understand/upload（multipart），
+以及 /t2i/ws、/vl/ws（每个连接依次发送请求；开环时没有空闲连接就新建一个，
+因此过载时能看到大量同时打开的连接）。
+
+请求体从 --payloads 指定的 JSONL 文件中循环读取，每行一个 JSON 对象，字段与端点的请求体相同；
+VL 请求可以用 "image_path"（相对 JSONL 文件所在目录）代替 "image_base64"。
+未指定时使用内置的示例请求体。
+
+报告延迟百分位（只统计成功的请求）、错误率、拒绝率（429 / 503），以及每秒完成的请求数。
+WebSocket 端点需要安装 websockets（uvicorn[standard] 的依赖）。
+
+运行命令（演示模式的本地实例，不需要模型）:
+    DEMO_MODE=true SERVICE_MODE=vl uv run uvicorn app.main:app --port 8000
+    uv run python -m benchmarks.loadgen --endpoint /vl/understand open --rate 50 --duration 20
+    uv run python -m benchmarks.loadgen --endpoint /vl/ws closed --concurrency 1 8 64
+    uv run python -m benchmarks.loadgen --endpoint /t2i/generate --payloads prompts.jsonl \\
+        --output report.json closed --concurrency 1 2 4
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import random
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+from PIL import Image
+
+from benchmarks.bench_suite import percentile
+
+HTTP_ENDPOINTS = ["/t2i/generate", "/t2i/generate/image", "/vl/understand", "/vl/understand/upload"]
+WS_ENDPOINTS = ["/t2i/ws", "/vl/ws"]
+
+# 准入控制拒绝（队列已满 / 模型未就绪），与其他错误分开统计
+REJECTED_STATUS = {429, 503}
+
+
+@dataclass
+class Outcome:
+    """一个请求的结果。"""
+
+    # 相对负载开始的完成时间（秒）
+    finished_at: float
+    latency: float
+    # ok / rejected / error
+    status: str
+
+
+@dataclass
+class Report:
+    """一轮负载的统计。"""
+
+    outcomes: list[Outcome] = field(default_factory=list)
+    duration: float = 0.0
+    # 同时打开的 WebSocket 连接数的峰值
+    max_connections: int = 0
+
+    def summary(self) -> dict[str, Any]:
+        """汇总统计：延迟百分位、错误率、拒绝率、吞吐和每秒完成数。"""
+        total = len(self.outcomes)
+        latencies = [o.latency for o in self.outcomes if o.status == "ok"]
+        counts = {s: sum(o.status == s for o in self.outcomes) for s in ("ok", "rejected", "error")}
+
+        timeline: dict[int, int] = {}
+        for outcome in self.outcomes:
+            if outcome.status == "ok":
+                second = int(outcome.finished_at)
+                timeline[second] = timeline.get(second, 0) + 1
+
+        return {
+            "requests": total,
+            **counts,
+            "error_rate": counts["error"] / total if total else 0.0,
+            "rejection_rate": counts["rejected"] / total if total else 0.0,
+            "throughput_rps": counts["ok"] / self.duration if self.duration else 0.0,
+            **{
+                f"latency_p{q}": percentile(latencies, q) if latencies else None
+                for q in (50, 90, 99)
+            },
+            "latency_max": max(latencies, default=None),
+            "max_connections": self.max_connections,
+            # 每秒完成的成功请求数
+            "timeline": [timeline.get(s, 0) for s in range(int(self.duration) + 1)],
+        }
+
+
+def _sample_image() -> str:
+    """内置示例请求体使用的测试图像（Base64 PNG）。"""
+    buf = io.BytesIO()
+    Image.new("RGB", (224, 224), (200, 60, 60)).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def load_payloads(path: Path | None, endpoint: str) -> list[dict[str, Any]]:
+    """
+    读取请求体。
+
+    Args:
+        path: JSONL 文件，None 时使用内置示例
+        endpoint: 目标端点（决定内置示例的内容）
+
+    Returns:
+        请求体列表（image_path 已替换为 image_base64）
+    """
+    if path is None:
+        if endpoint.startswith("/t2i"):
+            return [{"prompt": "a red apple on a wooden table"}, {"prompt": "a lighthouse"}]
+        return [{"image_base64": _sample_image(), "question": "What is in the image?"}]
+
+    payloads = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        payload = json.loads(line)
+        if "image_path" in payload:
+            image = (path.parent / payload.pop("image_path")).read_bytes()
+            payload["image_base64"] = base64.b64encode(image).decode()
+        payloads.append(payload)
+    if not payloads:
+        raise ValueError(f"No payloads in {path}")
+    return payloads
+
+
+class HttpTarget:
+    """HTTP 端点：每个请求一次 POST。"""
+
+    def __init__(self, client: httpx.AsyncClient, endpoint: str) -> None:
+        self.client = client
+        self.endpoint = endpoint
+
+    async def send(self, payload: dict[str, Any]) -> str:
+        """发送一个请求，返回 ok / rejected / error。"""
+        if self.endpoint == "/vl/understand/upload":
+            payload = dict(payload)
+            image = base64.b64decode(payload.pop("image_base64"))
+            response = await self.client.post(
+                self.endpoint, files={"image": ("image", image)}, data=payload
+            )
+        else:
+            response = await self.client.post(self.endpoint, json=payload)
+        await response.aread()
+
+        if response.is_success:
+            return "ok"
+        return "rejected" if response.status_code in REJECTED_STATUS else "error"
+
+    async def close(self) -> None:
+        pass
+
+
+class WebSocketTarget:
+    """
+    WebSocket 端点：复用空闲连接依次发送请求，没有空闲连接时新建。
+
+    预览帧、流式片段等中间消息跳过，直到收到最终结果（image_base64 / answer）或错误。
+    """
+
+    def __init__(self, url: str, endpoint: str, timeout: float) -> None:
+        self.url = url.replace("http", "ws", 1).rstrip("/") + endpoint
+        self.timeout = timeout
+        self._idle: list[Any] = []
+        self._all: list[Any] = []
+        self.max_connections = 0
+
+    async def send(self, payload: dict[str, Any]) -> str:
+        """发送一个请求，返回 ok / rejected / error。"""
+        import websockets
+
+        if self._idle:
+            connection = self._idle.pop()
+        else:
+            connection = await websockets.connect(self.url, max_size=None)
+            self._all.append(connection)
+            self.max_connections = max(self.max_connections, len(self._all))
+
+        try:
+            await connection.send(json.dumps(payload))
+            while True:
+                message = json.loads(await asyncio.wait_for(connection.recv(), self.timeout))
+                if "error" in message:
+                    status = message.get("status_code")
+                    result = "rejected" if status in REJECTED_STATUS else "error"
+                    break
+                if "answer" in message or (
+                    "image_base64" in message and message.get("type") != "preview"
+                ):
+                    result = "ok"
+                    break
+        except BaseException:
+            # 连接状态未知（可能还有未读的响应），不再复用
+            self._all.remove(connection)
+            await connection.close()
+            raise
+
+        self._idle.append(connection)
+        return result
+
+    async def close(self) -> None:
+        await asyncio.gather(*(connection.close() for connection in self._all))
+        self._all.clear()
+        self._idle.clear()
+
+
+async def _timed(
+    target: HttpTarget | WebSocketTarget, payload: dict[str, Any], t0: float
+) -> Outcome:
+    start = time.perf_counter()
+    try:
+        status = await target.send(payload)
+    except Exception:
+        status = "error"
+    end = time.perf_counter()
+    return Outcome(end - t0, end - start, status)
+
+
+async def run_open(
+    target: HttpTarget | WebSocketTarget,
+    payloads: list[dict[str, Any]],
+    rate: float,
+    duration: float,
+    seed: int = 0,
+) -> Report:
+    """
+    开环负载：到达间隔服从指数分布（泊松到达），持续 duration 秒后等待在途请求完成。
+
+    Args:
+        target: 目标端点
+        payloads: 循环使用的请求体
+        rate: 平均到达率（请求/秒）
+        duration: 发送请求的时长（秒）
+        seed: 到达间隔的随机种子
+
+    Returns:
+        统计
+    """
+    rng = random.Random(seed)
+    cycle: Iterator[dict[str, Any]] = itertools.cycle(payloads)
+    t0 = time.perf_counter()
+    tasks = []
+    next_arrival = rng.expovariate(rate)
+    while next_arrival < duration:
+        await asyncio.sleep(max(0.0, next_arrival - (time.perf_counter() - t0)))
+        tasks.append(asyncio.create_task(_timed(target, next(cycle), t0)))
+        next_arrival += rng.expovariate(rate)
+
+    outcomes = list(await asyncio.gather(*tasks))
+    return Report(outcomes, time.perf_counter() - t0, getattr(target, "max_connections", 0))
+
+
+async def run_closed(
+    target: HttpTarget | WebSocketTarget,
+    payloads: list[dict[str, Any]],
+    concurrency: int,
+    duration: float,
+) -> Report:
+    """
+    闭环负载：concurrency 个客户端各自收到响应后立即发送下一个，持续 duration 秒。
+
+    Args:
+        target: 目标端点
+        payloads: 循环使用的请求体
+        concurrency: 并发客户端数
+        duration: 时长（秒），到时后不再发送新请求，等待在途请求完成
+
+    Returns:
+        统计
+    """
+    cycle: Iterator[dict[str, Any]] = itertools.cycle(payloads)
+    t0 = time.perf_counter()
+    outcomes: list[Outcome] = []
+
+    async def client() -> None:
+        while time.perf_counter() - t0 < duration:
+            outcomes.append(await _timed(target, next(cycle), t0))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return Report(outcomes, time.perf_counter() - t0, getattr(target, "max_connections", 0))
+
+
+def _format_summary(label: str, summary: dict[str, Any]) -> str:
+    def ms(value: float | None) -> str:
+        return f"{value * 1000:>8.1f}" if value is not None else f"{'-':>8}"
+
+    return (
+        f"{label:<14} {summary['requests']:>6} {summary['throughput_rps']:>8.1f} "
+        f"{ms(summary['latency_p50'])} {ms(summary['latency_p90'])} {ms(summary['latency_p99'])} "
+        f"{summary['error_rate']:>7.1%} {summary['rejection_rate']:>7.1%} "
+        f"{summary['max_connections']:>5}"
+    )
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, Any]]:
+    """按命令行参数执行负载，返回 标签 -> 统计。"""
+    payloads = load_payloads(args.payloads, args.endpoint)
+    results: dict[str, dict[str, Any]] = {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    print(
+        f"{'run':<14} {'reqs':>6} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'errors':>7} {'reject':>7} {'conns':>5}"
+    )
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        levels = [args.rate] if args.mode == "open" else args.concurrency
+        for level in levels:
+            if args.endpoint in WS_ENDPOINTS:
+                target: HttpTarget | WebSocketTarget = WebSocketTarget(
+                    args.url, args.endpoint, args.timeout
+                )
+            else:
+                target = HttpTarget(client, args.endpoint)
+            try:
+                if args.mode == "open":
+                    label = f"rate={level:g}"
+                    report = await run_open(target, payloads, level, args.duration, args.seed)
+                else:
+                    label = f"concurrency={level}"
+                    report = await run_closed(target, payloads, level, args.duration)
+            finally:
+                await target.close()
+
+            summary = results[label] = report.summary()
+            print(_format_summary(label, summary))
+            print(f"{'':<14} completed/s: {' '.join(str(n) for n in summary['timeline'])}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Open/closed-loop load generator")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=HTTP_ENDPOINTS + WS_ENDPOINTS, required=True)
+    parser.add_argument("--payloads", type=Path, help="JSONL 请求体文件")
+    parser.add_argument("--duration", type=float, default=10.0, help="每轮发送请求的时长（秒）")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求的超时（秒）")
+    parser.add_argument("--output", type=Path, help="把统计写入 JSON 文件")
+    modes = parser.add_subparsers(dest="mode", required=True)
+    open_loop = modes.add_parser("open", help="泊松到达的开环负载")
+    open_loop.add_argument("--rate", type=float, required=True, help="平均到达率（请求/秒）")
+    open_loop.add_argument("--seed", type=int, default=0)
+    closed_loop = modes.add_parser("closed", help="闭环并发扫描")
+    closed_loop.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
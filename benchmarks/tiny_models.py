@@ -0,0 +1,244 @@
+"""
+随机权重的迷你模型：结构、接口与 HunyuanDiT / Qwen2.5-VL 相同，只是每层都很小。
+
+完全离线构建（不下载任何文件），保存为与 Hugging Face 仓库相同的目录布局，
+``HunyuanDiTModel`` / ``QwenVLModel`` 可以通过 ``T2I_MODEL_ID`` / ``VL_MODEL_ID`` 直接加载。
+权重是随机的，输出没有意义，只用于在 CI 中驱动真实的推理路径（路由、队列、批处理、编码）。
+
+运行命令:
+    uv run python -m benchmarks.tiny_models --output .cache/tiny-models
+"""
+
+import argparse
+from pathlib import Path
+
+import torch
+
+DEFAULT_DIR = Path(".cache/tiny-models")
+
+# 迷你分词器的词表：覆盖基准中使用的提示词和问题，其余词映射为 unk
+WORDS = (
+    "a an the cat dog red blue green photo of on in with sunset ocean product shot white "
+    "background lighthouse apple wooden table what is this color colors image picture describe "
+    "yes no it user assistant system you are helpful"
+).split()
+
+
+def _word_tokenizer(specials: list[str], unk: str, pad: str, **kwargs: object) -> object:
+    """按空格切词的 WordLevel 分词器，词表为特殊 token + WORDS。"""
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {token: i for i, token in enumerate(specials + WORDS)}
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token=unk))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token=unk, pad_token=pad, **kwargs
+    )
+
+
+def build_t2i(path: Path) -> Path:
+    """
+    构建迷你 HunyuanDiT pipeline（双文本编码器 + DiT + VAE）。
+
+    Args:
+        path: 输出目录
+
+    Returns:
+        输出目录
+    """
+    from diffusers import AutoencoderKL, DDPMScheduler, HunyuanDiT2DModel, HunyuanDiTPipeline
+    from transformers import BertConfig, BertModel, T5Config, T5EncoderModel
+
+    torch.manual_seed(0)
+    tokenizer = _word_tokenizer(
+        ["[PAD]", "[UNK]", "[CLS]", "[SEP]"], "[UNK]", "[PAD]", model_max_length=77
+    )
+    tokenizer_2 = _word_tokenizer(
+        ["<pad>", "</s>", "<unk>"], "<unk>", "<pad>", eos_token="</s>", model_max_length=256
+    )
+    text_encoder = BertModel(
+        BertConfig(
+            vocab_size=len(tokenizer),
+            hidden_size=32,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            intermediate_size=37,
+            max_position_embeddings=128,
+        )
+    )
+    text_encoder_2 = T5EncoderModel(
+        T5Config(
+            vocab_size=len(tokenizer_2), d_model=32, d_kv=8, d_ff=37, num_layers=1, num_heads=2
+        )
+    )
+    transformer = HunyuanDiT2DModel(
+        sample_size=16,
+        num_layers=2,
+        patch_size=2,
+        attention_head_dim=8,
+        num_attention_heads=3,
+        in_channels=4,
+        cross_attention_dim=32,
+        cross_attention_dim_t5=32,
+        pooled_projection_dim=16,
+        hidden_size=24,
+        activation_fn="gelu-approximate",
+    )
+    vae = AutoencoderKL(
+        block_out_channels=(8, 8, 8, 8),
+        norm_num_groups=8,
+        layers_per_block=1,
+        latent_channels=4,
+        down_block_types=("DownEncoderBlock2D",) * 4,
+        up_block_types=("UpDecoderBlock2D",) * 4,
+    )
+    pipe = HunyuanDiTPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        transformer=transformer,
+        scheduler=DDPMScheduler(),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+        text_encoder_2=text_encoder_2,
+        tokenizer_2=tokenizer_2,
+    )
+    pipe.save_pretrained(path)
+    return path
+
+
+# Qwen2.5-VL 对话模板的最小版本：只支持文本和图像内容
+_CHAT_TEMPLATE = (
+    "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+    "{% if message['content'] is string %}{{ message['content'] }}"
+    "{% else %}{% for content in message['content'] %}"
+    "{% if content['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>"
+    "{% elif content['type'] == 'text' %}{{ content['text'] }}{% endif %}"
+    "{% endfor %}{% endif %}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+_VL_SPECIALS = [
+    "<|endoftext|>",
+    "<|im_start|>",
+    "<|im_end|>",
+    "<|vision_start|>",
+    "<|vision_end|>",
+    "<|image_pad|>",
+    "<|video_pad|>",
+]
+
+
+def build_vl(path: Path) -> Path:
+    """
+    构建迷你 Qwen2.5-VL 模型和 processor（视觉编码器 + M-RoPE 语言模型）。
+
+    Args:
+        path: 输出目录
+
+    Returns:
+        输出目录
+    """
+    from tokenizers import AddedToken, Tokenizer, models, pre_tokenizers
+    from transformers import (
+        Qwen2_5_VLConfig,
+        Qwen2_5_VLForConditionalGeneration,
+        Qwen2_5_VLProcessor,
+        Qwen2TokenizerFast,
+        Qwen2VLImageProcessor,
+    )
+
+    # 随机权重的模型会生成任意 token，带句号的词和换行让解码结果看起来像句子
+    words = ["<unk>", *WORDS, *(f"{word}." for word in WORDS), "\n", ":"]
+    backend = Tokenizer(
+        models.WordLevel(vocab={w: i for i, w in enumerate(words)}, unk_token="<unk>")
+    )
+    backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    backend.add_special_tokens(
+        [AddedToken(token, special=True, normalized=False) for token in _VL_SPECIALS]
+    )
+    tokenizer = Qwen2TokenizerFast(
+        tokenizer_object=backend,
+        unk_token="<unk>",
+        eos_token="<|im_end|>",
+        pad_token="<|endoftext|>",
+        chat_template=_CHAT_TEMPLATE,
+    )
+    processor = Qwen2_5_VLProcessor(
+        image_processor=Qwen2VLImageProcessor(min_pixels=4 * 28 * 28, max_pixels=64 * 28 * 28),
+        tokenizer=tokenizer,
+        chat_template=_CHAT_TEMPLATE,
+    )
+
+    ids = {token: tokenizer.convert_tokens_to_ids(token) for token in _VL_SPECIALS}
+    config = Qwen2_5_VLConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        intermediate_size=37,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=1024,
+        rope_scaling={"type": "mrope", "mrope_section": [1, 1, 2]},
+        image_token_id=ids["<|image_pad|>"],
+        video_token_id=ids["<|video_pad|>"],
+        vision_start_token_id=ids["<|vision_start|>"],
+        vision_end_token_id=ids["<|vision_end|>"],
+        bos_token_id=ids["<|endoftext|>"],
+        eos_token_id=ids["<|im_end|>"],
+        pad_token_id=ids["<|endoftext|>"],
+        vision_config={
+            "depth": 2,
+            "hidden_size": 16,
+            "intermediate_size": 24,
+            "num_heads": 2,
+            "out_hidden_size": 32,
+            "patch_size": 14,
+            "spatial_merge_size": 2,
+            "temporal_patch_size": 2,
+            "window_size": 56,
+            "fullatt_block_indexes": [1],
+        },
+    )
+
+    torch.manual_seed(0)
+    model = Qwen2_5_VLForConditionalGeneration(config)
+    model.generation_config.eos_token_id = ids["<|im_end|>"]
+    model.generation_config.pad_token_id = ids["<|endoftext|>"]
+    model.save_pretrained(path)
+    processor.save_pretrained(path)
+    return path
+
+
+def ensure_tiny_models(root: Path = DEFAULT_DIR) -> dict[str, Path]:
+    """
+    确保迷你模型存在，不存在时构建（已构建的目录直接复用）。
+
+    Args:
+        root: 模型根目录，两个模型分别保存在其下的 t2i/ 和 vl/
+
+    Returns:
+        {"t2i": 目录, "vl": 目录}
+    """
+    paths = {"t2i": root / "t2i", "vl": root / "vl"}
+    if not (paths["t2i"] / "model_index.json").exists():
+        build_t2i(paths["t2i"])
+    if not (paths["vl"] / "preprocessor_config.json").exists():
+        build_vl(paths["vl"])
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build tiny random-weight stand-in models")
+    parser.add_argument("--output", type=Path, default=DEFAULT_DIR)
+    args = parser.parse_args()
+
+    for name, path in ensure_tiny_models(args.output).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
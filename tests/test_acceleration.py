@@ -0,0 +1,76 @@
+"""测试 CPU 加速档位的选择、bfloat16 回退和 autocast。"""
+
+from collections.abc import Iterator
+
+import pytest
+import torch
+
+from app import acceleration
+from app.config import settings
+from app.encoding import EncodeOptions
+from app.models.t2i_hunyuan import T2IJob
+from app.routers import t2i
+
+
+@pytest.fixture(autouse=True)
+def clear_cached_choice() -> Iterator[None]:
+    """use_bf16 按进程缓存结果，每个测试重新判断。"""
+    acceleration.use_bf16.cache_clear()
+    yield
+    acceleration.use_bf16.cache_clear()
+
+
+def test_cpu_profile_selects_optimizations(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试各档位启用的优化，非 CPU 设备上总是 baseline。"""
+    monkeypatch.setattr(settings, "device", "cpu")
+    expected = {
+        "baseline": (False, False, False),
+        "fast": (True, True, False),
+        "max": (True, True, True),
+    }
+    for name, flags in expected.items():
+        monkeypatch.setattr(settings, "cpu_profile", name)
+        profile = acceleration.cpu_profile()
+        assert (profile.bf16, profile.channels_last, profile.compile) == flags
+
+    monkeypatch.setattr(settings, "device", "cuda")
+    assert acceleration.cpu_profile() == acceleration.PROFILES["baseline"]
+
+
+def test_bf16_falls_back_when_unsupported(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试 CPU 不支持 bfloat16 时即使档位要求也回退到 float32。"""
+    monkeypatch.setattr(settings, "device", "cpu")
+    monkeypatch.setattr(settings, "cpu_profile", "fast")
+    monkeypatch.setattr(acceleration, "bf16_supported", lambda: False)
+    assert not acceleration.use_bf16()
+
+    acceleration.use_bf16.cache_clear()
+    monkeypatch.setattr(acceleration, "bf16_supported", lambda: True)
+    assert acceleration.use_bf16()
+
+
+@pytest.mark.parametrize(
+    ("profile", "dtype"), [("baseline", torch.float32), ("fast", torch.bfloat16)]
+)
+def test_autocast_only_in_bf16_profiles(
+    monkeypatch: pytest.MonkeyPatch, profile: str, dtype: torch.dtype
+) -> None:
+    """测试 baseline 下 autocast 不起作用，bfloat16 档位下矩阵乘以 bfloat16 计算。"""
+    monkeypatch.setattr(settings, "device", "cpu")
+    monkeypatch.setattr(settings, "cpu_profile", profile)
+    monkeypatch.setattr(acceleration, "bf16_supported", lambda: True)
+    x = torch.ones(4, 4)
+
+    with acceleration.autocast():
+        assert (x @ x).dtype == dtype
+    with acceleration.autocast(enabled=False):
+        assert (x @ x).dtype == torch.float32
+
+
+def test_result_cache_key_depends_on_precision(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试切换到 bfloat16 档位后不会读到 float32 生成的缓存结果，反之亦然。"""
+    job, encoding = T2IJob("a cat", seed=1), EncodeOptions.create()
+    monkeypatch.setattr(acceleration, "use_bf16", lambda: False)
+    float32_key = t2i._cache_key(job, encoding)
+    monkeypatch.setattr(acceleration, "use_bf16", lambda: True)
+    assert t2i._cache_key(job, encoding) != float32_key
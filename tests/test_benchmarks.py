@@ -0,0 +1,60 @@
+"""测试基准套件：迷你模型能被真实的模型类加载，以及统计和回退判断。"""
+
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.config import settings
+from benchmarks.bench_suite import compare, percentile
+from benchmarks.tiny_models import ensure_tiny_models
+
+
+@pytest.fixture(scope="module")
+def tiny_models(tmp_path_factory: pytest.TempPathFactory) -> dict[str, Path]:
+    return ensure_tiny_models(tmp_path_factory.mktemp("tiny-models"))
+
+
+def test_tiny_models_load_through_model_classes(
+    tiny_models: dict[str, Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """测试迷你模型通过 t2i_model_id / vl_model_id 加载，并能完成一次推理。"""
+    from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+    from app.models.vl_qwen import QwenVLModel, VLJob
+
+    monkeypatch.setattr(settings, "device", "cpu")
+    monkeypatch.setattr(settings, "t2i_model_id", str(tiny_models["t2i"]))
+    monkeypatch.setattr(settings, "vl_model_id", str(tiny_models["vl"]))
+
+    [image] = HunyuanDiTModel().generate_images([T2IJob("a red apple", seed=0)], 1)
+    assert isinstance(image, Image.Image)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (112, 112), (200, 40, 40)).save(buf, format="PNG")
+    [answer] = QwenVLModel().understand_images([VLJob(buf.getvalue(), "What is this?")], 4)
+    assert isinstance(answer.text, str)
+
+
+def test_percentile_interpolates() -> None:
+    """测试百分位数在相邻样本间线性插值。"""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == pytest.approx(50.5)
+    assert percentile(values, 99) == pytest.approx(99.01)
+    assert percentile([3.0], 95) == 3.0
+
+
+def test_compare_flags_regressions_beyond_tolerance() -> None:
+    """测试延迟、内存变大或吞吐变小超过容差时判为回退，不可比的场景跳过。"""
+    baseline = {
+        "t2i": {"requests": 8, "concurrency": 2, "latency_p95": 1.0, "throughput_rps": 10.0},
+        "vl": {"requests": 8, "concurrency": 4, "latency_p95": 1.0},
+    }
+    results = {
+        "t2i": {"requests": 8, "concurrency": 2, "latency_p95": 1.2, "throughput_rps": 7.0},
+        "vl": {"requests": 8, "concurrency": 2, "latency_p95": 9.0},
+    }
+    assert compare(results, baseline, tolerance=0.25) == [
+        "t2i throughput_rps: 7.000 (baseline 10.000)"
+    ]
+    assert compare(results, baseline, tolerance=0.1)[0].startswith("t2i latency_p95")
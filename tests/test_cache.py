@@ -0,0 +1,78 @@
+"""测试结果缓存。"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.cache import DiskCache, LRUCache, TieredCache, make_key
+
+
+def test_make_key_depends_on_every_field() -> None:
+    """测试缓存键对字段顺序不敏感，但对字段取值敏感。"""
+    assert make_key(prompt="cat", seed=1) == make_key(seed=1, prompt="cat")
+    assert make_key(prompt="cat", seed=1) != make_key(prompt="cat", seed=2)
+
+
+def test_lru_cache_evicts_least_recently_used_by_size() -> None:
+    """测试按字节容量淘汰最久未使用的条目。"""
+    cache: LRUCache[str, bytes] = LRUCache(10, sizeof=len)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"  # a 变为最近使用
+
+    cache.put("c", b"1234")  # 超出容量，淘汰 b
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.size == 8
+
+    cache.put("huge", b"x" * 11)  # 比整个缓存还大，不写入
+    assert cache.get("huge") is None
+    assert len(cache) == 2
+
+
+def test_disk_cache_survives_restart_and_evicts(tmp_path: Path) -> None:
+    """测试磁盘缓存在重新创建后仍可读取，并按字节数淘汰。"""
+    cache = DiskCache(tmp_path, max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+
+    reopened = DiskCache(tmp_path, max_bytes=10)
+    assert reopened.get("a") == b"12345"
+    assert reopened.size == 10
+
+    reopened.put("c", b"12345")  # 淘汰最久未使用的 b
+    assert reopened.get("b") is None
+    assert not (tmp_path / "b.bin").exists()
+
+
+def test_disk_cache_concurrent_writers_use_separate_temp_files(tmp_path: Path) -> None:
+    """测试共用目录的两个磁盘缓存（如两个进程）并发写同一个键时互不干扰，不留下临时文件。"""
+    caches = [DiskCache(tmp_path, max_bytes=1 << 20) for _ in range(2)]
+    payloads = [bytes([i]) * 4096 for i in range(8)]
+
+    def write(i: int) -> None:
+        for _ in range(50):
+            caches[i % 2].put("k", payloads[i])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(8)))
+
+    assert caches[0].get("k") in payloads
+    assert [path.name for path in tmp_path.iterdir()] == ["k.bin"]
+
+
+def test_tiered_cache_counts_hits_per_tier(tmp_path: Path) -> None:
+    """测试两级缓存的查找顺序和命中计数。"""
+    cache = TieredCache(memory_bytes=100, disk_dir=tmp_path, disk_bytes=100)
+    assert cache.get("k") is None
+    cache.put("k", b"png")
+    assert cache.get("k") == b"png"
+
+    # 新进程：内存为空，从磁盘命中后提升到内存
+    restarted = TieredCache(memory_bytes=100, disk_dir=tmp_path, disk_bytes=100)
+    assert restarted.get("k") == b"png"
+    assert restarted.get("k") == b"png"
+
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["memory_hits"] == 1
@@ -0,0 +1,46 @@
+"""测试文生图输出编码。"""
+
+import pytest
+from PIL import Image
+
+from app.config import settings
+from app.encoding import (
+    EncodeOptions,
+    OutputFormat,
+    encode_image,
+    encode_image_async,
+    negotiate_format,
+)
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, OutputFormat(settings.t2i_output_format)),
+        ("image/webp", OutputFormat.WEBP),
+        ("image/jpeg;q=0.5, image/webp;q=0.8", OutputFormat.WEBP),
+        ("image/avif, image/jpeg;q=0.9", OutputFormat.JPEG),
+        ("image/*", OutputFormat(settings.t2i_output_format)),
+        ("image/avif, image/png;q=0", None),
+    ],
+)
+def test_negotiate_format(accept: str | None, expected: OutputFormat | None) -> None:
+    """测试按 Accept 请求头的 q 值选择输出格式。"""
+    assert negotiate_format(accept) == expected
+
+
+@pytest.mark.asyncio
+async def test_encode_formats() -> None:
+    """测试各格式编码输出正确的文件头，且编码参数只保留与格式相关的字段。"""
+    image = Image.new("RGB", (32, 24), "orange")
+
+    png = EncodeOptions.create(OutputFormat.PNG, quality=50, compress_level=1)
+    assert png == EncodeOptions(OutputFormat.PNG, compress_level=1)
+    assert encode_image(image, png).startswith(b"\x89PNG")
+
+    webp = EncodeOptions.create(OutputFormat.WEBP, quality=80)
+    assert (await encode_image_async(image, webp))[8:12] == b"WEBP"
+
+    jpeg = EncodeOptions.create(OutputFormat.JPEG)
+    assert jpeg.quality == settings.t2i_output_quality
+    assert encode_image(image.convert("RGBA"), jpeg).startswith(b"\xff\xd8")
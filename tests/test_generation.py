@@ -0,0 +1,65 @@
+"""测试文生图生成参数的默认值与服务端上限。"""
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.generation import GenerationParams, effective_size
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """固定默认参数和上限，不受环境变量影响。"""
+    for name, value in {
+        "t2i_num_inference_steps": 10,
+        "t2i_guidance_scale": 7.5,
+        "t2i_height": 768,
+        "t2i_width": 1024,
+        "t2i_sampler": "default",
+        "t2i_max_steps": 50,
+        "t2i_max_pixels": 1024 * 1024,
+        "t2i_max_images_per_request": 4,
+        "t2i_max_step_megapixels": 100.0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+def test_defaults_and_standard_sizes() -> None:
+    """测试未指定的参数使用配置默认值，分辨率映射到标准尺寸。"""
+    assert GenerationParams.create() == GenerationParams(10, 7.5, 768, 1024, "default")
+    assert effective_size(1024, 1024) == (1024, 1024)
+    assert effective_size(1000, 1010) == (1024, 1024)
+    assert effective_size(600, 900) == (768, 1024)
+
+    params = GenerationParams.create(4, 1.0, 1024, 1024, "dpmpp_2m")
+    assert params == GenerationParams(4, 1.0, 1024, 1024, "dpmpp_2m")
+
+
+def test_steps_are_reduced_to_fit_the_budget() -> None:
+    """测试步数不超过上限，整个请求的计算量超出预算时减少步数。"""
+    assert GenerationParams.create(200).num_inference_steps == 50
+    # 4 张 1024x1024、启用引导：每步约 8.4 百万像素，预算内最多 11 步
+    params = GenerationParams.create(30, height=1024, width=1024, num_images=4)
+    assert params.num_inference_steps == 11
+    # 关闭引导后每步的代价减半
+    params = GenerationParams.create(30, 1.0, 1024, 1024, num_images=4)
+    assert params.num_inference_steps == 23
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"num_images": 5},
+        {"height": 1280, "width": 1280},
+        {"num_images": 4, "height": 1024, "width": 1024, "guidance_scale": 7.5, "budget": 5.0},
+    ],
+)
+def test_requests_over_limits_are_rejected(
+    overrides: dict[str, float], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """测试图像数、分辨率超限，或 1 步也超出预算时返回 422。"""
+    if "budget" in overrides:
+        monkeypatch.setattr(settings, "t2i_max_step_megapixels", overrides.pop("budget"))
+    with pytest.raises(HTTPException) as exc_info:
+        GenerationParams.create(**overrides)  # type: ignore[arg-type]
+    assert exc_info.value.status_code == 422
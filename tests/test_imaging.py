@@ -0,0 +1,74 @@
+"""测试输入图像的读取、检查与缩小解码。"""
+
+import io
+from collections.abc import AsyncIterator
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app.config import settings
+from app.imaging import check_image, decode_image, fit_pixel_budget, read_limited
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 30, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+async def _chunks(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+@pytest.mark.asyncio
+async def test_read_limited_rejects_oversized_body() -> None:
+    """测试请求体超过上限时返回 413，未超限时原样拼接。"""
+    data = bytes(range(256)) * 8
+
+    assert await read_limited(_chunks(data, 100), len(data)) == data
+    with pytest.raises(HTTPException) as excinfo:
+        await read_limited(_chunks(data, 100), len(data) - 1)
+    assert excinfo.value.status_code == 413
+
+
+def test_check_image_rejects_invalid_and_oversized(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试无效图像返回 400，像素数超过上限返回 413（只解析文件头）。"""
+    assert check_image(_jpeg(64, 32)) == ("JPEG", 64, 32)
+
+    with pytest.raises(HTTPException) as excinfo:
+        check_image(b"not an image")
+    assert excinfo.value.status_code == 400
+
+    monkeypatch.setattr(settings, "vl_max_image_pixels", 64 * 32 - 1)
+    with pytest.raises(HTTPException) as excinfo:
+        check_image(_jpeg(64, 32))
+    assert excinfo.value.status_code == 413
+
+
+def test_decode_image_uses_jpeg_draft() -> None:
+    """测试 JPEG 按像素预算在解码阶段缩小，且不低于预算。"""
+    data = _jpeg(800, 600)
+
+    assert decode_image(data).size == (800, 600)
+    image = decode_image(data, max_pixels=200 * 150)
+    assert image.mode == "RGB"
+    assert image.size == (200, 150)
+
+
+@pytest.mark.parametrize(
+    ("size", "expected"),
+    [
+        ((4000, 3000), (1148, 840)),  # 超出上限：缩小到预算内的最大网格尺寸
+        ((640, 480), (644, 476)),  # 预算内：只对齐网格
+        ((20, 10), (84, 56)),  # 低于下限（且小于网格）：放大到下限
+    ],
+)
+def test_fit_pixel_budget(size: tuple[int, int], expected: tuple[int, int]) -> None:
+    """测试像素预算下的目标尺寸对齐 28 像素网格，且落在 [min_pixels, max_pixels] 内。"""
+    width, height = fit_pixel_budget(*size, 28, 56 * 56, 1280 * 28 * 28)
+
+    assert (width, height) == expected
+    assert width % 28 == 0 and height % 28 == 0
+    assert 56 * 56 <= width * height <= 1280 * 28 * 28
@@ -0,0 +1,136 @@
+"""测试异步任务存储和离线 JSONL 批处理。"""
+
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+
+from app.batch_runner import RESULTS_FILE, run_jsonl
+from app.jobs import JobStatus, JobStore
+from app.scheduler import BatchScheduler, RequestOptions
+
+
+@pytest.mark.asyncio
+async def test_job_results_are_persisted(tmp_path: Path) -> None:
+    """测试后台任务的状态和结果写入磁盘，失败任务记录错误信息。"""
+    store = JobStore(tmp_path)
+    ok, failed = store.create("vl"), store.create("vl")
+
+    async def answer(started: Callable[[], None]) -> dict[str, Any]:
+        started()
+        return {"answer": "a cat"}
+
+    async def reject(started: Callable[[], None]) -> dict[str, Any]:
+        raise HTTPException(status_code=429, detail="Queue is full")
+
+    store.submit(ok, answer)
+    store.submit(failed, reject)
+    while store._tasks:
+        await asyncio.sleep(0.01)
+
+    reloaded = JobStore(tmp_path)
+    assert reloaded.get(ok.id).status is JobStatus.SUCCEEDED
+    assert reloaded.get(ok.id).result == {"answer": "a cat"}
+    assert reloaded.get(failed.id).error == "Queue is full"
+    # 在排队中就失败的任务没有开始执行
+    assert reloaded.get(ok.id).started_at is not None
+    assert reloaded.get(failed.id).started_at is None
+    assert reloaded.get(ok.id, kind="t2i") is None
+    assert reloaded.get("../" + ok.id[3:]) is None
+
+
+@pytest.mark.asyncio
+async def test_job_runs_when_its_batch_is_dispatched(tmp_path: Path) -> None:
+    """测试任务在调度器中排队期间保持 queued，所在批次被派发时才标记为 running。"""
+    release = asyncio.Event()
+
+    async def run_batch(payloads: list[str]) -> list[str]:
+        await release.wait()
+        return [payload.upper() for payload in payloads]
+
+    scheduler: BatchScheduler[str, str] = BatchScheduler(run_batch, max_batch_size=1, max_wait_ms=0)
+    store = JobStore(tmp_path)
+    job = store.create("vl")
+
+    async def answer(started: Callable[[], None]) -> dict[str, Any]:
+        options = RequestOptions(on_dispatch=started)
+        return {"answer": await scheduler.submit("a cat", options)}
+
+    # 前一批占住调度器，任务只能排队
+    blocker = asyncio.create_task(scheduler.submit("blocker"))
+    await asyncio.sleep(0.01)
+    store.submit(job, answer)
+    await asyncio.sleep(0.01)
+    assert store.get(job.id).status is JobStatus.QUEUED
+
+    release.set()
+    await blocker
+    while store._tasks:
+        await asyncio.sleep(0.01)
+
+    job = store.get(job.id)
+    assert job.status is JobStatus.SUCCEEDED and job.result == {"answer": "A CAT"}
+    assert job.created_at <= job.started_at <= job.finished_at
+
+
+def test_unfinished_jobs_fail_after_restart(tmp_path: Path) -> None:
+    """测试重启前仍在排队的任务在重启后标记为失败，而不是永远停留在排队状态。"""
+    job = JobStore(tmp_path).create("t2i")
+
+    job = JobStore(tmp_path).get(job.id)
+    assert job.status is JobStatus.FAILED
+    assert job.error == "Interrupted by service restart"
+
+
+def test_batch_runner_resumes_after_failures(tmp_path: Path) -> None:
+    """测试续跑时跳过已成功的行、重试失败的行，并截断崩溃时写了一半的结果行。"""
+    input_path = tmp_path / "prompts.jsonl"
+    lines = [json.dumps({"prompt": f"p{i}"}) for i in range(5)]
+    input_path.write_text("\n".join(lines[:3] + ["not json"] + lines[4:]) + "\n")
+    calls: list[list[int]] = []
+
+    def process(batch: list[tuple[int, dict[str, Any]]]) -> list[dict[str, Any]]:
+        calls.append([index for index, _ in batch])
+        if any(item["prompt"] == "p1" for _, item in batch) and not retry:
+            raise RuntimeError("boom")
+        return [{"echo": item["prompt"]} for _, item in batch]
+
+    retry = False
+    stats = run_jsonl(input_path, tmp_path / "out", process, batch_size=2)
+    assert stats == {"succeeded": 3, "failed": 2, "skipped": 0}
+    assert calls == [[0, 1], [0], [1], [2, 4]]
+
+    # 模拟崩溃：结果文件末尾留下半行
+    with open(tmp_path / "out" / RESULTS_FILE, "a") as f:
+        f.write('{"line": 9')
+
+    retry, calls = True, []
+    input_path.write_text("\n".join(lines) + "\n")
+    stats = run_jsonl(input_path, tmp_path / "out", process, batch_size=2)
+    assert stats == {"succeeded": 2, "failed": 0, "skipped": 3}
+    assert calls == [[1, 3]]
+
+
+def test_finished_jobs_are_pruned_after_ttl(tmp_path: Path) -> None:
+    """测试结束超过保留时间的任务连同结果文件被删除，未过期和未结束的任务保留。"""
+    store = JobStore(tmp_path, ttl_seconds=3600)
+    old, recent = store.create("t2i"), store.create("t2i")
+    for job, age in ((old, 7200), (recent, 60)):
+        job.status, job.finished_at = JobStatus.SUCCEEDED, time.time() - age
+        store.save(job)
+        store.put_data(job.id, b"png", ".png")
+
+    assert store.prune() == 1
+    assert store.get(old.id) is None and store.get_data(old.id, ".png") is None
+    assert store.get(recent.id) is not None and store.get_data(recent.id, ".png") == b"png"
+
+    # 重启时同样清理
+    recent.finished_at = time.time() - 7200
+    store.save(recent)
+    JobStore(tmp_path, ttl_seconds=3600)
+    assert list(tmp_path.iterdir()) == []
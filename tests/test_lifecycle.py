@@ -0,0 +1,70 @@
+"""测试模型后台加载、预热和就绪状态。"""
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.lifecycle import ModelHandle, ModelState
+from app.scheduler import AdmissionError
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_requests_are_rejected_until_model_is_warm() -> None:
+    """测试加载和预热期间 get 立即返回 503（带 Retry-After），完成后返回模型。"""
+    loaded, warmed = threading.Event(), threading.Event()
+    warmup_calls: list[str] = []
+
+    def load() -> str:
+        loaded.wait()
+        return "model"
+
+    def warmup(model: str) -> None:
+        warmup_calls.append(model)
+        warmed.wait()
+
+    handle = ModelHandle("test", load, warmup)
+    assert handle.state is ModelState.PENDING
+
+    with pytest.raises(AdmissionError) as excinfo:
+        handle.get()
+    assert excinfo.value.status_code == 503
+    assert "Retry-After" in excinfo.value.headers
+    assert handle.state is ModelState.LOADING
+
+    loaded.set()
+    _wait_until(lambda: handle.state is ModelState.WARMING)
+    with pytest.raises(AdmissionError):
+        handle.get()
+
+    warmed.set()
+    _wait_until(lambda: handle.ready)
+    assert handle.get() == "model"
+    assert warmup_calls == ["model"]
+    status = handle.status()
+    assert status["state"] == "ready"
+    assert status["load_seconds"] is not None and status["warmup_seconds"] is not None
+
+
+def test_load_failure_is_reported() -> None:
+    """测试加载失败后状态为 failed，请求返回 503 和错误原因。"""
+
+    def load() -> None:
+        raise OSError("weights not found")
+
+    handle = ModelHandle("test", load)
+    handle.start()
+    _wait_until(lambda: handle.state is ModelState.FAILED)
+
+    with pytest.raises(HTTPException) as excinfo:
+        handle.get()
+    assert excinfo.value.status_code == 503
+    assert "weights not found" in excinfo.value.detail
+    assert handle.status()["error"] == "OSError: weights not found"
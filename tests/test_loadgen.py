@@ -0,0 +1,60 @@
+"""测试负载生成器（目标为演示模式的路由，不需要模型）。"""
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from app.routers import t2i_simple, vl_simple
+from benchmarks.loadgen import HttpTarget, load_payloads, run_closed, run_open
+
+demo_app = FastAPI()
+demo_app.include_router(t2i_simple.router)
+demo_app.include_router(vl_simple.router)
+
+
+@demo_app.post("/busy")
+async def busy() -> None:
+    raise HTTPException(status_code=429, detail="Queue is full")
+
+
+@pytest.fixture
+async def client() -> AsyncClient:
+    async with AsyncClient(transport=ASGITransport(app=demo_app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("endpoint", ["/t2i/generate/image", "/vl/understand/upload"])
+async def test_closed_loop_against_demo_endpoints(client: AsyncClient, endpoint: str) -> None:
+    """测试闭环负载：全部请求成功，统计包含延迟百分位和每秒完成数。"""
+    payloads = load_payloads(None, endpoint)
+    report = await run_closed(HttpTarget(client, endpoint), payloads, concurrency=4, duration=0.3)
+    summary = report.summary()
+
+    assert summary["requests"] == summary["ok"] > 0
+    assert summary["error_rate"] == summary["rejection_rate"] == 0.0
+    assert 0 < summary["latency_p50"] <= summary["latency_p99"] <= summary["latency_max"]
+    assert sum(summary["timeline"]) == summary["ok"]
+
+
+@pytest.mark.asyncio
+async def test_open_loop_counts_rejections(client: AsyncClient) -> None:
+    """测试开环负载按到达率发送请求，429 计为拒绝而不是错误。"""
+    report = await run_open(HttpTarget(client, "/busy"), [{}], rate=200, duration=0.5)
+    summary = report.summary()
+
+    assert 50 < summary["requests"] < 200
+    assert summary["rejection_rate"] == 1.0 and summary["error_rate"] == 0.0
+    assert summary["latency_p50"] is None
+
+
+def test_payloads_resolve_image_paths(tmp_path: Path) -> None:
+    """测试 JSONL 中的 image_path 相对文件所在目录读取并转为 Base64。"""
+    (tmp_path / "cat.png").write_bytes(b"png")
+    path = tmp_path / "payloads.jsonl"
+    path.write_text(json.dumps({"image_path": "cat.png", "question": "What?"}) + "\n\n")
+
+    assert load_payloads(path, "/vl/understand") == [{"question": "What?", "image_base64": "cG5n"}]
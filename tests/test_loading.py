@@ -0,0 +1,50 @@
+"""测试模型本地快照的选择与保存。"""
+
+from pathlib import Path
+
+import pytest
+import torch
+
+from app.config import settings
+from app.models.loading import resolve_source, save_snapshot
+
+
+class FakeComponent:
+    """测试用组件：save_pretrained 写入一个文件。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def save_pretrained(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / self.name).write_text("weights")
+
+
+def test_snapshot_written_once_then_used(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试首次加载返回需要写入的快照目录，写入后改为从快照加载。"""
+    monkeypatch.setattr(settings, "model_snapshot_dir", "")
+    assert resolve_source("vl", "org/model", torch.float32) == ("org/model", None)
+
+    monkeypatch.setattr(settings, "model_snapshot_dir", str(tmp_path))
+    source, snapshot = resolve_source("vl", "org/model", torch.float32)
+    assert source == "org/model"
+    assert snapshot is not None and snapshot.parent == tmp_path
+
+    save_snapshot(snapshot, FakeComponent("model"), FakeComponent("processor"))
+    assert sorted(p.name for p in snapshot.iterdir()) == ["model", "processor"]
+    assert list(tmp_path.iterdir()) == [snapshot]
+    assert resolve_source("vl", "org/model", torch.float32) == (str(snapshot), None)
+
+    # dtype 不同时使用另一份快照
+    assert resolve_source("vl", "org/model", torch.float16)[1] != snapshot
+
+
+def test_snapshot_race_keeps_first_writer(tmp_path: Path) -> None:
+    """测试另一个进程已经写好快照时不报错，保留已有快照并清理自己的临时目录。"""
+    snapshot = tmp_path / "snapshots" / "vl-abc"
+    save_snapshot(snapshot, FakeComponent("model"))
+
+    save_snapshot(snapshot, FakeComponent("other"))
+
+    assert [p.name for p in snapshot.iterdir()] == ["model"]
+    assert list(snapshot.parent.iterdir()) == [snapshot]
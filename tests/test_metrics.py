@@ -0,0 +1,54 @@
+"""测试指标采集和 /metrics 端点。"""
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    """测试直方图按 Prometheus 格式导出累计分桶、总和与计数。"""
+    registry = Registry()
+    histogram = registry.register(Histogram("latency", "Latency", ("stage",), buckets=(0.1, 1.0)))
+    histogram.observe(0.05, "decode")
+    histogram.observe(0.5, "decode")
+    histogram.observe(5.0, "decode")
+
+    text = registry.render()
+    assert "# TYPE vision_service_latency histogram" in text
+    assert 'vision_service_latency_bucket{stage="decode",le="0.1"} 1' in text
+    assert 'vision_service_latency_bucket{stage="decode",le="1"} 2' in text
+    assert 'vision_service_latency_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'vision_service_latency_sum{stage="decode"} 5.55' in text
+    assert 'vision_service_latency_count{stage="decode"} 3' in text
+
+
+def test_delta_from_replica_is_merged() -> None:
+    """测试副本进程导出的指标增量可以合并到 API 进程，导出后副本侧清零。"""
+    replica, api = Registry(), Registry()
+    for registry in (replica, api):
+        registry.register(Counter("lookups", "Lookups", ("result",)))
+        registry.register(Histogram("latency", "Latency", buckets=(1.0,)))
+
+    api._metrics["vision_service_lookups_total"].inc("hit")
+    replica._metrics["vision_service_lookups_total"].inc("hit", amount=2)
+    replica._metrics["vision_service_latency"].observe(0.5)
+
+    api.merge_delta(replica.export_delta())
+    assert api._metrics["vision_service_lookups_total"].get("hit") == 3
+    assert api._metrics["vision_service_latency"].count() == 1
+    assert replica.export_delta() == {}
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint() -> None:
+    """测试 /metrics 以 Prometheus 文本格式返回 HTTP 请求指标。"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/health")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/health"' in response.text
+    assert "vision_service_http_requests_in_flight" in response.text
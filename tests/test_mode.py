@@ -31,3 +31,13 @@ async def test_current_mode_endpoints() -> None:
 
             response = await client.get("/t2i/generate")
             assert response.status_code == 404  # t2i 端点不存在
+
+        elif settings.service_mode == "all":
+            # 同一进程同时提供两种服务
+            for path in ["/t2i/generate", "/vl/understand"]:
+                response = await client.get(path)
+                assert response.status_code in [405, 422]
+
+            if not settings.demo_mode:
+                response = await client.get("/models")
+                assert response.status_code == 200
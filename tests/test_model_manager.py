@@ -0,0 +1,107 @@
+"""测试单进程多模型管理器的按需加载和卸载。"""
+
+import time
+
+import pytest
+import torch
+
+from app import model_manager
+from app.config import settings
+from app.model_manager import ModelManager
+from app.models.t2i_hunyuan import T2IJob
+from app.routers import t2i
+
+MB = 2**20
+
+
+class _FakeModel:
+    """参数正好 1 MB 的模型。"""
+
+    def __init__(self) -> None:
+        self.net = torch.nn.Linear(512, 512, bias=False)
+
+
+@pytest.fixture(autouse=True)
+def fixed_rss(monkeypatch: pytest.MonkeyPatch) -> None:
+    """只按参数字节数估算大小，不受进程 RSS 波动影响。"""
+    monkeypatch.setattr(model_manager, "_rss_bytes", lambda: 0)
+
+
+def _manager(budget_mb: float, idle_offload_s: float = 0.0) -> ModelManager:
+    manager = ModelManager(int(budget_mb * MB), idle_offload_s)
+    for name in ("a", "b", "c"):
+        manager.register(name, _FakeModel)
+    return manager
+
+
+def test_lazy_load_and_lru_eviction() -> None:
+    """测试首次使用才加载，超出预算时卸载最久未用的模型，再次使用时重新加载。"""
+    manager = _manager(budget_mb=2.5)
+    assert manager.resident("a") is None
+
+    for name in ("a", "b", "a", "c"):
+        with manager.use(name):
+            pass
+
+    report = manager.report()
+    assert report["resident_mb"] == 2.0
+    assert {name: m["resident"] for name, m in report["models"].items()} == {
+        "a": True,
+        "b": False,
+        "c": True,
+    }
+    assert report["models"]["b"]["last_offload_reason"] == "budget"
+
+    # b 重新加载时腾出最久未用的 a
+    with manager.use("b"):
+        pass
+    report = manager.report()["models"]
+    assert report["b"]["loads"] == 2 and report["b"]["last_reload_seconds"] is not None
+    assert report["b"]["first_load_seconds"] is not None
+    assert not report["a"]["resident"] and report["c"]["resident"]
+
+    samples = {
+        (name, labels["model"]): value for name, _, _, labels, value in manager.metric_samples()
+    }
+    assert samples["model_resident", "a"] == 0.0 and samples["model_resident", "b"] == 1.0
+    assert samples["model_size_bytes", "b"] == MB and samples["model_loads_total", "b"] == 2
+    assert ("model_reload_seconds", "b") in samples and ("model_reload_seconds", "c") not in samples
+
+
+def test_models_in_use_are_kept() -> None:
+    """测试正在推理的模型不会被卸载，空闲超时后才卸载。"""
+    manager = _manager(budget_mb=1.5, idle_offload_s=0.05)
+
+    with manager.use("a") as a:
+        with manager.use("b"):
+            pass
+        # 预算只够一个模型，但 a 正在使用，暂时超出预算
+        assert manager.resident("a") is a and manager.resident("b") is not None
+        time.sleep(0.06)
+        assert manager.offload_idle() == ["b"]
+
+    assert manager.offload_idle() == []
+    assert manager.offload("a") and not manager.offload("a")
+    assert manager.report()["models"]["a"]["last_offload_reason"] == "manual"
+
+
+@pytest.mark.asyncio
+async def test_router_loads_through_manager(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试 SERVICE_MODE=all 时路由按需从模型管理器取得模型。"""
+    monkeypatch.setattr(settings, "service_mode", "all")
+    monkeypatch.setattr(settings, "model_backend", "simulated")
+    monkeypatch.setattr(settings, "sim_load_seconds", 0.0)
+    monkeypatch.setattr(settings, "sim_t2i_fixed_ms", 0.0)
+    monkeypatch.setattr(settings, "sim_t2i_step_ms", 0.0)
+    monkeypatch.setattr(settings, "sim_t2i_step_ms_per_megapixel", 0.0)
+    monkeypatch.setattr(model_manager, "_manager", None)
+
+    run_batch, concurrency = t2i._load_backend()
+    manager = model_manager.get_manager()
+    assert concurrency == 1 and manager.resident("t2i") is None
+
+    job = T2IJob("a cat", seed=1)
+    [image] = await run_batch([job])
+    assert image.size == (job.params.width, job.params.height)
+    assert manager.report()["models"]["t2i"]["loads"] == 1
+    assert manager.resident("t2i") is not None
@@ -0,0 +1,76 @@
+"""测试按请求的性能剖析。"""
+
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import profiling
+from app.config import settings
+from app.models.t2i_hunyuan import T2IJob
+from app.scheduler import BatchScheduler, RequestOptions, request_options
+
+
+def _request(headers: dict[str, str] | None = None, query: str = "") -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "query_string": query.encode()})
+
+
+def _batch(jobs: list[T2IJob]) -> list[str]:
+    return [job.prompt for job in jobs]
+
+
+def test_disabled_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试未配置令牌和抽样率时完全关闭：推理函数不被包装，请求头被忽略。"""
+    monkeypatch.setattr(settings, "profile_token", "")
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+
+    assert profiling.profiled(_batch) is _batch
+    assert request_options(_request({"X-Profile": "anything"})).trace_id is None
+
+
+def test_token_is_checked(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试令牌正确时分配 trace ID，错误时返回 403，未请求时不剖析。"""
+    monkeypatch.setattr(settings, "profile_token", "secret")
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+
+    request = _request({"X-Profile": "secret"})
+    options = request_options(request)
+    assert options.trace_id is not None and request.state.trace_id == options.trace_id
+    assert request_options(_request(query="profile=secret")).trace_id is not None
+    assert request_options(_request()).trace_id is None
+
+    with pytest.raises(HTTPException) as exc_info:
+        request_options(_request({"X-Profile": "guess"}))
+    assert exc_info.value.status_code == 403
+
+
+def test_sampled_batch_is_traced(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """测试抽样到的请求所在的批次被剖析，批内每个 trace ID 都有一份记录。"""
+    monkeypatch.setattr(settings, "profile_token", "")
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profiler", "cprofile")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+
+    jobs = [T2IJob("a"), T2IJob("b"), T2IJob("c")]
+    jobs[0].trace_id = jobs[1].trace_id = request_options(_request()).trace_id
+    jobs[2].trace_id = "second"
+
+    assert profiling.profiled(_batch)(jobs) == ["a", "b", "c"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [f"{jobs[0].trace_id}.prof", "second.prof"]
+    )
+    assert profiling.profiled(_batch)([T2IJob("d")]) == ["d"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_leaves_payloads_untouched() -> None:
+    """测试调度器不改写载荷：带 trace ID 的请求可以提交任意类型的载荷。"""
+
+    async def runner(items: list[tuple[str, int]]) -> list[str]:
+        return [name for name, _ in items]
+
+    scheduler = BatchScheduler(runner, max_batch_size=1, max_wait_ms=0)
+    assert await scheduler.submit(("a", 1), RequestOptions(trace_id="t")) == "a"
@@ -0,0 +1,66 @@
+"""测试 VL 模型的 int8 动态量化与量化模型缓存。"""
+
+from pathlib import Path
+
+import pytest
+import torch
+from torch.ao.nn.quantized import dynamic as nnqd
+
+from app.config import settings
+from app.models.quantization import load_quantized, quantize_int8, quantized_path, save_quantized
+
+
+class FakeVLModel(torch.nn.Module):
+    """测试用模型：与 Qwen2.5-VL 相同的 model / lm_head / visual 子模块划分。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.model = torch.nn.ModuleDict(
+            {"embed_tokens": torch.nn.Embedding(16, 8), "proj": torch.nn.Linear(8, 8)}
+        )
+        self.lm_head = torch.nn.Linear(8, 16)
+        self.visual = torch.nn.Linear(8, 8)
+
+    def forward(self, input_ids: torch.Tensor) -> torch.Tensor:
+        hidden = self.model["proj"](self.model["embed_tokens"](input_ids))
+        return self.lm_head(self.visual(hidden))
+
+
+@pytest.mark.parametrize("vision", [False, True])
+def test_quantize_int8_scopes(vision: bool) -> None:
+    """测试只量化语言部分的线性层，视觉编码器按需量化，词嵌入保持 float。"""
+    torch.manual_seed(0)
+    model = FakeVLModel().eval()
+    input_ids = torch.tensor([[1, 2, 3]])
+    with torch.no_grad():
+        reference = model(input_ids)
+
+    quantize_int8(model, vision=vision)
+
+    assert isinstance(model.model["proj"], nnqd.Linear)
+    assert isinstance(model.lm_head, nnqd.Linear)
+    assert isinstance(model.visual, nnqd.Linear) == vision
+    assert type(model.model["embed_tokens"]) is torch.nn.Embedding
+    with torch.no_grad():
+        assert torch.allclose(model(input_ids), reference, atol=0.05)
+
+
+def test_quantized_model_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试量化模型缓存的路径区分量化范围，保存后加载的输出完全一致。"""
+    monkeypatch.setattr(settings, "quantized_cache_dir", "")
+    assert quantized_path("org/model", vision=False) is None
+
+    monkeypatch.setattr(settings, "quantized_cache_dir", str(tmp_path))
+    path = quantized_path("org/model", vision=False)
+    assert path is not None and path.parent == tmp_path
+    assert quantized_path("org/model", vision=True) != path
+
+    model = FakeVLModel().eval()
+    quantize_int8(model)
+    save_quantized(path, model)
+    assert not path.with_name(path.name + ".tmp").exists()
+
+    loaded = load_quantized(path, FakeVLModel().eval())
+    input_ids = torch.tensor([[4, 5]])
+    with torch.no_grad():
+        assert torch.equal(loaded(input_ids), model(input_ids))
@@ -0,0 +1,199 @@
+"""测试动态微批调度器。"""
+
+import asyncio
+
+import pytest
+
+from app.scheduler import AdmissionError, BatchScheduler, Priority, RequestOptions
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched() -> None:
+    """测试时间窗口内的并发请求会被合并成一批。"""
+    batches: list[list[int]] = []
+
+    async def runner(items: list[int]) -> list[int]:
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    scheduler = BatchScheduler(runner, max_batch_size=4, max_wait_ms=50)
+    results = await asyncio.gather(*(scheduler.submit(i) for i in range(6)))
+
+    # 结果按请求顺序分发回各自的调用方
+    assert results == [0, 10, 20, 30, 40, 50]
+    # 受批大小上限约束：6 个请求拆成 4 + 2
+    assert [len(batch) for batch in batches] == [4, 2]
+
+
+@pytest.mark.asyncio
+async def test_requests_arriving_during_inference_form_next_batch() -> None:
+    """测试推理期间到达的请求会堆积成下一批。"""
+    batches: list[list[str]] = []
+
+    async def runner(items: list[str]) -> list[str]:
+        batches.append(items)
+        await asyncio.sleep(0.05)
+        return items
+
+    scheduler = BatchScheduler(runner, max_batch_size=8, max_wait_ms=0)
+    first = asyncio.create_task(scheduler.submit("a"))
+    await asyncio.sleep(0.01)
+    rest = [asyncio.create_task(scheduler.submit(p)) for p in ("b", "c", "d")]
+
+    assert await first == "a"
+    assert await asyncio.gather(*rest) == ["b", "c", "d"]
+    assert batches == [["a"], ["b", "c", "d"]]
+
+
+@pytest.mark.asyncio
+async def test_runner_error_is_propagated_to_whole_batch() -> None:
+    """测试批量执行失败时，同批的每个调用方都收到异常。"""
+
+    async def runner(items: list[int]) -> list[int]:
+        raise RuntimeError("boom")
+
+    scheduler = BatchScheduler(runner, max_batch_size=2, max_wait_ms=20)
+    results = await asyncio.gather(scheduler.submit(1), scheduler.submit(2), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    # 出错后调度器仍然可用
+    async def ok_runner(items: list[int]) -> list[int]:
+        return items
+
+    scheduler._runner = ok_runner
+    assert await scheduler.submit(3) == 3
+
+
+@pytest.mark.asyncio
+async def test_result_count_mismatch_fails_whole_batch() -> None:
+    """测试返回的结果数与请求数不一致时整批失败，没有调用方一直等待或拿到别人的结果。"""
+
+    async def runner(items: list[int]) -> list[int]:
+        return items[:-1]
+
+    scheduler = BatchScheduler(runner, max_batch_size=3, max_wait_ms=20)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(scheduler.submit(i) for i in range(3)), return_exceptions=True), 1
+    )
+
+    assert all(isinstance(r, RuntimeError) and "2 result(s) for 3" in str(r) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_key_groups_requests_and_keeps_order() -> None:
+    """测试只有批次键相同的请求合并成一批，暂存的请求进入后续批次。"""
+    batches: list[list[str]] = []
+
+    async def runner(items: list[str]) -> list[str]:
+        batches.append(items)
+        return [item.upper() for item in items]
+
+    scheduler = BatchScheduler(
+        runner, max_batch_size=4, max_wait_ms=20, batch_key=lambda item: item[0]
+    )
+    items = ["a1", "b1", "a2", "b2", "c1", "a3"]
+    results = await asyncio.gather(*(scheduler.submit(item) for item in items))
+
+    assert results == [item.upper() for item in items]
+    assert batches == [["a1", "a2", "a3"], ["b1", "b2"], ["c1"]]
+    assert scheduler.depth == 0
+
+
+async def _blocked_scheduler(
+    batches: list[list[str]], max_queue_depth: int = 0
+) -> tuple[BatchScheduler[str, str], asyncio.Event, asyncio.Task[str]]:
+    """创建一个调度器，并用一个请求占住推理，之后的请求都会排队。"""
+    release = asyncio.Event()
+
+    async def runner(items: list[str]) -> list[str]:
+        batches.append(items)
+        await release.wait()
+        return items
+
+    scheduler = BatchScheduler(
+        runner, max_batch_size=1, max_wait_ms=0, max_queue_depth=max_queue_depth
+    )
+    blocker = asyncio.create_task(scheduler.submit("blocker"))
+    await asyncio.sleep(0.01)
+    return scheduler, release, blocker
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_retry_after() -> None:
+    """测试队列已满时立即返回 429 和 Retry-After。"""
+    batches: list[list[str]] = []
+    scheduler, release, blocker = await _blocked_scheduler(batches, max_queue_depth=2)
+    queued = [asyncio.create_task(scheduler.submit(p)) for p in ("a", "b")]
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionError) as exc_info:
+        await scheduler.submit("c")
+    assert exc_info.value.status_code == 429
+    assert int(exc_info.value.headers["Retry-After"]) >= 1
+
+    release.set()
+    assert await asyncio.gather(blocker, *queued) == ["blocker", "a", "b"]
+    assert scheduler.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_priority_and_per_client_round_robin() -> None:
+    """测试高优先级先执行，同一优先级内按客户端轮转。"""
+    batches: list[list[str]] = []
+    scheduler, release, blocker = await _blocked_scheduler(batches)
+
+    submissions = [
+        ("a1", Priority.NORMAL, "a"),
+        ("a2", Priority.NORMAL, "a"),
+        ("a3", Priority.NORMAL, "a"),
+        ("b1", Priority.NORMAL, "b"),
+        ("low", Priority.LOW, "c"),
+        ("high", Priority.HIGH, "c"),
+    ]
+    tasks = [
+        asyncio.create_task(scheduler.submit(p, RequestOptions(priority, client)))
+        for p, priority, client in submissions
+    ]
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    order = [batch[0] for batch in batches[1:]]
+    assert order == ["high", "a1", "b1", "a2", "a3", "low"]
+
+
+@pytest.mark.asyncio
+async def test_expired_requests_are_dropped_before_running() -> None:
+    """测试排队期间超过截止时间的请求直接返回 503，不会被执行。"""
+    batches: list[list[str]] = []
+    scheduler, release, blocker = await _blocked_scheduler(batches)
+
+    expiring = asyncio.create_task(scheduler.submit("late", RequestOptions(timeout=0.01)))
+    patient = asyncio.create_task(scheduler.submit("ok", RequestOptions(timeout=10)))
+    await asyncio.sleep(0.05)
+    release.set()
+
+    with pytest.raises(AdmissionError) as exc_info:
+        await expiring
+    assert exc_info.value.status_code == 503
+    assert await patient == "ok"
+    assert ["late"] not in batches
+    assert scheduler.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_infeasible_deadline_is_rejected_up_front() -> None:
+    """测试按观测到的服务时间估算赶不上截止时间的请求，提交时直接返回 503。"""
+    batches: list[list[str]] = []
+    scheduler, release, blocker = await _blocked_scheduler(batches)
+    # 模拟已经观测到每批需要 1 秒
+    scheduler.batch_seconds = 1.0
+
+    with pytest.raises(AdmissionError) as exc_info:
+        await scheduler.submit("x", RequestOptions(timeout=0.5))
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+    release.set()
+    await blocker
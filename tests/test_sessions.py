@@ -0,0 +1,163 @@
+"""测试视觉语言多轮会话。"""
+
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from app import sessions
+from app.config import settings
+from app.models.simulated import SimulatedVLModel
+from app.models.vl_qwen import VLAnswer, VLJob
+from app.routers import vl
+from app.sessions import SessionStore
+from app.workers import WorkerPool, load_vl
+
+
+def test_session_store_expires_idle_and_evicts_lru(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试空闲超时的会话被关闭，会话数超过上限时淘汰最久未用的会话。"""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = SessionStore(max_sessions=2, idle_timeout_s=60)
+
+    a = store.create(b"a")
+    now[0] += 30
+    b = store.create(b"b")
+    now[0] += 40  # a 已空闲 70 秒，b 空闲 40 秒
+    assert store.get(a.id) is None
+    assert store.get(b.id) is b
+
+    c = store.create(b"c")
+    d = store.create(b"d")  # 超过 2 个，淘汰最久未用的 b
+    assert store.get(b.id) is None
+    assert store.get(c.id) is c and store.get(d.id) is d
+
+    assert store.close(c.id)
+    assert not store.close(c.id)
+    assert len(store) == 1
+
+
+class FakeBatcher:
+    """记录提交的请求，回答为问题的回声。"""
+
+    def __init__(self) -> None:
+        self.jobs: list[VLJob] = []
+
+    async def submit(self, job: VLJob, options: object = None) -> VLAnswer:
+        self.jobs.append(job)
+        return VLAnswer(f"re: {job.question}", False, session_cache_hit=bool(job.history))
+
+
+@pytest.mark.asyncio
+async def test_session_turns_carry_history(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试每一轮都带上会话 ID 和此前的对话，回答完成后追加到历史。"""
+    batcher = FakeBatcher()
+    monkeypatch.setattr(vl, "get_batcher", lambda: batcher)
+    session = SessionStore(max_sessions=4, idle_timeout_s=60).create(b"img", max_pixels=1024)
+
+    first = [event async for event in vl.session_turn(session, "What is it?")]
+    second = [event async for event in vl.session_turn(session, "What color?")]
+
+    assert first == [
+        {
+            "answer": "re: What is it?",
+            "vision_cache_hit": False,
+            "session_cache_hit": False,
+            "session_id": session.id,
+        }
+    ]
+    assert second[-1]["session_cache_hit"]
+    assert [job.history for job in batcher.jobs] == [[], [("What is it?", "re: What is it?")]]
+    assert all(job.session_id == session.id and job.max_pixels == 1024 for job in batcher.jobs)
+    assert session.history[-1] == ("What color?", "re: What color?")
+
+
+def test_close_during_turn_drops_kv_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试一轮推理期间关闭会话，本轮结束后不会把会话的 KV cache 存回模型。"""
+    # 单模型模式：API 进程内的模型即 vl._model
+    monkeypatch.setattr(settings, "service_mode", "vl")
+    monkeypatch.setattr(settings, "sim_load_seconds", 0.0)
+    monkeypatch.setattr(settings, "sim_model_memory_mb", 0)
+    monkeypatch.setattr(settings, "sim_batch_memory_mb", 0)
+    monkeypatch.setattr(settings, "sim_failure_rate", 0.0)
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    store = SessionStore(max_sessions=4, idle_timeout_s=60)
+    monkeypatch.setattr(sessions, "_store", store)
+    model = SimulatedVLModel()
+    monkeypatch.setattr(vl, "_model", model)
+    monkeypatch.setattr(vl, "_pool", None)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buf, format="PNG")
+    open_session = store.create(buf.getvalue())
+    closed_session = store.create(buf.getvalue())
+
+    def close_mid_turn(delta: str) -> None:
+        # 在推理线程解码期间关闭（此时模型中还没有该会话的缓存）
+        vl._close_session(closed_session.id)
+
+    model.understand_images(
+        [
+            VLJob(open_session.image_bytes, "What?", session_id=open_session.id),
+            VLJob(closed_session.image_bytes, "What?", session_id=closed_session.id),
+        ]
+    )
+    assert len(model.sessions) == 2
+
+    followups = [
+        VLJob(s.image_bytes, "Color?", session_id=s.id, history=[("What?", "x")])
+        for s in (open_session, closed_session)
+    ]
+    followups[1].on_text = close_mid_turn
+    model.understand_images(followups)
+
+    assert model.sessions.get(open_session.id) == 2
+    assert model.sessions.get(closed_session.id) is None
+    assert model.closed_sessions.get(closed_session.id)
+    assert model.closed_sessions.get(open_session.id) is None
+
+
+@pytest.mark.asyncio
+async def test_close_reaches_replicas(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试多副本模式下关闭会话通知副本：正在执行的一轮结束后副本中不再保留其 KV cache。"""
+    # 副本进程从环境变量读取配置
+    for name, value in {
+        "MODEL_BACKEND": "simulated",
+        "STARTUP_WARMUP": "false",
+        "SIM_VL_FIXED_MS": "0",
+        "SIM_VL_VISION_MS_PER_MEGAPIXEL": "0",
+        "SIM_VL_PREFILL_MS_PER_TOKEN": "0",
+        "SIM_VL_DECODE_MS_PER_TOKEN": "0",
+        "SIM_VL_ANSWER_TOKENS": "4",
+    }.items():
+        monkeypatch.setenv(name, value)
+    store = SessionStore(max_sessions=4, idle_timeout_s=60)
+    monkeypatch.setattr(sessions, "_store", store)
+    pool = WorkerPool(load_vl, replicas=1, threads_per_replica=1)
+    pool.start()
+    monkeypatch.setattr(vl, "_pool", pool)
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buf, format="PNG")
+    open_session = store.create(buf.getvalue())
+    closed_session = store.create(buf.getvalue())
+
+    def turn(history: list[tuple[str, str]]) -> list[VLJob]:
+        return [
+            VLJob(s.image_bytes, "What?", session_id=s.id, history=history)
+            for s in (open_session, closed_session)
+        ]
+
+    try:
+        await pool.run(turn([]))
+        second = turn([("What?", "x")])
+        # 副本解码期间在 API 进程中关闭会话
+        second[1].on_text = lambda delta: vl._close_session(closed_session.id)
+        answers = await pool.run(second)
+        assert all(answer.session_cache_hit for answer in answers)
+
+        third = await pool.run(turn([("What?", "x")] * 2))
+        assert [answer.session_cache_hit for answer in third] == [True, False]
+    finally:
+        pool.close()
@@ -0,0 +1,115 @@
+"""测试模拟推理后端的代价模型、缓存命中、失败注入，以及与真实后端的结果缓存隔离。"""
+
+import io
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.cache import TieredCache
+from app.config import settings
+from app.encoding import EncodeOptions
+from app.generation import GenerationParams
+from app.models.simulated import SimulatedT2IModel, SimulatedVLModel
+from app.models.t2i_hunyuan import T2IJob
+from app.models.vl_qwen import VLJob
+from app.routers import t2i
+
+
+@pytest.fixture(autouse=True)
+def cost_model(monkeypatch: pytest.MonkeyPatch) -> None:
+    """固定代价模型，不受环境变量影响。"""
+    for name, value in {
+        "sim_busy_mode": "sleep",
+        "sim_load_seconds": 0.0,
+        "sim_model_memory_mb": 0,
+        "sim_batch_memory_mb": 0,
+        "sim_batch_exponent": 0.5,
+        "sim_failure_rate": 0.0,
+        "sim_t2i_fixed_ms": 0.0,
+        "sim_t2i_step_ms": 10.0,
+        "sim_t2i_step_ms_per_megapixel": 0.0,
+        "sim_vl_fixed_ms": 0.0,
+        "sim_vl_vision_ms_per_megapixel": 0.0,
+        "sim_vl_prefill_ms_per_token": 0.0,
+        "sim_vl_decode_ms_per_token": 1.0,
+        "sim_vl_answer_tokens": 5,
+        "t2i_preview_every_n_steps": 2,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+def test_t2i_batch_speedup_and_previews(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试批处理按加速曲线计时，输出尺寸与请求一致，每隔几步发送预览。"""
+    model = SimulatedT2IModel()
+    sleeps: list[float] = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    params = GenerationParams(num_inference_steps=6, guidance_scale=5.0, height=768, width=1024)
+    previews: list[dict] = []
+    jobs = [T2IJob(f"p{i}", seed=i, params=params) for i in range(4)]
+    jobs[0].on_preview = previews.append
+
+    images = model.generate_images(jobs)
+
+    # 单个请求 60ms，4 个一批为 4 × 60 × 4 ** -0.5 = 120ms
+    assert sum(sleeps) == pytest.approx(0.12)
+    assert [image.size for image in images] == [(1024, 768)] * 4
+    assert [p["step"] for p in previews] == [2, 4]
+    assert images[0].getpixel((0, 0)) != images[1].getpixel((0, 0))
+
+
+def test_vl_streams_tokens_and_tracks_cache_hits() -> None:
+    """测试逐 token 流式输出，同一张图第二次命中视觉缓存，会话追问命中会话缓存。"""
+    model = SimulatedVLModel()
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buf, format="PNG")
+    deltas: list[str] = []
+    job = VLJob(buf.getvalue(), "What is it?", session_id="s1", on_text=deltas.append)
+
+    [first] = model.understand_images([job])
+    assert "".join(deltas) == first.text and len(deltas) == 5
+    assert not first.vision_cache_hit and not first.session_cache_hit
+
+    followup = VLJob(
+        buf.getvalue(), "Color?", session_id="s1", history=[("What is it?", first.text)]
+    )
+    [second] = model.understand_images([followup], max_new_tokens=2)
+    assert second.vision_cache_hit and second.session_cache_hit
+    assert len(second.text.split()) == 2
+
+    model.close_session("s1")
+    [third] = model.understand_images([followup])
+    assert not third.session_cache_hit
+
+
+def test_failure_injection(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试按配置的概率让整批失败。"""
+    monkeypatch.setattr(settings, "sim_failure_rate", 1.0)
+    model = SimulatedT2IModel()
+    with pytest.raises(RuntimeError, match="Simulated t2i failure"):
+        model.generate_images([T2IJob("a cat")], num_inference_steps=1)
+
+
+@pytest.mark.asyncio
+async def test_simulated_results_are_not_served_to_real_backend(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """测试模拟后端写入结果缓存的图像不会在切回真实后端后被返回。"""
+    cache = TieredCache(memory_bytes=2**20, disk_dir=tmp_path, disk_bytes=2**20)
+    monkeypatch.setattr(t2i, "get_cache", lambda: cache)
+    encoding = EncodeOptions.create()
+
+    async def submit(job: T2IJob, options: object = None) -> Image.Image:
+        color = "red" if settings.model_backend == "simulated" else "blue"
+        return Image.new("RGB", (8, 8), color)
+
+    monkeypatch.setattr(t2i, "_submit", submit)
+    monkeypatch.setattr(settings, "model_backend", "simulated")
+    simulated = await t2i.generate(T2IJob("a cat", seed=1), encoding=encoding)
+
+    monkeypatch.setattr(settings, "model_backend", "real")
+    real = await t2i.generate(T2IJob("a cat", seed=1), encoding=encoding)
+    assert real != simulated
+    assert await t2i.generate(T2IJob("a cat", seed=1), encoding=encoding) == real
+    assert cache.stats()["misses"] == 2
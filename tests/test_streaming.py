@@ -0,0 +1,99 @@
+"""测试推理线程到事件循环的事件通道，以及基于它的 SSE 流式回答。"""
+
+import asyncio
+import base64
+import io
+import json
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from PIL import Image
+
+from app.models.vl_qwen import VLAnswer, VLJob
+from app.routers import vl
+from app.streaming import StreamChannel
+
+
+@pytest.mark.asyncio
+async def test_events_from_worker_thread_are_delivered_in_order() -> None:
+    """测试工作线程投递的事件按顺序送达，关闭后迭代结束。"""
+    channel: StreamChannel[int] = StreamChannel()
+
+    def work() -> str:
+        for i in range(5):
+            channel.put(i)
+        return "done"
+
+    task = asyncio.create_task(asyncio.to_thread(work))
+    task.add_done_callback(lambda _: channel.close())
+
+    received = [event async for event in channel]
+
+    assert received == [0, 1, 2, 3, 4]
+    assert await task == "done"
+
+
+class StreamingBatcher:
+    """在工作线程中逐段输出回答的假调度器，fail 为 True 时输出一段后推理失败。"""
+
+    def __init__(self, deltas: list[str], fail: bool = False) -> None:
+        self.deltas = deltas
+        self.fail = fail
+
+    def admit(self, options: object = None) -> None:
+        pass
+
+    async def submit(self, job: VLJob, options: object = None) -> VLAnswer:
+        def run() -> VLAnswer:
+            for delta in self.deltas:
+                assert job.on_text is not None
+                job.on_text(delta)
+                if self.fail:
+                    raise RuntimeError("decoder crashed")
+            return VLAnswer("".join(self.deltas), vision_cache_hit=False)
+
+        return await asyncio.to_thread(run)
+
+
+async def _sse_events() -> list[tuple[str | None, dict[str, object]]]:
+    """请求 /vl/understand/stream，返回 (事件名, 数据) 列表。"""
+    app = FastAPI()
+    app.include_router(vl.router)
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32)).save(buf, format="PNG")
+    body = {"image_base64": base64.b64encode(buf.getvalue()).decode(), "question": "What?"}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/vl/understand/stream", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for message in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_ends_with_done(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试 SSE 先逐段推送文本，最后以 done 事件给出与各段拼接结果一致的完整答案。"""
+    monkeypatch.setattr(vl, "get_batcher", lambda: StreamingBatcher(["一只", "红色的", "苹果"]))
+
+    events = await _sse_events()
+
+    *deltas, (name, done) = events
+    assert [event for event, _ in deltas] == [None, None, None]
+    assert name == "done"
+    assert "".join(str(data["delta"]) for _, data in deltas) == done["answer"] == "一只红色的苹果"
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_ends_with_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试推理中途失败时，已推送的文本之后以 error 事件结束，不再有 done 事件。"""
+    monkeypatch.setattr(vl, "get_batcher", lambda: StreamingBatcher(["partial"], fail=True))
+
+    events = await _sse_events()
+
+    assert events == [(None, {"delta": "partial"}), ("error", {"error": "decoder crashed"})]
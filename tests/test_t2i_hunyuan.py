@@ -0,0 +1,78 @@
+"""测试 HunyuanDiT 模型封装（用随机权重的迷你模型）。"""
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from app.config import settings
+from app.models.t2i_hunyuan import HunyuanDiTModel, T2IJob
+from benchmarks.tiny_models import build_t2i
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory: pytest.TempPathFactory) -> Iterator[HunyuanDiTModel]:
+    """迷你模型，不受环境变量中的加速档位和快照配置影响。"""
+    path = build_t2i(tmp_path_factory.mktemp("tiny-t2i"))
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in {
+            "device": "cpu",
+            "t2i_model_id": str(path),
+            "cpu_profile": "baseline",
+            "model_snapshot_dir": "",
+        }.items():
+            mp.setattr(settings, name, value)
+        yield HunyuanDiTModel()
+
+
+@pytest.fixture
+def encoder_calls(model: HunyuanDiTModel, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """记录两个文本编码器的每次前向。"""
+    calls: list[str] = []
+
+    def counted(name: str, forward: Any) -> Any:
+        def run(*args: Any, **kwargs: Any) -> Any:
+            calls.append(name)
+            return forward(*args, **kwargs)
+
+        return run
+
+    for name in ("text_encoder", "text_encoder_2"):
+        encoder = getattr(model.pipe, name)
+        monkeypatch.setattr(encoder, "forward", counted(name, encoder.forward))
+    return calls
+
+
+def test_repeated_prompt_skips_text_encoders(
+    model: HunyuanDiTModel, encoder_calls: list[str]
+) -> None:
+    """测试重复的提示词直接使用缓存的编码，整个生成过程不再经过文本编码器；不同的提示词未命中。"""
+    model.generate_images([T2IJob("a red apple", seed=0)], 1)
+    assert encoder_calls == ["text_encoder", "text_encoder_2"]
+
+    encoder_calls.clear()
+    model.generate_images([T2IJob("a red apple", seed=1)], 1)
+    assert encoder_calls == []
+
+    model.get_prompt_embeddings("a blue car")
+    assert encoder_calls == ["text_encoder", "text_encoder_2"]
+
+
+def test_embedding_cache_respects_byte_budget(
+    model: HunyuanDiTModel, encoder_calls: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """测试缓存按编码的字节数淘汰最久未用的提示词。"""
+    cache = model._embedding_cache
+    # 所有提示词的编码形状相同（补齐到固定长度），预算只够两个
+    entry_bytes = model.uncond_embeddings.nbytes
+    monkeypatch.setattr(cache, "capacity", entry_bytes * 5 // 2)
+
+    for prompt in ("one", "two", "three"):
+        model.get_prompt_embeddings(prompt)
+
+    assert len(cache) == 2 and cache.size == 2 * entry_bytes <= cache.capacity
+    encoder_calls.clear()
+    model.get_prompt_embeddings("three")
+    assert encoder_calls == []
+    model.get_prompt_embeddings("one")
+    assert encoder_calls == ["text_encoder", "text_encoder_2"]
@@ -0,0 +1,149 @@
+"""测试 Qwen2.5-VL 模型封装（用随机权重的迷你模型）和增量解码。"""
+
+import io
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from PIL import Image
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+from torch.ao.nn.quantized import dynamic as nnqd
+from transformers import PreTrainedTokenizerFast
+
+from app.config import settings
+from app.models import quantization
+from app.models.vl_qwen import QwenVLModel, TextStream, VLJob
+from benchmarks.tiny_models import build_vl
+
+
+@pytest.fixture(scope="module")
+def tiny_settings(tmp_path_factory: pytest.TempPathFactory) -> Iterator[None]:
+    """使用迷你模型，不受环境变量中的加速档位、量化和快照配置影响。"""
+    path = build_vl(tmp_path_factory.mktemp("tiny-vl"))
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in {
+            "device": "cpu",
+            "vl_model_id": str(path),
+            "cpu_profile": "baseline",
+            "vl_quantization": "none",
+            "model_snapshot_dir": "",
+            "vl_min_pixels": 4 * 28 * 28,
+            "vl_max_pixels": 64 * 28 * 28,
+        }.items():
+            mp.setattr(settings, name, value)
+        yield
+
+
+@pytest.fixture(scope="module")
+def model(tiny_settings: None) -> QwenVLModel:
+    quantization.use_int8.cache_clear()
+    return QwenVLModel()
+
+
+def _png(size: tuple[int, int], color: tuple[int, int, int]) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_batch_matches_single_requests(model: QwenVLModel, monkeypatch: pytest.MonkeyPatch) -> None:
+    """测试整批回答与逐个回答一致：提示词长度不同（左侧补齐），且有的行提前结束。"""
+    jobs = [
+        VLJob(_png((112, 112), (200, 40, 40)), "What?"),
+        VLJob(
+            _png((224, 140), (10, 90, 200)),
+            "Describe every object you can see in this picture in detail.",
+        ),
+        VLJob(_png((56, 84), (0, 200, 0)), "Color?"),
+    ]
+    max_new_tokens = 12
+    tokenizer = model.processor.tokenizer
+    tokens = [
+        tokenizer(answer.text, add_special_tokens=False).input_ids
+        for answer in (model.understand_images([job], max_new_tokens)[0] for job in jobs)
+    ]
+    # 随机权重几乎不会输出结束符：把只出现在第二行的一个 token 当作结束符，让它提前结束
+    stop = next(t for t in tokens[1][1:] if t not in tokens[0] + tokens[2])
+    monkeypatch.setattr(model, "eos_token_ids", model.eos_token_ids | {stop})
+    singles = [model.understand_images([job], max_new_tokens)[0].text for job in jobs]
+
+    lengths: list[int] = []
+    generate_batch = model._generate_batch
+
+    def record(*args: Any, **kwargs: Any) -> Any:
+        generated, caches = generate_batch(*args, **kwargs)
+        lengths.extend(len(tokens) for tokens in generated)
+        return generated, caches
+
+    monkeypatch.setattr(model, "_generate_batch", record)
+    # 清空视觉特征缓存，三张图像一起过一次视觉编码器
+    model.vision_cache.evict_while(lambda features: True)
+    batch = model.understand_images(jobs, max_new_tokens)
+
+    assert [answer.text for answer in batch] == singles
+    # 有的行输出结束符后移出批次，其余行继续解码到上限
+    assert min(lengths) < max_new_tokens == max(lengths)
+
+
+def test_vision_cache_is_keyed_by_image_and_pixel_budget(model: QwenVLModel) -> None:
+    """测试同一张图在相同像素预算下命中视觉特征缓存，调小预算后视觉 token 数不同，不能命中。"""
+    image = _png((224, 224), (90, 60, 30))
+    first, again = (
+        model.understand_images([VLJob(image, question)], 2)[0] for question in ("What?", "Why?")
+    )
+    assert not first.vision_cache_hit and again.vision_cache_hit
+
+    # 另一个内容相同的字节对象也命中：键由图像字节的哈希和像素预算决定
+    [copy] = model.understand_images([VLJob(bytes(image), "What?")], 2)
+    assert copy.vision_cache_hit
+
+    [smaller] = model.understand_images([VLJob(image, "What?", max_pixels=16 * 28 * 28)], 2)
+    assert not smaller.vision_cache_hit
+    [smaller_again] = model.understand_images([VLJob(image, "How?", max_pixels=16 * 28 * 28)], 2)
+    assert smaller_again.vision_cache_hit
+
+
+def test_quantized_model_reloads_from_cache(
+    tiny_settings: None, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """测试 int8 量化模型写入缓存后，下次加载把权重载入量化的模型骨架，回答完全相同。"""
+    monkeypatch.setattr(settings, "vl_quantization", "int8")
+    monkeypatch.setattr(settings, "quantized_cache_dir", str(tmp_path))
+    quantization.use_int8.cache_clear()
+    job = VLJob(_png((112, 112), (30, 60, 90)), "What?")
+
+    try:
+        quantized = QwenVLModel()
+        assert len(list(tmp_path.glob("*.pt"))) == 1
+        reloaded = QwenVLModel()
+    finally:
+        quantization.use_int8.cache_clear()
+
+    assert isinstance(reloaded.model.lm_head, nnqd.Linear)
+    assert [a.text for a in reloaded.understand_images([job], 8)] == [
+        a.text for a in quantized.understand_images([job], 8)
+    ]
+
+
+def test_text_stream_never_splits_characters() -> None:
+    """测试中文和 emoji 被拆成多个字节级 token 时，增量文本不含半个字符，拼接后即完整答案。"""
+    # 没有合并规则的字节级 BPE：每个 UTF-8 字节一个 token
+    alphabet = pre_tokenizers.ByteLevel.alphabet()
+    backend = Tokenizer(models.BPE(vocab={c: i for i, c in enumerate(sorted(alphabet))}, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend)
+
+    text = "图像里有一只猫 🐱，它在睡觉。"
+    tokens = tokenizer(text, add_special_tokens=False).input_ids
+    assert len(tokens) == len(text.encode())
+
+    deltas: list[str] = []
+    stream = TextStream(tokenizer, deltas.append)
+    for token in tokens:
+        stream.push(token)
+
+    assert all("\ufffd" not in delta for delta in deltas)
+    assert "".join(deltas) == text
+    assert "猫" in deltas and "🐱" in deltas
@@ -0,0 +1,78 @@
+"""测试多进程模型副本池。"""
+
+import asyncio
+import os
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import pytest
+from PIL import Image
+
+from app.workers import BatchFn, WorkerPool, _pack, _unpack
+
+
+@dataclass
+class EchoJob:
+    """测试用请求：字节载荷 + 可选回调。"""
+
+    data: bytes
+    on_event: Callable[[Any], None] | None = field(default=None, repr=False, compare=False)
+
+
+def load_echo() -> BatchFn:
+    """副本进程中的假模型：把字节反转，并通过回调报告所在进程。"""
+
+    def run(jobs: list[EchoJob]) -> list[bytes]:
+        for job in jobs:
+            if job.on_event is not None:
+                job.on_event({"pid": os.getpid(), "size": len(job.data)})
+        return [job.data[::-1] for job in jobs]
+
+    return run
+
+
+@pytest.fixture
+def pool() -> Any:
+    pool = WorkerPool(load_echo, replicas=2, threads_per_replica=1)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_payloads_round_trip_through_shared_memory(pool: WorkerPool) -> None:
+    """测试字节载荷经共享内存往返，回调事件被转发回 API 进程。"""
+    events: list[dict[str, int]] = []
+    payload = os.urandom(256 * 1024)
+
+    results = await pool.run([EchoJob(payload, on_event=events.append), EchoJob(b"abc")])
+
+    assert results == [payload[::-1], b"cba"]
+    assert len(events) == 1
+    assert events[0]["size"] == len(payload)
+    assert events[0]["pid"] != os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_batches_are_spread_across_replicas(pool: WorkerPool) -> None:
+    """测试并发批次被派发到负载最低的副本。"""
+    events: list[dict[str, int]] = []
+    await asyncio.gather(
+        pool.run([EchoJob(b"a", on_event=events.append)]),
+        pool.run([EchoJob(b"b", on_event=events.append)]),
+    )
+
+    assert len({event["pid"] for event in events}) == 2
+    assert all(stats["load"] == 0 for stats in pool.stats())
+
+
+def test_images_are_packed_into_shared_memory() -> None:
+    """测试 PIL 图像以原始像素经共享内存传递，重建后像素不变。"""
+    image = Image.new("RGB", (17, 9), (10, 200, 30))
+    packed = _pack(image)
+
+    assert not isinstance(packed, Image.Image)
+    restored = _unpack(packed)
+    assert restored.size == image.size
+    assert restored.tobytes() == image.tobytes()